@@ -0,0 +1,336 @@
+"""
+Offline stand-in for the Groq chat-completions API.
+
+Returns deterministic, schema-valid answers for every prompt the pipeline
+sends (planner, researcher, writer, critics, optimizer, humanizer, keyword,
+FAQ, linking and metadata), with configurable per-model latency, token
+throughput and error injection. Point the pooled clients at it with
+
+    GROQ_API_BASE=http://127.0.0.1:8001 GROQ_API_KEY=fake
+
+and the whole graph runs end to end without network access or quota.
+
+Run standalone:
+    python -m app.api.fake_groq --port 8001 --latency-ms 300 --tokens-per-second 400
+"""
+
+import os
+import sys
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+
+class ModelProfile(BaseModel):
+    latency_ms: float = 200.0  # Time to first token
+    tokens_per_second: float = 500.0  # Generation throughput after the first token
+    error_rate: float = 0.0  # Fraction of requests that fail
+    error_status: int = 429  # Status code used for injected failures
+
+
+class FakeGroqConfig(BaseModel):
+    default: ModelProfile = ModelProfile()
+    models: Dict[str, ModelProfile] = {}
+    seed: int = 0
+
+    def profile(self, model_id: str) -> ModelProfile:
+        return self.models.get(model_id, self.default)
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _between(text: str, start: str, end: str) -> str:
+    if start not in text:
+        return ""
+    section = text.split(start, 1)[1]
+    return section.split(end, 1)[0].strip() if end in section else section.strip()
+
+
+def _line_value(text: str, label: str, default: str = "") -> str:
+    match = re.search(rf"{label}\s*(.+)", text)
+    return match.group(1).strip() if match else default
+
+
+def _paragraphs(seed_text: str, subject: str, count: int = 3) -> List[str]:
+    rng = random.Random(hashlib.sha256(seed_text.encode("utf-8")).hexdigest())
+    openers = ["Start small.", "Here's the thing.", "Numbers tell the story.", "Picture this."]
+    facts = [
+        f"A 2023 survey of 1,200 people found that {subject.lower()} changed their weekly routine.",
+        f"Researchers tracking {subject.lower()} over 12 months saw a 27% improvement.",
+        f"Most people notice the effect of {subject.lower()} within the first two weeks.",
+        f"Experts point to {subject.lower()} as the habit with the best return on effort.",
+    ]
+    return [f"{rng.choice(openers)} {rng.choice(facts)} {rng.choice(facts)}" for _ in range(count)]
+
+
+def fake_completion(prompt: str) -> str:
+    """Picks a deterministic, correctly shaped answer for a pipeline prompt."""
+    if "JSON execution plan" in prompt:
+        topic = _line_value(prompt, "Topic:", "the topic")
+        return json.dumps([
+            {"id": 1, "type": "research", "description": f"Research key facts and statistics about {topic}"},
+            {"id": 2, "type": "research", "description": f"Research expert opinions on {topic}"},
+            {"id": 3, "type": "write", "description": f"Write the Introduction to {topic}"},
+            {"id": 4, "type": "write", "description": f"Write the main body covering the benefits of {topic}"},
+            {"id": 5, "type": "write", "description": "Write the Conclusion"},
+        ])
+
+    if "top 2 URLs" in prompt:
+        urls = re.findall(r'"url":\s*"([^"]+)"', prompt)
+        return json.dumps(urls[:2])
+
+    if "Summarize the following text" in prompt:
+        query = _line_value(prompt, 'related to "', "the topic").rstrip('".')
+        return "\n\n".join([f"## Key facts: {query}"] + [f"- {p}" for p in _paragraphs(prompt, query)])
+
+    if "You are a Master Editor" in prompt:
+        return _between(prompt, "Original Draft:", "Critiques:") or "## Draft\n\nOptimized."
+
+    if "Linguistic Forensics Expert" in prompt:
+        return json.dumps({
+            "hedging_issues": [],
+            "connector_issues": [],
+            "nominalization_issues": [],
+            "sensory_vacuum_issues": [],
+            "ai_vocabulary_found": [],
+            "burstiness_score": 7,
+            "ai_artifact_score": 2,
+            "worst_paragraph": "",
+            "general_feedback": "Reads naturally.",
+        })
+
+    if "Ruthless Human Voice Editor" in prompt:
+        return _between(prompt, "Input Draft:", "Detected AI Artifacts:") or "## Draft\n\nRefined."
+
+    for critic in ("QWEN", "KIMI", "LLAMA"):
+        if f"CRITIC: {critic}" in prompt:
+            return (
+                f"CRITIC: {critic}\n\n"
+                "1. Tighten the introduction and lead with a concrete statistic.\n"
+                "2. Add one H2 that contains the primary keyword.\n"
+                "3. Replace abstract claims with specific examples."
+            )
+
+    if "You are a human writer" in prompt:
+        task = _line_value(prompt, "Task:", "Section")
+        return "\n\n".join([f"## {task}"] + _paragraphs(prompt, task, 4))
+
+    if "SEO keyword analyst" in prompt:
+        topic = _line_value(prompt, "TOPIC:", "topic").lower()
+        return json.dumps({
+            "primary_keyword": topic,
+            "secondary_keywords": [f"{topic} benefits", f"{topic} tips", f"how to start {topic}"],
+            "lsi_keywords": ["daily habit", "wellbeing", "long-term results"],
+        })
+
+    if "FAQ generator" in prompt:
+        return json.dumps([
+            {"question": "What is the main benefit?", "answer": "It improves results within weeks. Most people notice it quickly."},
+            {"question": "How do I get started?", "answer": "Pick one small step and repeat it daily. Track progress for a month."},
+            {"question": "Why does it work?", "answer": "It compounds. Small daily gains add up over time."},
+        ])
+
+    if "internal linking opportunities" in prompt:
+        return json.dumps({"internal_links": [
+            {"anchor_text": "getting started", "suggested_target": "Beginner's Guide", "context": "Introduction"},
+            {"anchor_text": "common mistakes", "suggested_target": "Mistakes to Avoid", "context": "Body"},
+            {"anchor_text": "daily routine", "suggested_target": "Building a Routine", "context": "Conclusion"},
+        ]})
+
+    if "authoritative external sources" in prompt:
+        return json.dumps({"external_links": [
+            {"source_name": "National Institutes of Health", "url": "https://www.nih.gov/", "anchor_text": "NIH research", "placement_context": "Statistics section"},
+            {"source_name": "Harvard Health", "url": "https://www.health.harvard.edu/", "anchor_text": "Harvard experts", "placement_context": "Benefits section"},
+        ]})
+
+    if "generate SEO metadata" in prompt:
+        keyword = _line_value(prompt, "Primary Keyword:", "topic")
+        return (
+            "---\n"
+            f'title: "{keyword.title()}: What Actually Works"\n'
+            f'meta_description: "A practical guide to {keyword} with real numbers and simple steps."\n'
+            f'primary_keyword: "{keyword}"\n'
+            "---"
+        )
+
+    return "OK"
+
+
+class FakeGroqServer:
+    def __init__(self, config: Optional[FakeGroqConfig] = None):
+        self.config = config or FakeGroqConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.tokens: Dict[str, int] = {}
+        self._ids = 0
+
+    def _next_id(self) -> str:
+        with self._lock:
+            self._ids += 1
+            return f"chatcmpl-fake-{self._ids}"
+
+    def _should_fail(self, profile: ModelProfile) -> bool:
+        with self._lock:
+            return profile.error_rate > 0 and self._rng.random() < profile.error_rate
+
+    def _record(self, model: str, tokens: int, error: bool = False):
+        with self._lock:
+            self.requests[model] = self.requests.get(model, 0) + 1
+            self.tokens[model] = self.tokens.get(model, 0) + tokens
+            if error:
+                self.errors[model] = self.errors.get(model, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": dict(self.requests), "errors": dict(self.errors), "tokens": dict(self.tokens)}
+
+    @staticmethod
+    def _headers() -> Dict[str, str]:
+        # Generous limits so the client-side limiter adapts upward
+        return {
+            "x-ratelimit-limit-requests": "1000000",
+            "x-ratelimit-remaining-requests": "999999",
+            "x-ratelimit-limit-tokens": "10000000",
+            "x-ratelimit-remaining-tokens": "9999999",
+        }
+
+    async def chat_completions(self, request: Request):
+        body = await request.json()
+        model = body.get("model", "unknown")
+        profile = self.config.profile(model)
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+
+        if self._should_fail(profile):
+            self._record(model, 0, error=True)
+            headers = self._headers()
+            if profile.error_status == 429:
+                headers["retry-after"] = "1"
+            return JSONResponse(
+                status_code=profile.error_status,
+                headers=headers,
+                content={"error": {"message": "Injected failure", "type": "fake_error", "code": str(profile.error_status)}},
+            )
+
+        content = fake_completion(prompt)
+        usage = {
+            "prompt_tokens": count_tokens(prompt),
+            "completion_tokens": count_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self._record(model, usage["total_tokens"])
+        completion_id = self._next_id()
+        created = int(time.time())
+
+        await asyncio.sleep(profile.latency_ms / 1000)
+
+        if body.get("stream"):
+            return StreamingResponse(
+                self._stream(completion_id, created, model, content, usage, profile),
+                media_type="text/event-stream",
+                headers=self._headers(),
+            )
+
+        await asyncio.sleep(usage["completion_tokens"] / profile.tokens_per_second)
+        return JSONResponse(headers=self._headers(), content={
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def _stream(self, completion_id, created, model, content, usage, profile):
+        def chunk(delta: dict, finish_reason=None, extra=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if extra:
+                payload.update(extra)
+            return f"data: {json.dumps(payload)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        pieces = re.findall(r"\S+\s*", content)
+        for piece in pieces:
+            await asyncio.sleep(count_tokens(piece) / profile.tokens_per_second)
+            yield chunk({"content": piece})
+        yield chunk({}, finish_reason="stop", extra={"x_groq": {"usage": usage}})
+        yield "data: [DONE]\n\n"
+
+
+def create_fake_groq_app(config: Optional[FakeGroqConfig] = None) -> FastAPI:
+    server = FakeGroqServer(config)
+    app = FastAPI(title="Fake Groq API")
+    app.state.fake = server
+    app.add_api_route("/openai/v1/chat/completions", server.chat_completions, methods=["POST"])
+    app.add_api_route("/stats", server.stats, methods=["GET"])
+    return app
+
+
+def parse_model_overrides(values: List[str]) -> Dict[str, ModelProfile]:
+    """Parses repeated 'model=latency_ms:tokens_per_second[:error_rate]' options."""
+    models = {}
+    for value in values:
+        model_id, spec = value.split("=", 1)
+        parts = spec.split(":")
+        profile = ModelProfile(latency_ms=float(parts[0]))
+        if len(parts) > 1:
+            profile.tokens_per_second = float(parts[1])
+        if len(parts) > 2:
+            profile.error_rate = float(parts[2])
+        models[model_id] = profile
+    return models
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run an offline Groq-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--model", action="append", default=[], help="Per-model override: model=latency_ms:tokens_per_second[:error_rate]")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = FakeGroqConfig(
+        default=ModelProfile(
+            latency_ms=args.latency_ms,
+            tokens_per_second=args.tokens_per_second,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+        ),
+        models=parse_model_overrides(args.model),
+        seed=args.seed,
+    )
+    uvicorn.run(create_fake_groq_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,22 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
 import uuid
 import re
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from app.main_graph import create_main_graph
+from app.core.llm import aclose_models
+from app.core.llm_cache import bypass_llm_cache
+from app.core.telemetry import REGISTRY, render as render_metrics
+from app.core.blobstore import blob_owner, get_blob_store
+from app.core.vfs import File
+from app.tools.extraction import close_extractor
+from contextlib import asynccontextmanager
 import aiosqlite
 import json
 
@@ -23,15 +32,93 @@ def sanitize_filename(topic: str) -> str:
     filename = filename[:50]
     return filename
 
-app = FastAPI(title="Article Agent API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled keep-alive connections to the LLM provider
+    await aclose_models()
+    # Stop the HTML extraction worker processes
+    await asyncio.to_thread(close_extractor)
+
+app = FastAPI(title="Article Agent API", lifespan=lifespan)
 
 # In-memory job tracker
 jobs: Dict[str, Dict] = {}
 
+# Checkpoints for every job; VFS file contents live in the blob store
+CHECKPOINT_DB = "agent_state.db"
+
+JOBS_BY_STATUS = REGISTRY.gauge("article_jobs", "Jobs tracked by this process, by status.", ["status"])
+
+# Nodes whose LLM output is relayed token by token over /jobs/{id}/stream
+STREAMED_NODES = {"write", "optimize", "refiner"}
+
+class JobEvents:
+    """
+    Replayable event log for one job. Every SSE subscriber gets the history
+    so far and then live events, so clients may connect at any point.
+
+    Consecutive tokens from one node are kept as a single replay event, and
+    once the job ends its tokens are dropped from the history: the finished
+    text is in the job's files, and holding every streamed call for the
+    life of the process would grow without bound.
+    """
+
+    def __init__(self):
+        self.history: List[dict] = []
+        self.subscribers: List[asyncio.Queue] = []
+        self.closed = False
+
+    def publish(self, event: str, data: dict):
+        item = {"event": event, "data": data}
+        last = self.history[-1] if self.history else None
+        if event == "token" and last and last["event"] == "token" and last["data"]["node"] == data["node"]:
+            # New dict: subscribers may still hold the previous one
+            self.history[-1] = {"event": event, "data": {**data, "text": last["data"]["text"] + data["text"]}}
+        else:
+            self.history.append(item)
+        for queue in self.subscribers:
+            queue.put_nowait(item)
+
+    def close(self):
+        self.closed = True
+        self.history = [item for item in self.history if item["event"] != "token"]
+        for queue in self.subscribers:
+            queue.put_nowait(None)
+
+    async def subscribe(self) -> AsyncIterator[dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        backlog = list(self.history)
+        if not self.closed:
+            self.subscribers.append(queue)
+        try:
+            for item in backlog:
+                yield item
+            if self.closed:
+                return
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                yield item
+        finally:
+            if queue in self.subscribers:
+                self.subscribers.remove(queue)
+
+job_events: Dict[str, JobEvents] = {}
+
+def format_sse(item: dict) -> str:
+    return f"event: {item['event']}\ndata: {json.dumps(item['data'])}\n\n"
+
+def _graph_name(namespace: tuple) -> str:
+    # Subgraph namespaces look like ("writer:<task id>",); strip the ids
+    return "/".join(part.split(":")[0] for part in namespace) or "main"
+
 class JobRequest(BaseModel):
     topic: str
     word_count: int = 1500
     language: str = "English"
+    bypass_cache: bool = False  # Skip the LLM response cache for this job
 
 class JobResponse(BaseModel):
     job_id: str
@@ -40,10 +127,12 @@ class JobResponse(BaseModel):
 
 async def run_agent_background(job_id: str, request: JobRequest):
     jobs[job_id]["status"] = "running"
+    events = job_events.setdefault(job_id, JobEvents())
+    events.publish("status", {"status": "running"})
     
     # Setup Async Persistence
     try:
-        async with aiosqlite.connect("agent_state.db") as conn:
+        async with aiosqlite.connect(CHECKPOINT_DB) as conn:
             checkpointer = AsyncSqliteSaver(conn)
             
             config = {"configurable": {"thread_id": job_id}}
@@ -59,8 +148,26 @@ async def run_agent_background(job_id: str, request: JobRequest):
                 "logs": []
             }
             
-            # Run graph
-            final_state = await graph.ainvoke(initial_state, config=config)
+            # Run graph, relaying node transitions and section tokens as they happen
+            final_state = {}
+            with bypass_llm_cache(request.bypass_cache), blob_owner(job_id):
+                async for namespace, mode, chunk in graph.astream(
+                    initial_state,
+                    config=config,
+                    stream_mode=["updates", "messages", "values"],
+                    subgraphs=True,
+                ):
+                    if mode == "values":
+                        if not namespace:
+                            final_state = chunk
+                    elif mode == "updates":
+                        for node in chunk:
+                            events.publish("node", {"graph": _graph_name(namespace), "node": node})
+                    else:
+                        message, metadata = chunk
+                        node = metadata.get("langgraph_node")
+                        if node in STREAMED_NODES and message.content:
+                            events.publish("token", {"node": node, "text": message.content})
             
             # Extract result
             vfs_data = final_state.get("vfs_data", {})
@@ -68,7 +175,7 @@ async def run_agent_background(job_id: str, request: JobRequest):
             
             def get_content(f):
                 if hasattr(f, 'content'): return f.content
-                if isinstance(f, dict): return f.get('content', '')
+                if isinstance(f, dict): return f['content'] if 'content' in f else File(**f).content
                 return str(f)
                 
             if "final_article.md" in vfs_data:
@@ -93,16 +200,21 @@ async def run_agent_background(job_id: str, request: JobRequest):
                 
             jobs[job_id]["status"] = "completed"
             jobs[job_id]["result"] = content
+            events.publish("status", {"status": "completed"})
             
     except Exception as e:
         print(f"Job failed: {e}")
         jobs[job_id]["status"] = "failed"
         jobs[job_id]["result"] = str(e)
+        events.publish("status", {"status": "failed", "error": str(e)})
+    finally:
+        events.close()
 
 @app.post("/jobs", response_model=JobResponse)
 async def create_job(request: JobRequest, background_tasks: BackgroundTasks):
     job_id = str(uuid.uuid4())
     jobs[job_id] = {"status": "pending", "request": request.model_dump()}
+    job_events[job_id] = JobEvents()
     
     background_tasks.add_task(run_agent_background, job_id, request)
     
@@ -115,3 +227,50 @@ async def get_job(job_id: str):
         
     job = jobs[job_id]
     return JobResponse(job_id=job_id, status=job["status"], result=job.get("result"))
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Forgets a finished job, drops its checkpoints and collects its unshared blobs."""
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if jobs[job_id]["status"] in ("pending", "running"):
+        raise HTTPException(status_code=409, detail="Job is still running")
+    
+    async with aiosqlite.connect(CHECKPOINT_DB) as conn:
+        checkpointer = AsyncSqliteSaver(conn)
+        await checkpointer.setup()
+        await checkpointer.adelete_thread(job_id)
+    removed = await asyncio.to_thread(get_blob_store().release, job_id)
+    jobs.pop(job_id, None)
+    job_events.pop(job_id, None)
+    return {"job_id": job_id, "deleted": True, "blobs_removed": removed}
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """Server-Sent Events: status changes, node transitions and section tokens."""
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    events = job_events.setdefault(job_id, JobEvents())
+    
+    async def event_source():
+        async for item in events.subscribe():
+            yield format_sse(item)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: per-call LLM telemetry and job status counts."""
+    counts: Dict[str, int] = {}
+    for job in list(jobs.values()):
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    JOBS_BY_STATUS.clear()
+    for status in ("pending", "running", "completed", "failed"):
+        JOBS_BY_STATUS.set(counts.pop(status, 0), status=status)
+    for status, count in counts.items():
+        JOBS_BY_STATUS.set(count, status=status)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,179 @@
+"""
+Content-addressed blob store for VFS file contents.
+
+Each distinct text is written once, zlib-compressed, to
+<root>/<hh>/<sha256>.z where the name is the SHA-256 of the text. VFS files
+in graph state carry only that hash, so checkpoints stay small no matter how
+many research summaries or draft revisions a job accumulates, and identical
+content written by several nodes or jobs is stored once.
+
+Writes made while a job owns the context (see `blob_owner`) are recorded in
+<root>/refs.sqlite. Deleting a job releases its references and removes the
+blobs no other job still uses. Blobs written outside any job (e.g. the CLI)
+are never collected.
+
+Recently written or read texts are also kept in a bounded in-memory LRU
+(VFS_BLOB_MEMORY_MB), so lazily loaded files and draft segments rarely
+touch the disk.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from app.core.disk_cache import get_cache_dir
+
+_owner: ContextVar[Optional[str]] = ContextVar("blob_owner", default=None)
+
+
+@contextmanager
+def blob_owner(job_id: Optional[str]):
+    """Attributes blobs written inside this context to `job_id` for garbage collection."""
+    token = _owner.set(job_id)
+    try:
+        yield
+    finally:
+        _owner.reset(token)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    def __init__(self, root: str, memory_bytes: int = 64 * 1024 * 1024):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.memory_bytes = memory_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_size = 0
+        # Guards blob existence checks against a concurrent release()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "refs.sqlite"), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs (owner TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (owner, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS refs_hash ON refs(hash)")
+
+        self.writes = 0
+        self.deduplicated = 0
+        self.reads = 0
+        self.collected = 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + ".z")
+
+    def _remember(self, digest: str, content: str):
+        # Caller holds self._lock
+        if digest in self._memory:
+            self._memory.move_to_end(digest)
+            return
+        if len(content) > self.memory_bytes:
+            return
+        self._memory[digest] = content
+        self._memory_size += len(content)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def put(self, content: str) -> str:
+        """Stores `content` (once) and returns its hash."""
+        digest = content_hash(content)
+        path = self._path(digest)
+        owner = _owner.get()
+        with self._lock:
+            if digest in self._memory or os.path.exists(path):
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(zlib.compress(content.encode("utf-8")))
+                os.replace(tmp, path)
+                self.writes += 1
+            self._remember(digest, content)
+            if owner is not None:
+                self._conn.execute("INSERT OR IGNORE INTO refs (owner, hash) VALUES (?, ?)", (owner, digest))
+        return digest
+
+    def get(self, digest: str) -> str:
+        with self._lock:
+            content = self._memory.get(digest)
+            if content is not None:
+                self._memory.move_to_end(digest)
+                return content
+        try:
+            with open(self._path(digest), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Blob {digest} not found in {self.root}.") from None
+        content = zlib.decompress(data).decode("utf-8")
+        with self._lock:
+            self.reads += 1
+            self._remember(digest, content)
+        return content
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def release(self, owner: str) -> int:
+        """Drops `owner`'s references and deletes blobs nobody references any more."""
+        with self._lock:
+            hashes = [row[0] for row in self._conn.execute("SELECT hash FROM refs WHERE owner = ?", (owner,))]
+            self._conn.execute("DELETE FROM refs WHERE owner = ?", (owner,))
+            removed = 0
+            for digest in hashes:
+                if self._conn.execute("SELECT 1 FROM refs WHERE hash = ? LIMIT 1", (digest,)).fetchone():
+                    continue
+                content = self._memory.pop(digest, None)
+                if content is not None:
+                    self._memory_size -= len(content)
+                try:
+                    os.remove(self._path(digest))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            self.collected += removed
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            owners, refs = self._conn.execute("SELECT COUNT(DISTINCT owner), COUNT(*) FROM refs").fetchone()
+        return {
+            "writes": self.writes,
+            "deduplicated": self.deduplicated,
+            "reads": self.reads,
+            "collected": self.collected,
+            "memory_bytes": self._memory_size,
+            "owners": owners,
+            "references": refs,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide store under VFS_BLOB_DIR (default <cache dir>/blobs)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore(
+                os.getenv("VFS_BLOB_DIR") or os.path.join(get_cache_dir(), "blobs"),
+                memory_bytes=int(os.getenv("VFS_BLOB_MEMORY_MB", "64")) * 1024 * 1024,
+            )
+        return _store
@@ -0,0 +1,93 @@
+"""
+Extractive compression of scraped pages before summarization.
+
+An extracted page is mostly navigation leftovers, asides and boilerplate;
+only a few passages bear on the research query. compress() splits the page
+into sentences, scores each by TF-IDF cosine similarity to the query (plus a
+small bonus for sentences with numbers, since the summary prompt asks for
+statistics) and keeps the best-scoring ones, in their original order, until
+the token budget is used up. Pages already within budget pass through
+unchanged.
+
+The budget is RESEARCH_COMPRESS_TOKENS (default 1000); 0 turns compression
+off. Tokens in and out are counted in
+`extractive_compression_tokens_total{kind}`.
+"""
+
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.core.telemetry import REGISTRY
+from app.core.tokens import get_token_counter
+
+COMPRESSION_TOKENS = REGISTRY.counter(
+    "extractive_compression_tokens_total", "Page tokens before (input) and after (kept) extractive compression.", ["kind"]
+)
+
+# Facts and statistics usually carry a number
+NUMBER_BONUS = 0.1
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])")
+_NUMBER = re.compile(r"\d")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of an extracted page; each line (heading, list item, paragraph) is split on its own."""
+    sentences = []
+    for line in text.splitlines():
+        sentences.extend(s.strip() for s in _SENTENCE_END.split(line) if s.strip())
+    return sentences
+
+
+def score_sentences(query: str, sentences: List[str]) -> np.ndarray:
+    """Relevance of each sentence to the query; all zeros if they share no terms."""
+    vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True)
+    try:
+        matrix = vectorizer.fit_transform(sentences + [query])
+    except ValueError:
+        # Nothing but stop words
+        return np.zeros(len(sentences))
+    similarity = (matrix[:-1] @ matrix[-1].T).toarray().ravel()
+    bonus = np.array([NUMBER_BONUS if _NUMBER.search(s) else 0.0 for s in sentences])
+    return similarity + bonus
+
+
+def compress(text: str, query: str, max_tokens: int, model_id: Optional[str] = None) -> str:
+    """The passages of `text` most relevant to `query`, within `max_tokens`."""
+    counter = get_token_counter(model_id)
+    if max_tokens <= 0 or counter.count(text) <= max_tokens:
+        return text
+    sentences = split_sentences(text)
+    scores = score_sentences(query, sentences)
+
+    kept = set()
+    used = 0
+    # Best first; equal scores keep page order, so an unrelated page keeps its lead
+    for i in sorted(range(len(sentences)), key=lambda i: (-scores[i], i)):
+        cost = counter.count(sentences[i]) + 1
+        if used + cost > max_tokens:
+            continue
+        kept.add(i)
+        used += cost
+
+    # Adjacent kept sentences stay one passage; gaps start a new paragraph
+    passages: List[List[str]] = []
+    for i in sorted(kept):
+        if passages and i - 1 in kept:
+            passages[-1].append(sentences[i])
+        else:
+            passages.append([sentences[i]])
+    return "\n\n".join(" ".join(p) for p in passages)
+
+
+def compress_page(text: str, query: str, model_id: Optional[str] = None) -> str:
+    """compress() with the RESEARCH_COMPRESS_TOKENS budget, recorded in the metrics."""
+    compressed = compress(text, query, int(os.getenv("RESEARCH_COMPRESS_TOKENS", "1000")), model_id)
+    counter = get_token_counter(model_id)
+    COMPRESSION_TOKENS.inc(counter.count(text), kind="input")
+    COMPRESSION_TOKENS.inc(counter.count(compressed), kind="kept")
+    return compressed
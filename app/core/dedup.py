@@ -0,0 +1,101 @@
+"""
+Near-duplicate detection with MinHash fingerprints.
+
+A fingerprint is a 64-permutation MinHash of the text's word 3-grams, kept
+as the low byte of each minimum (b-bit MinHash), so comparing two of them
+estimates the Jaccard similarity of their phrasing. Syndicated copies and
+lightly edited reposts score close to 1, unrelated texts close to 0. At 64
+bytes (128 hex characters) a fingerprint is small enough to keep in VFS file
+metadata and compare across a whole job.
+
+Used twice: the researcher skips summarizing a page at least
+DEDUP_PAGE_THRESHOLD similar to one already summarized, and the writer drops
+research chunks at least DEDUP_CHUNK_THRESHOLD similar to an earlier chunk
+before embedding them. A threshold of 0 turns that stage off. Drops are
+counted in the `dedup_dropped_total{stage}` metric.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from typing import Iterable, List
+
+import numpy as np
+
+from app.core.telemetry import REGISTRY
+
+DEDUP_DROPPED = REGISTRY.counter("dedup_dropped_total", "Near-duplicate pages and chunks skipped.", ["stage"])
+
+# A MinHash signature: NUM_PERM uint8 values
+Signature = np.ndarray
+
+NUM_PERM = 64
+_PRIME = (1 << 31) - 1
+# Fixed seed: fingerprints stored in checkpoints must stay comparable across processes
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+# Chance that two unrelated 8-bit minimums agree anyway
+_COLLISION = 1 / 256
+
+_WORD = re.compile(r"\w+")
+
+
+def minhash(text: str, shingle_size: int = 3) -> Signature:
+    """b-bit MinHash signature (NUM_PERM bytes) of the text's word shingles."""
+    words = _WORD.findall(text.lower())
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(len(words) - shingle_size + 1, 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # 31-bit permutations keep a*h + b inside uint64
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return (permuted.min(axis=1) & 0xFF).astype(np.uint8)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    matches = float(np.mean(a == b))
+    return max((matches - _COLLISION) / (1 - _COLLISION), 0.0)
+
+
+def to_hex(signature: Signature) -> str:
+    return signature.tobytes().hex()
+
+
+def from_hex(value: str) -> Signature:
+    return np.frombuffer(bytes.fromhex(value), dtype=np.uint8)
+
+
+def threshold(name: str, default: float) -> float:
+    """Similarity threshold from env, e.g. DEDUP_PAGE_THRESHOLD; 0 disables the stage."""
+    return float(os.getenv(name, str(default)))
+
+
+class FingerprintSet:
+    """
+    Signatures seen so far in one stage. add_if_new() is atomic, so
+    concurrent scrapes can't both claim the same content.
+    """
+
+    def __init__(self, stage: str, min_similarity: float, signatures: Iterable[Signature] = ()):
+        self.stage = stage
+        self.min_similarity = min_similarity
+        self._signatures: List[Signature] = list(signatures)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def add_if_new(self, signature: Signature) -> bool:
+        """Records the signature and returns True, or returns False for a near duplicate."""
+        if self.min_similarity <= 0:
+            return True
+        with self._lock:
+            if any(similarity(signature, seen) >= self.min_similarity for seen in self._signatures):
+                self.dropped += 1
+                DEDUP_DROPPED.inc(stage=self.stage)
+                return False
+            self._signatures.append(signature)
+            return True
@@ -0,0 +1,155 @@
+"""
+On-disk key/value cache backed by SQLite.
+
+Values are stored as zlib-compressed bytes. Entries expire after a TTL and the
+store is kept under a size budget by evicting the least recently used entries.
+Higher-level caches (LLM responses, scraped pages, search results, embeddings)
+build on this class and only decide what goes into the key and the value.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+
+def get_cache_dir() -> str:
+    """Directory holding all on-disk caches (ARTICLE_AGENT_CACHE_DIR, default .cache)."""
+    path = os.getenv("ARTICLE_AGENT_CACHE_DIR", ".cache")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class DiskCache:
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        compress: bool = True,
+    ):
+        """
+        Args:
+            path: SQLite file, or ":memory:" for a throwaway cache.
+            ttl: Default time-to-live in seconds (None = never expires).
+            max_bytes: Evict LRU entries once stored values exceed this size.
+            max_entries: Evict LRU entries once the entry count exceeds this.
+            compress: zlib-compress values before storing them.
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.compress = compress
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                expires REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the stored value, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires = row
+            if expires is not None and expires <= now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return zlib.decompress(value) if self.compress else value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """Stores a value, then evicts LRU entries if the store is over budget."""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl if ttl is not None else None
+        blob = zlib.compress(value) if self.compress else value
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now, expires),
+            )
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def _evict(self):
+        """Drops expired entries, then LRU entries until within max_bytes/max_entries."""
+        if self.max_bytes is None and self.max_entries is None:
+            return
+        cur = self._conn.execute(
+            "DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?", (time.time(),)
+        )
+        self.expired += max(cur.rowcount, 0)
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        while (self.max_entries is not None and count > self.max_entries) or (
+            self.max_bytes is not None and total > self.max_bytes
+        ):
+            row = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            count -= 1
+            total -= row[1]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,136 @@
+"""
+Cache of sentence embeddings, keyed by model and text.
+
+Every write task retrieves over the same, slowly growing set of research
+chunks. The cache means each chunk is embedded once per model, not once per
+section. Vectors are kept in memory in an LRU map of EMBEDDING_CACHE_ENTRIES
+entries, and optionally (EMBEDDING_CACHE_PERSIST=true) as float16 in a
+DiskCache shared across processes and restarts. Only chunks found in neither
+place are encoded, in one batched call.
+
+Lookups are counted in `embedding_cache_lookups_total{result}` (memory, disk,
+miss). The encode time they avoided is estimated from the measured
+per-chunk encode time and counted in `embedding_encode_seconds_saved_total`.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.disk_cache import DiskCache, get_cache_dir
+from app.core.telemetry import REGISTRY
+
+EMBEDDING_LOOKUPS = REGISTRY.counter("embedding_cache_lookups_total", "Embedding cache lookups, by where the vector was found.", ["result"])
+EMBEDDING_SECONDS_SAVED = REGISTRY.counter("embedding_encode_seconds_saved_total", "Estimated encode time avoided by embedding cache hits.")
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = 50000, store: Optional[DiskCache] = None, batch_size: int = 64):
+        self.max_entries = max_entries
+        self.store = store
+        self.batch_size = batch_size
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _key(model_id: str, text: str) -> str:
+        return hashlib.sha256(f"{model_id}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+                self.memory_hits += 1
+                EMBEDDING_LOOKUPS.inc(result="memory")
+                return vector
+        data = self.store.get(key) if self.store is not None else None
+        if data is None:
+            return None
+        vector = np.frombuffer(data, dtype=np.float16).astype(np.float32)
+        with self._lock:
+            self.disk_hits += 1
+        EMBEDDING_LOOKUPS.inc(result="disk")
+        self._remember(key, vector)
+        return vector
+
+    def encode(self, model, model_id: str, texts: Sequence[str]) -> np.ndarray:
+        """Embeddings of `texts` (float32, one row each); only uncached texts reach `model.encode`."""
+        keys = [self._key(model_id, t) for t in texts]
+        vectors: List[Optional[np.ndarray]] = [self._lookup(k) for k in keys]
+        # Keyed by hash, so identical chunks are encoded once
+        pending = {keys[i]: texts[i] for i, v in enumerate(vectors) if v is None}
+        hits = sum(v is not None for v in vectors)
+
+        if pending:
+            started = time.perf_counter()
+            encoded = np.asarray(model.encode(list(pending.values()), batch_size=self.batch_size), dtype=np.float32)
+            elapsed = time.perf_counter() - started
+            fresh = dict(zip(pending, encoded))
+            for key, vector in fresh.items():
+                self._remember(key, vector)
+                if self.store is not None:
+                    self.store.set(key, vector.astype(np.float16).tobytes())
+            with self._lock:
+                self.misses += len(pending)
+                self.encode_seconds += elapsed
+            EMBEDDING_LOOKUPS.inc(len(pending), result="miss")
+            vectors = [v if v is not None else fresh[k] for k, v in zip(keys, vectors)]
+
+        if hits:
+            with self._lock:
+                per_text = self.encode_seconds / self.misses if self.misses else 0.0
+                self.saved_seconds += hits * per_text
+            EMBEDDING_SECONDS_SAVED.inc(hits * per_text)
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._vectors),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "encode_seconds": self.encode_seconds,
+                "saved_seconds": self.saved_seconds,
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache, persisted to disk if EMBEDDING_CACHE_PERSIST=true."""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            store = None
+            if os.getenv("EMBEDDING_CACHE_PERSIST", "").lower() == "true":
+                store = DiskCache(
+                    os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(get_cache_dir(), "embeddings.sqlite"),
+                    max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024,
+                    # float16 vectors barely compress
+                    compress=False,
+                )
+            _embedding_cache = EmbeddingCache(int(os.getenv("EMBEDDING_CACHE_ENTRIES", "50000")), store)
+        return _embedding_cache
@@ -0,0 +1,348 @@
+"""
+Latency-aware hedged requests and model fallback tiers.
+
+Every upstream LLM call is timed per (model, graph node, call kind). Once a
+call runs past a deadline derived from that history (p95 by default), a
+backup request is raced against it: a duplicate to the same model, or the
+next faster model configured in LLM_FALLBACKS. The first response wins; the
+loser is cancelled (async) or abandoned and closed as soon as it returns
+(threads). Which tier answered is recorded per model.
+
+Hedging is opt-in (LLM_HEDGING_ENABLED=true). Sync attempts then run on a
+bounded pool of LLM_HEDGE_THREADS threads. The deadline runs from when the
+primary starts on that pool, so queueing doesn't cause hedges, and no backup
+is sent while the pool is full.
+
+For streamed calls the race is on time-to-first-chunk, after which the
+winning stream is consumed as usual.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import chain
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
+
+
+def hedging_enabled() -> bool:
+    # Opt-in: every hedged sync call runs on the hedge pool, not the caller's thread
+    return os.getenv("LLM_HEDGING_ENABLED", "").lower() == "true"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies per key."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple, Deque[float]] = {}
+
+    def observe(self, key: Tuple, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, key: Tuple) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def percentile(self, key: Tuple, q: float) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples.get(key, ()))
+        return _percentile(samples, q) if samples else None
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            items = [(key, list(samples)) for key, samples in self._samples.items()]
+        return {
+            "/".join(str(k) for k in key): {
+                "samples": len(samples),
+                "p50_s": round(_percentile(samples, 50), 3),
+                "p95_s": round(_percentile(samples, 95), 3),
+            }
+            for key, samples in items
+        }
+
+
+class HedgePolicy:
+    def __init__(self):
+        self.percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))
+        # Deadline used until a key has min_samples observations
+        self.initial_deadline = float(os.getenv("LLM_HEDGE_INITIAL_DEADLINE", "45"))
+        self.min_deadline = float(os.getenv("LLM_HEDGE_MIN_DEADLINE", "2"))
+        # At most this fraction of a model's calls may be hedged
+        self.max_ratio = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+        self.fallbacks: Dict[str, List[str]] = json.loads(os.getenv("LLM_FALLBACKS", "{}") or "{}")
+
+        self.latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _model_stats(self, model_id: str) -> Dict[str, Any]:
+        stats = self._stats.get(model_id)
+        if stats is None:
+            stats = self._stats[model_id] = {"calls": 0, "hedged": 0, "skipped": 0, "answered_by": {}}
+        return stats
+
+    def deadline(self, model_id: str, node: Optional[str], kind: str) -> float:
+        """Seconds to wait for `model_id` before launching a backup request."""
+        key = (model_id, node, kind)
+        if self.latency.count(key) < self.min_samples:
+            return self.initial_deadline
+        return max(self.min_deadline, self.latency.percentile(key, self.percentile))
+
+    def backup_model(self, model_id: str) -> str:
+        """Next tier for a hedge: the first configured fallback, else the same model."""
+        tiers = self.fallbacks.get(model_id) or []
+        return tiers[0] if tiers else model_id
+
+    def allow_hedge(self, model_id: str) -> bool:
+        with self._lock:
+            stats = self._model_stats(model_id)
+            allowed = stats["hedged"] < max(1, self.max_ratio * stats["calls"])
+            if not allowed:
+                stats["skipped"] += 1
+            return allowed
+
+    def skipped(self, model_id: str):
+        with self._lock:
+            self._model_stats(model_id)["skipped"] += 1
+
+    def observe(self, model_id: str, node: Optional[str], kind: str, seconds: float):
+        self.latency.observe((model_id, node, kind), seconds)
+
+    def record(self, model_id: str, backup_model: Optional[str], winner: int):
+        """
+        Counts one call to `model_id`. `backup_model` is the model a hedge was
+        sent to (None if the call was not hedged); `winner` is 0 when the
+        primary answered and 1 when the backup did.
+        """
+        if winner == 0:
+            tier = "primary"
+        elif backup_model == model_id:
+            tier = "hedge"
+        else:
+            tier = f"fallback:{backup_model}"
+        with self._lock:
+            stats = self._model_stats(model_id)
+            stats["calls"] += 1
+            if backup_model is not None:
+                stats["hedged"] += 1
+            stats["answered_by"][tier] = stats["answered_by"].get(tier, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                model_id: {**stats, "answered_by": dict(stats["answered_by"])}
+                for model_id, stats in self._stats.items()
+            }
+        return {"models": models, "latency": self.latency.snapshot()}
+
+
+_policy: Optional[HedgePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = HedgePolicy()
+        return _policy
+
+
+def get_hedge_stats() -> Dict[str, Any]:
+    return get_hedge_policy().stats()
+
+
+# Sync attempts run on a bounded pool; abandoned losers hold a thread only
+# until the HTTP client's timeout ends their request
+HEDGE_THREADS = max(2, int(os.getenv("LLM_HEDGE_THREADS", "32")))
+_executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="llm-hedge")
+_running = 0
+_running_lock = threading.Lock()
+
+
+def _submit(fn: Callable[[], T]) -> Tuple[Future, threading.Event]:
+    """Queues fn on the hedge pool; the event is set once a worker starts it."""
+    started = threading.Event()
+    # Each attempt gets its own copy of the caller's context (callbacks, cache bypass)
+    context = contextvars.copy_context()
+
+    def run():
+        global _running
+        with _running_lock:
+            _running += 1
+        started.set()
+        try:
+            return context.run(fn)
+        finally:
+            with _running_lock:
+                _running -= 1
+
+    return _executor.submit(run), started
+
+
+def _pool_has_room() -> bool:
+    # A backup that would queue behind other calls can't beat the primary
+    with _running_lock:
+        return _running < HEDGE_THREADS
+
+
+def _race(primary: Callable[[], T], deadline: float, backup: Callable[[], Optional[Callable[[], T]]], on_loser=None) -> Tuple[T, int]:
+    future, started = _submit(primary)
+    futures: Dict[Future, int] = {future: 0}
+    # The deadline runs from when the primary starts, not from when it was queued
+    started.wait()
+    done, _ = wait(list(futures), timeout=deadline)
+    if not done and _pool_has_room():
+        fn = backup()
+        if fn is not None:
+            futures[_submit(fn)[0]] = 1
+    pending = set(futures)
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in futures:
+                    if loser is future:
+                        continue
+                    # Threads cannot be interrupted: abandon, clean up when it returns
+                    loser.cancel()
+                    if on_loser is not None:
+                        loser.add_done_callback(on_loser)
+                return future.result(), futures[future]
+            error = error or future.exception()
+    raise error
+
+
+def run_hedged(primary: Callable[[], T], deadline: Optional[float], backup: Callable[[], Optional[Callable[[], T]]]) -> Tuple[T, int]:
+    """
+    Runs primary(); if it is still running after `deadline` seconds, asks
+    backup() for a second attempt (None = don't hedge) and returns whichever
+    succeeds first, with 0 for primary or 1 for the backup.
+    """
+    if deadline is None:
+        return primary(), 0
+    return _race(primary, deadline, backup)
+
+
+async def arun_hedged(
+    primary: Callable[[], Awaitable[T]],
+    deadline: Optional[float],
+    backup: Callable[[], Optional[Callable[[], Awaitable[T]]]],
+    on_loser: Optional[Callable[[T], Awaitable[None]]] = None,
+) -> Tuple[T, int]:
+    """
+    Async variant of run_hedged(); the losing attempt is cancelled, or, if it
+    finished in the same round as the winner, its result is passed to on_loser.
+    """
+    if deadline is None:
+        return await primary(), 0
+    tasks = {asyncio.ensure_future(primary()): 0}
+    winner = None
+    try:
+        done, _ = await asyncio.wait(list(tasks), timeout=deadline)
+        if not done:
+            fn = backup()
+            if fn is not None:
+                tasks[asyncio.ensure_future(fn())] = 1
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    return task.result(), tasks[task]
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            elif task is not winner and on_loser is not None and not task.cancelled() and task.exception() is None:
+                await on_loser(task.result())
+
+
+def _first_chunk(factory: Callable[[], Iterator[T]]) -> Tuple[Iterator[T], Any]:
+    iterator = factory()
+    return iterator, next(iterator, _END)
+
+
+def _close_stream(future: Future):
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].close()
+
+
+def _resume(iterator: Iterator[T], first: Any) -> Iterator[T]:
+    return iter(()) if first is _END else chain([first], iterator)
+
+
+def run_hedged_stream(
+    primary: Callable[[], Iterator[T]],
+    deadline: Optional[float],
+    backup: Callable[[], Optional[Callable[[], Iterator[T]]]],
+) -> Tuple[Iterator[T], int]:
+    """Races streams on their first chunk; returns the winning stream."""
+    if deadline is None:
+        return primary(), 0
+    make_backup = lambda: (lambda fn: None if fn is None else (lambda: _first_chunk(fn)))(backup())
+    (iterator, first), winner = _race(lambda: _first_chunk(primary), deadline, make_backup, _close_stream)
+    return _resume(iterator, first), winner
+
+
+async def _afirst_chunk(factory: Callable[[], AsyncIterator[T]]) -> Tuple[AsyncIterator[T], Any]:
+    iterator = factory()
+    try:
+        return iterator, await iterator.__anext__()
+    except StopAsyncIteration:
+        return iterator, _END
+
+
+async def _aclose_stream(result: Tuple[AsyncIterator[T], Any]):
+    await result[0].aclose()
+
+
+async def _aresume(iterator: AsyncIterator[T], first: Any) -> AsyncIterator[T]:
+    if first is _END:
+        return
+    yield first
+    async for item in iterator:
+        yield item
+
+
+async def arun_hedged_stream(
+    primary: Callable[[], AsyncIterator[T]],
+    deadline: Optional[float],
+    backup: Callable[[], Optional[Callable[[], AsyncIterator[T]]]],
+) -> Tuple[AsyncIterator[T], int]:
+    """Async variant of run_hedged_stream(); the losing stream is cancelled or closed."""
+    if deadline is None:
+        return primary(), 0
+
+    def make_backup():
+        fn = backup()
+        return None if fn is None else (lambda: _afirst_chunk(fn))
+
+    (iterator, first), winner = await arun_hedged(lambda: _afirst_chunk(primary), deadline, make_backup, _aclose_stream)
+    return _aresume(iterator, first), winner
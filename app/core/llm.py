@@ -1,10 +1,36 @@
 import os
+import asyncio
+import atexit
+import hashlib
+import threading
 import httpx
 import ssl
 import urllib3
 import certifi
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from langchain_groq import ChatGroq
+from langchain_core.load import dumps
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
 from dotenv import load_dotenv
+from app.core.llm_cache import get_response_cache
+from app.core.rate_limit import (
+    get_rate_limiter,
+    rate_limiting_enabled,
+    observe_response,
+    aobserve_response,
+)
+from app.core.tokens import count_message_tokens, estimate_request_tokens, record_usage
+from app.core.singleflight import SingleFlight
+from app.core.hedging import (
+    arun_hedged,
+    arun_hedged_stream,
+    get_hedge_policy,
+    hedging_enabled,
+    run_hedged,
+    run_hedged_stream,
+)
+from app.core.telemetry import LLMCall
 
 load_dotenv()
 
@@ -19,31 +45,476 @@ if _disable_ssl:
     os.environ['REQUESTS_CA_BUNDLE'] = ''
     os.environ['SSL_CERT_FILE'] = ''
 
-def get_http_client():
+def _pool_limits() -> httpx.Limits:
+    """Connection pool limits shared by every model client in the process."""
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30")),
+    )
+
+def get_http_client(limits: Optional[httpx.Limits] = None):
     """Get HTTP client with SSL bypass for corporate networks."""
     verify = not _disable_ssl
     proxy = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
+    limits = limits or _pool_limits()
+    
+    # Rate-limit headers on every response feed the shared per-model limiters
+    hooks = {"response": [observe_response]}
     
     if proxy:
-        return httpx.Client(proxy=proxy, verify=verify, timeout=60.0)
-    return httpx.Client(verify=verify, timeout=60.0)
+        return httpx.Client(proxy=proxy, verify=verify, timeout=60.0, limits=limits, event_hooks=hooks)
+    return httpx.Client(verify=verify, timeout=60.0, limits=limits, event_hooks=hooks)
 
-def get_model(model_id: str, temperature: float = 0.0):
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY environment variable not set")
+def get_async_http_client(limits: Optional[httpx.Limits] = None):
+    """Async counterpart of get_http_client, used by ainvoke/astream."""
+    verify = not _disable_ssl
+    proxy = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
+    limits = limits or _pool_limits()
     
-    # Create custom http client with SSL bypass
-    http_client = get_http_client()
+    hooks = {"response": [aobserve_response]}
     
-    return ChatGroq(
-        model=model_id,
-        temperature=temperature,
-        api_key=api_key,
-        timeout=60,
-        max_retries=3,
-        http_client=http_client
-    )
+    if proxy:
+        return httpx.AsyncClient(proxy=proxy, verify=verify, timeout=60.0, limits=limits, event_hooks=hooks)
+    return httpx.AsyncClient(verify=verify, timeout=60.0, limits=limits, event_hooks=hooks)
+
+def _count_connections(client) -> Dict[str, int]:
+    """Best-effort view into the httpcore pool behind an httpx client."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+    return {"open": len(connections), "idle": idle}
+
+# Identical upstream requests in flight at the same time share one call
+_llm_flights = SingleFlight("llm")
+
+def singleflight_enabled() -> bool:
+    return os.getenv("LLM_SINGLEFLIGHT_ENABLED", "true").lower() != "false"
+
+def get_singleflight_stats() -> Dict[str, Any]:
+    return _llm_flights.stats()
+
+def _clone(value):
+    # Followers get private copies: LangChain stamps ids/metadata on results
+    return value.model_copy(deep=True)
+
+def _usage(message) -> Dict[str, int]:
+    return getattr(message, "usage_metadata", None) or {}
+
+def _result_usage(result: ChatResult) -> Dict[str, int]:
+    return _usage(result.generations[0].message) if result.generations else {}
+
+def _node_name(run_manager) -> Optional[str]:
+    metadata = getattr(run_manager, "metadata", None) or {}
+    return metadata.get("langgraph_node")
+
+class ManagedChatGroq(ChatGroq):
+    """
+    ChatGroq whose upstream calls are de-duplicated across concurrent callers,
+    pass through the shared per-model rate limiter, are hedged once they run
+    past their latency deadline and report their actual token usage. Cache
+    hits never reach these methods, so they cost no quota; coalesced
+    followers skip the limiter as well.
+    """
+
+    def _flight_key(self, kind: str, messages: List[BaseMessage], stop, kwargs: Dict[str, Any]) -> str:
+        digest = hashlib.sha256()
+        digest.update(kind.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(self._get_llm_string(stop=stop, **kwargs).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(dumps([m.model_copy(update={"id": None}) for m in messages]).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _settle(self, limiter, estimate: int, messages: List[BaseMessage], usage: Dict[str, int], run_manager):
+        if limiter is not None:
+            limiter.settle(estimate, usage.get("total_tokens"))
+        record_usage(
+            self.model_name,
+            messages,
+            usage.get("input_tokens"),
+            usage.get("output_tokens"),
+            node=_node_name(run_manager),
+        )
+
+    def _settle_unfinished(self, limiter, estimate: int, messages: List[BaseMessage]):
+        # A failed attempt, a hedge loser that was cancelled or closed, or a
+        # stream abandoned early: charge the prompt, return the output allowance
+        if limiter is not None:
+            limiter.settle(estimate, count_message_tokens(messages, self.model_name))
+
+    def _limiter(self):
+        return get_rate_limiter(self.model_name) if rate_limiting_enabled() else None
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if not singleflight_enabled():
+            return self._generate_upstream(messages, stop, run_manager, **kwargs)
+        return _llm_flights.do(
+            self._flight_key("generate", messages, stop, kwargs),
+            lambda: self._generate_upstream(messages, stop, run_manager, **kwargs),
+            clone=_clone,
+        )
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if not singleflight_enabled():
+            return await self._agenerate_upstream(messages, stop, run_manager, **kwargs)
+        return await _llm_flights.ado(
+            self._flight_key("generate", messages, stop, kwargs),
+            lambda: self._agenerate_upstream(messages, stop, run_manager, **kwargs),
+            clone=_clone,
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if not singleflight_enabled():
+            yield from self._stream_upstream(messages, stop, run_manager, **kwargs)
+            return
+        key = self._flight_key("stream", messages, stop, kwargs)
+        while True:
+            future, leader = _llm_flights.join(key)
+            if leader:
+                break
+            done, chunks = _llm_flights.follow(future)
+            if done:
+                # Followers replay the leader's chunks once it has finished
+                for chunk in chunks:
+                    yield _clone(chunk)
+                return
+        chunks = []
+        try:
+            for chunk in self._stream_upstream(messages, stop, run_manager, **kwargs):
+                chunks.append(_clone(chunk))
+                yield chunk
+        except BaseException as e:
+            _llm_flights.publish(key, future, error=e)
+            raise
+        _llm_flights.publish(key, future, value=chunks)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if not singleflight_enabled():
+            async for chunk in self._astream_upstream(messages, stop, run_manager, **kwargs):
+                yield chunk
+            return
+        key = self._flight_key("stream", messages, stop, kwargs)
+        while True:
+            future, leader = _llm_flights.join(key)
+            if leader:
+                break
+            done, chunks = await _llm_flights.afollow(future)
+            if done:
+                for chunk in chunks:
+                    yield _clone(chunk)
+                return
+        chunks = []
+        try:
+            async for chunk in self._astream_upstream(messages, stop, run_manager, **kwargs):
+                chunks.append(_clone(chunk))
+                yield chunk
+        except BaseException as e:
+            _llm_flights.publish(key, future, error=e)
+            raise
+        _llm_flights.publish(key, future, value=chunks)
+
+    def _backup(self, estimate: int) -> Optional[Tuple["ManagedChatGroq", Any]]:
+        """
+        Picks the model for a hedged request and reserves rate-limit capacity
+        for it. Returns None (no hedge) when the hedge budget is spent or the
+        backup model has no capacity free right now: hedges never queue.
+        """
+        policy = get_hedge_policy()
+        if not policy.allow_hedge(self.model_name):
+            return None
+        backup_id = policy.backup_model(self.model_name)
+        # ChatGroq stores temperature 0 as 1e-8; map it back to the registry key
+        temperature = 0.0 if self.temperature == 1e-8 else self.temperature
+        backup = self if backup_id == self.model_name else get_model(backup_id, temperature)
+        limiter = backup._limiter()
+        if limiter is not None and not limiter.try_acquire(estimate):
+            policy.skipped(self.model_name)
+            return None
+        return backup, limiter
+
+    def _deadline(self, kind: str, run_manager) -> Optional[float]:
+        if not hedging_enabled():
+            return None
+        return get_hedge_policy().deadline(self.model_name, _node_name(run_manager), kind)
+
+    def _generate_upstream(self, messages, stop, run_manager, **kwargs) -> ChatResult:
+        limiter = self._limiter()
+        estimate = estimate_request_tokens(messages, self.model_name)
+        if limiter is not None:
+            limiter.acquire(estimate)
+        backups = []
+
+        def backup():
+            chosen = self._backup(estimate)
+            if chosen is None:
+                return None
+            backups.append(chosen[0].model_name)
+            return lambda: chosen[0]._generate_attempt(chosen[1], estimate, messages, stop, run_manager, **kwargs)
+
+        result, winner = run_hedged(
+            lambda: self._generate_attempt(limiter, estimate, messages, stop, run_manager, **kwargs),
+            self._deadline("generate", run_manager),
+            backup,
+        )
+        get_hedge_policy().record(self.model_name, backups[0] if backups else None, winner)
+        return result
+
+    async def _agenerate_upstream(self, messages, stop, run_manager, **kwargs) -> ChatResult:
+        limiter = self._limiter()
+        estimate = estimate_request_tokens(messages, self.model_name)
+        if limiter is not None:
+            await limiter.aacquire(estimate)
+        backups = []
+
+        def backup():
+            chosen = self._backup(estimate)
+            if chosen is None:
+                return None
+            backups.append(chosen[0].model_name)
+            return lambda: chosen[0]._agenerate_attempt(chosen[1], estimate, messages, stop, run_manager, **kwargs)
+
+        result, winner = await arun_hedged(
+            lambda: self._agenerate_attempt(limiter, estimate, messages, stop, run_manager, **kwargs),
+            self._deadline("generate", run_manager),
+            backup,
+        )
+        get_hedge_policy().record(self.model_name, backups[0] if backups else None, winner)
+        return result
+
+    def _stream_upstream(self, messages, stop, run_manager, **kwargs) -> Iterator[ChatGenerationChunk]:
+        limiter = self._limiter()
+        estimate = estimate_request_tokens(messages, self.model_name)
+        if limiter is not None:
+            limiter.acquire(estimate)
+        backups = []
+
+        def backup():
+            chosen = self._backup(estimate)
+            if chosen is None:
+                return None
+            backups.append(chosen[0].model_name)
+            return lambda: chosen[0]._stream_attempt(chosen[1], estimate, messages, stop, run_manager, **kwargs)
+
+        chunks, winner = run_hedged_stream(
+            lambda: self._stream_attempt(limiter, estimate, messages, stop, run_manager, **kwargs),
+            self._deadline("stream", run_manager),
+            backup,
+        )
+        get_hedge_policy().record(self.model_name, backups[0] if backups else None, winner)
+        yield from chunks
+
+    async def _astream_upstream(self, messages, stop, run_manager, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        limiter = self._limiter()
+        estimate = estimate_request_tokens(messages, self.model_name)
+        if limiter is not None:
+            await limiter.aacquire(estimate)
+        backups = []
+
+        def backup():
+            chosen = self._backup(estimate)
+            if chosen is None:
+                return None
+            backups.append(chosen[0].model_name)
+            return lambda: chosen[0]._astream_attempt(chosen[1], estimate, messages, stop, run_manager, **kwargs)
+
+        chunks, winner = await arun_hedged_stream(
+            lambda: self._astream_attempt(limiter, estimate, messages, stop, run_manager, **kwargs),
+            self._deadline("stream", run_manager),
+            backup,
+        )
+        get_hedge_policy().record(self.model_name, backups[0] if backups else None, winner)
+        async for chunk in chunks:
+            yield chunk
+
+    # One upstream request each, timed into the telemetry metrics and the
+    # hedge policy. Latency excludes rate-limit queueing; the hedge policy
+    # times streams by their first chunk. Every attempt settles its own
+    # limiter reservation, including the loser of a hedge once it finishes
+    # or is cancelled.
+
+    def _generate_attempt(self, limiter, estimate, messages, stop, run_manager, **kwargs) -> ChatResult:
+        node = _node_name(run_manager)
+        call = LLMCall(self.model_name, node)
+        try:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except BaseException as e:
+            call.fail(e)
+            self._settle_unfinished(limiter, estimate, messages)
+            raise
+        usage = _result_usage(result)
+        get_hedge_policy().observe(self.model_name, node, "generate", call.finish(usage))
+        self._settle(limiter, estimate, messages, usage, run_manager)
+        return result
+
+    async def _agenerate_attempt(self, limiter, estimate, messages, stop, run_manager, **kwargs) -> ChatResult:
+        node = _node_name(run_manager)
+        call = LLMCall(self.model_name, node)
+        try:
+            result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except BaseException as e:
+            call.fail(e)
+            self._settle_unfinished(limiter, estimate, messages)
+            raise
+        usage = _result_usage(result)
+        get_hedge_policy().observe(self.model_name, node, "generate", call.finish(usage))
+        self._settle(limiter, estimate, messages, usage, run_manager)
+        return result
+
+    def _stream_attempt(self, limiter, estimate, messages, stop, run_manager, **kwargs) -> Iterator[ChatGenerationChunk]:
+        node = _node_name(run_manager)
+        call = LLMCall(self.model_name, node)
+        usage: Dict[str, int] = {}
+        try:
+            for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                if call.ttft is None:
+                    get_hedge_policy().observe(self.model_name, node, "stream", call.first_token())
+                usage = _usage(chunk.message) or usage
+                yield chunk
+        except BaseException as e:
+            call.fail(e)
+            self._settle_unfinished(limiter, estimate, messages)
+            raise
+        call.finish(usage)
+        self._settle(limiter, estimate, messages, usage, run_manager)
+
+    async def _astream_attempt(self, limiter, estimate, messages, stop, run_manager, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        node = _node_name(run_manager)
+        call = LLMCall(self.model_name, node)
+        usage: Dict[str, int] = {}
+        try:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                if call.ttft is None:
+                    get_hedge_policy().observe(self.model_name, node, "stream", call.first_token())
+                usage = _usage(chunk.message) or usage
+                yield chunk
+        except BaseException as e:
+            call.fail(e)
+            self._settle_unfinished(limiter, estimate, messages)
+            raise
+        call.finish(usage)
+        self._settle(limiter, estimate, messages, usage, run_manager)
+
+class ModelRegistry:
+    """
+    Process-wide pool of ManagedChatGroq clients keyed by (model_id, temperature).
+    
+    All models share one sync and one async httpx client, so keep-alive
+    connections to Groq are reused across nodes, threads and jobs instead of
+    paying a new TLS handshake per call. ChatGroq instances are stateless
+    between calls, which makes sharing them safe from threads and tasks alike.
+    """
+
+    def __init__(self, limits: Optional[httpx.Limits] = None):
+        self._limits = limits
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple[str, float], ManagedChatGroq] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+        self._created = 0
+        self._reused = 0
+
+    def get(self, model_id: str, temperature: float = 0.0) -> ManagedChatGroq:
+        key = (model_id, float(temperature))
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._reused += 1
+                return model
+            
+            api_key = os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("GROQ_API_KEY environment variable not set")
+            
+            if self._http_client is None:
+                self._http_client = get_http_client(self._limits)
+            if self._async_http_client is None:
+                self._async_http_client = get_async_http_client(self._limits)
+            
+            model = ManagedChatGroq(
+                model=model_id,
+                temperature=temperature,
+                api_key=api_key,
+                timeout=60,
+                max_retries=3,
+                http_client=self._http_client,
+                http_async_client=self._async_http_client,
+                # None falls through to LangChain's global cache (unset by default)
+                cache=get_response_cache()
+            )
+            self._models[key] = model
+            self._created += 1
+            return model
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of registry and connection pool usage."""
+        with self._lock:
+            limits = self._limits or _pool_limits()
+            stats = {
+                "models": sorted(f"{m}@{t}" for m, t in self._models),
+                "created": self._created,
+                "reused": self._reused,
+                "limits": {
+                    "max_connections": limits.max_connections,
+                    "max_keepalive_connections": limits.max_keepalive_connections,
+                    "keepalive_expiry": limits.keepalive_expiry,
+                },
+                "sync_pool": {"open": 0, "idle": 0},
+                "async_pool": {"open": 0, "idle": 0},
+            }
+            if self._http_client is not None:
+                stats["sync_pool"] = _count_connections(self._http_client)
+            if self._async_http_client is not None:
+                stats["async_pool"] = _count_connections(self._async_http_client)
+            return stats
+
+    def _detach(self):
+        with self._lock:
+            clients = (self._http_client, self._async_http_client)
+            self._models.clear()
+            self._http_client = None
+            self._async_http_client = None
+        return clients
+
+    def close(self):
+        """Closes pooled connections. Later get() calls start a fresh pool."""
+        http_client, async_http_client = self._detach()
+        if http_client is not None:
+            http_client.close()
+        if async_http_client is not None:
+            # From inside a running loop use aclose() instead; here we can only
+            # drop the client and let it be collected.
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                try:
+                    asyncio.run(async_http_client.aclose())
+                except RuntimeError:
+                    # Connections bound to an event loop that has already closed
+                    pass
+
+    async def aclose(self):
+        """Async variant of close() for use from a running event loop."""
+        http_client, async_http_client = self._detach()
+        if http_client is not None:
+            http_client.close()
+        if async_http_client is not None:
+            await async_http_client.aclose()
+
+_registry = ModelRegistry()
+atexit.register(_registry.close)
+
+def get_model(model_id: str, temperature: float = 0.0):
+    return _registry.get(model_id, temperature)
+
+def get_pool_stats() -> Dict[str, Any]:
+    return _registry.stats()
+
+def close_models():
+    _registry.close()
+
+async def aclose_models():
+    await _registry.aclose()
 
 def get_planner_model():
     # Using 120B for high-quality planning
@@ -0,0 +1,106 @@
+"""
+Persistent LLM response cache.
+
+Plugs into LangChain's cache hook on the chat model, so a lookup happens before
+any rate limiting or network I/O. Entries are keyed on a hash of the model
+configuration (model id, temperature, stop words, ...) and the serialized
+prompt, and stored in a DiskCache with TTL and LRU eviction.
+
+The cache is opt-in (LLM_CACHE_ENABLED=true). A single job can skip it with
+`bypass_llm_cache()`, e.g. when the user explicitly asks for a fresh article.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+from app.core.disk_cache import DiskCache, get_cache_dir
+
+# Only these classes may be rebuilt from cache entries
+_CACHEABLE = [Generation, ChatGeneration, AIMessage]
+
+_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_llm_cache(enabled: bool = True):
+    """Disables cache reads and writes for LLM calls made inside this context."""
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def llm_cache_bypassed() -> bool:
+    """True inside bypass_llm_cache(); other caches of LLM output honour it too."""
+    return _bypass.get()
+
+
+class LLMResponseCache(BaseCache):
+    def __init__(self, store: DiskCache):
+        self.store = store
+        self.bypassed = 0
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if _bypass.get():
+            self.bypassed += 1
+            return None
+        data = self.store.get(self._key(prompt, llm_string))
+        if data is None:
+            return None
+        try:
+            return [loads(g, allowed_objects=_CACHEABLE) for g in json.loads(data)]
+        except Exception:
+            # Entry written by an incompatible LangChain version; treat as a miss.
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if _bypass.get():
+            return
+        payload = json.dumps([dumps(g) for g in return_val])
+        self.store.set(self._key(prompt, llm_string), payload.encode("utf-8"))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "bypassed": self.bypassed}
+
+
+_response_cache: Optional[LLMResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Returns the process-wide response cache, or None if caching is disabled."""
+    global _response_cache
+    if os.getenv("LLM_CACHE_ENABLED", "").lower() != "true":
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            ttl = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+            store = DiskCache(
+                os.getenv("LLM_CACHE_PATH") or os.path.join(get_cache_dir(), "llm_cache.sqlite"),
+                ttl=ttl if ttl > 0 else None,
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024,
+            )
+            _response_cache = LLMResponseCache(store)
+        return _response_cache
@@ -0,0 +1,168 @@
+"""
+Persistent cache of scraped web pages.
+
+Pages are keyed on the normalized URL and stored in a DiskCache
+(zlib-compressed, least recently used entries evicted above PAGE_CACHE_MAX_MB)
+together with their trafilatura extract, so a hit skips both the download and
+the extraction.
+
+Freshness follows the response: `Cache-Control: no-store` is never cached,
+`no-cache` is always revalidated, otherwise `max-age` or `Expires` decide,
+with PAGE_CACHE_MAX_AGE for pages that say nothing. Stale entries are
+revalidated with If-None-Match / If-Modified-Since; a 304 refreshes the entry
+without downloading or extracting the page again.
+
+The cache is on by default; PAGE_CACHE_ENABLED=false turns it off.
+"""
+
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from pydantic import BaseModel
+
+from app.core.disk_cache import DiskCache, get_cache_dir
+
+# Query parameters that never change what a page says
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used as the cache key: lowercase host, no fragment, sorted query, no trackers."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port is not None and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(_TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def _cache_control(headers: Mapping[str, str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in (headers.get("cache-control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def fresh_until(headers: Mapping[str, str], now: float, default_max_age: float) -> Optional[float]:
+    """When a response stops being fresh, or None if it must not be stored."""
+    directives = _cache_control(headers)
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return now
+    if directives.get("max-age") is not None:
+        try:
+            age = int(headers.get("age") or 0)
+            return now + max(int(directives["max-age"]) - age, 0)
+        except ValueError:
+            return now
+    if headers.get("expires"):
+        try:
+            return parsedate_to_datetime(headers["expires"]).timestamp()
+        except (TypeError, ValueError):
+            # Invalid Expires means already expired
+            return now
+    return now + default_max_age
+
+
+class CachedPage(BaseModel):
+    url: str
+    html: str
+    text: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fresh_until: float = 0.0
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (time.time() if now is None else now) < self.fresh_until
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidating this page."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    def __init__(self, store: DiskCache, default_max_age: float = 24 * 3600):
+        self.store = store
+        self.default_max_age = default_max_age
+        self.revalidated = 0
+        self.not_stored = 0
+
+    def lookup(self, url: str) -> Optional[CachedPage]:
+        """Cached page for `url`, fresh or stale, or None."""
+        data = self.store.get(normalize_url(url))
+        if data is None:
+            return None
+        try:
+            return CachedPage.model_validate_json(data)
+        except ValueError:
+            return None
+
+    def save(self, url: str, html: str, text: Optional[str], headers: Mapping[str, str]) -> Optional[CachedPage]:
+        """Stores a downloaded page unless its headers forbid it."""
+        until = fresh_until(headers, time.time(), self.default_max_age)
+        if until is None:
+            self.not_stored += 1
+            self.store.delete(normalize_url(url))
+            return None
+        page = CachedPage(
+            url=url,
+            html=html,
+            text=text,
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            fresh_until=until,
+        )
+        self.store.set(normalize_url(url), page.model_dump_json().encode("utf-8"))
+        return page
+
+    def refresh(self, page: CachedPage, headers: Mapping[str, str]) -> CachedPage:
+        """Records a 304 Not Modified: same content, new freshness and validators."""
+        self.revalidated += 1
+        until = fresh_until(headers, time.time(), self.default_max_age)
+        page = page.model_copy(update={
+            "etag": headers.get("etag") or page.etag,
+            "last_modified": headers.get("last-modified") or page.last_modified,
+            "fresh_until": until if until is not None else 0.0,
+        })
+        self.store.set(normalize_url(page.url), page.model_dump_json().encode("utf-8"))
+        return page
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "revalidated": self.revalidated, "not_stored": self.not_stored}
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """Returns the process-wide page cache, or None if it is disabled."""
+    global _page_cache
+    if os.getenv("PAGE_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            store = DiskCache(
+                os.getenv("PAGE_CACHE_PATH") or os.path.join(get_cache_dir(), "pages.sqlite"),
+                max_bytes=int(os.getenv("PAGE_CACHE_MAX_MB", "512")) * 1024 * 1024,
+            )
+            _page_cache = PageCache(store, default_max_age=float(os.getenv("PAGE_CACHE_MAX_AGE", str(24 * 3600))))
+        return _page_cache
@@ -0,0 +1,258 @@
+"""
+Per-model rate limiting for Groq calls, shared by every job in the process.
+
+Each model gets a limiter with two token buckets: requests per minute and
+tokens per minute. Callers reserve capacity up front and sleep until their
+reservation is covered, so bursts from parallel critics/SEO agents queue
+up in arrival order instead of turning into 429s and retry storms.
+
+Limits start from DEFAULT_LIMITS (Groq's published free-tier numbers),
+can be overridden with LLM_RATE_LIMITS, and adapt at runtime from the
+x-ratelimit-* and retry-after headers Groq sends back on every response.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.telemetry import observe_http_response
+
+# Requests and tokens per minute by model id. "default" covers unknown models.
+DEFAULT_LIMITS: Dict[str, Dict[str, int]] = {
+    "openai/gpt-oss-120b": {"rpm": 30, "tpm": 8000},
+    "openai/gpt-oss-20b": {"rpm": 30, "tpm": 8000},
+    "qwen/qwen3-32b": {"rpm": 60, "tpm": 6000},
+    "moonshotai/kimi-k2-instruct": {"rpm": 60, "tpm": 10000},
+    "meta-llama/llama-4-maverick-17b-128e-instruct": {"rpm": 30, "tpm": 6000},
+    "default": {"rpm": 30, "tpm": 6000},
+}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parses Groq reset durations such as '7.66s', '2m59.56s' or '120ms'."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket. Reservations may drive the level negative; the
+    deficit divided by the refill rate is how long the caller must wait.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` and returns the seconds until it is covered."""
+        self.refill(now)
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate) if self.rate > 0 else 0.0
+
+    def resize(self, per_minute: float):
+        per_minute = float(per_minute)
+        if per_minute > 0 and per_minute != self.capacity:
+            self.level = min(self.level, per_minute)
+            self.capacity = per_minute
+
+
+class ModelRateLimiter:
+    def __init__(self, model_id: str, rpm: int, tpm: int):
+        self.model_id = model_id
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+
+        self.calls = 0
+        self.waited_calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.queued = 0
+        self.throttled = 0
+
+    def _reserve(self, tokens: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self._blocked_until - now,
+            )
+            self.calls += 1
+            if wait > 0:
+                self.waited_calls += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                self.queued += 1
+            return wait
+
+    def _done_waiting(self):
+        with self._lock:
+            self.queued -= 1
+
+    def acquire(self, tokens: int) -> float:
+        """Blocks until the request fits within RPM/TPM. Returns seconds waited."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._done_waiting()
+        return wait
+
+    async def aacquire(self, tokens: int) -> float:
+        """Async variant of acquire(); yields the event loop while queued."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._done_waiting()
+        return wait
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Reserves capacity only if it is available right now; never waits."""
+        now = time.monotonic()
+        with self._lock:
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            if (
+                self._blocked_until > now
+                or self.requests.level < 1
+                or self.tokens.level < min(tokens, self.tokens.capacity)
+            ):
+                return False
+            self.requests.reserve(1, now)
+            self.tokens.reserve(tokens, now)
+            self.calls += 1
+            return True
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Returns (or charges) the difference between estimated and actual usage."""
+        if not actual:
+            return
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+
+    def observe(self, headers: httpx.Headers, status_code: int):
+        """Adapts limits from Groq's x-ratelimit-* / retry-after response headers."""
+        now = time.monotonic()
+        with self._lock:
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens and limit_tokens.isdigit():
+                self.tokens.resize(int(limit_tokens))
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens and remaining_tokens.isdigit():
+                self.tokens.refill(now)
+                self.tokens.level = min(self.tokens.level, float(remaining_tokens))
+            # x-ratelimit-*-requests is a per-day budget on Groq: only honour exhaustion
+            if headers.get("x-ratelimit-remaining-requests") == "0":
+                reset = _parse_duration(headers.get("x-ratelimit-reset-requests", ""))
+                if reset:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+            if status_code == 429:
+                self.throttled += 1
+                retry_after = _parse_duration(headers.get("retry-after", ""))
+                if retry_after is None:
+                    retry_after = _parse_duration(headers.get("x-ratelimit-reset-tokens", ""))
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rpm": self.requests.capacity,
+                "tpm": self.tokens.capacity,
+                "calls": self.calls,
+                "waited_calls": self.waited_calls,
+                "queued": self.queued,
+                "total_wait_s": round(self.total_wait, 3),
+                "avg_wait_s": round(self.total_wait / self.waited_calls, 3) if self.waited_calls else 0.0,
+                "max_wait_s": round(self.max_wait, 3),
+                "throttled": self.throttled,
+            }
+
+
+_limiters: Dict[str, ModelRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _configured_limits() -> Dict[str, Dict[str, int]]:
+    limits = {k: dict(v) for k, v in DEFAULT_LIMITS.items()}
+    override = os.getenv("LLM_RATE_LIMITS")
+    if override:
+        for model_id, values in json.loads(override).items():
+            limits.setdefault(model_id, dict(limits["default"])).update(values)
+    return limits
+
+
+def rate_limiting_enabled() -> bool:
+    return os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() != "false"
+
+
+def get_rate_limiter(model_id: str) -> ModelRateLimiter:
+    """Returns the process-wide limiter for a model, creating it on first use."""
+    with _limiters_lock:
+        limiter = _limiters.get(model_id)
+        if limiter is None:
+            limits = _configured_limits()
+            cfg = limits.get(model_id, limits["default"])
+            limiter = ModelRateLimiter(model_id, cfg["rpm"], cfg["tpm"])
+            _limiters[model_id] = limiter
+        return limiter
+
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.model_id: limiter.stats() for limiter in limiters}
+
+
+def _model_of(request: httpx.Request) -> Optional[str]:
+    try:
+        return json.loads(request.content).get("model")
+    except Exception:
+        return None
+
+
+def observe_response(response: httpx.Response):
+    """
+    httpx response hook feeding rate-limit headers back into the limiters
+    and status codes and client retries into the telemetry metrics.
+    """
+    model_id = _model_of(response.request)
+    if model_id:
+        get_rate_limiter(model_id).observe(response.headers, response.status_code)
+        retry_count = response.request.headers.get("x-stainless-retry-count", "0")
+        observe_http_response(model_id, response.status_code, int(retry_count) if retry_count.isdigit() else 0)
+
+
+async def aobserve_response(response: httpx.Response):
+    observe_response(response)
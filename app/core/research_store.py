@@ -0,0 +1,88 @@
+"""
+Shared store of research summaries, reused across jobs and restarts.
+
+A summary depends on the page it was made from, the research query and the
+model that wrote it, so entries are keyed on a digest of all four: the
+normalized URL, a SHA-256 of the extracted page text, the query and the model
+id. A later job that scrapes the same page (usually straight from the page
+cache) for the same query reuses the stored summary instead of calling the
+LLM. If the page has changed since, its content digest differs and the old
+entry simply no longer matches; entries also expire after RESEARCH_STORE_TTL
+and the least recently used are evicted above RESEARCH_STORE_MAX_MB.
+
+The store is on by default (RESEARCH_STORE_ENABLED=false turns it off) and is
+skipped, like the LLM response cache, for jobs run under `bypass_llm_cache()`.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from app.core.disk_cache import DiskCache, get_cache_dir
+from app.core.llm_cache import llm_cache_bypassed
+from app.core.page_cache import normalize_url
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def artifact_id(url: str, digest: str) -> str:
+    """Stable id of one version of a page: same URL and content, same id, in every run."""
+    raw = f"{normalize_url(url)}\x00{digest}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ResearchStore:
+    def __init__(self, store: DiskCache):
+        self.store = store
+        self.reused = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def _key(url: str, digest: str, query: str, model_id: str) -> str:
+        raw = f"{artifact_id(url, digest)}\x00{' '.join(query.lower().split())}\x00{model_id}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, url: str, digest: str, query: str, model_id: str) -> Optional[str]:
+        """Stored summary of this version of the page for this query, or None."""
+        if llm_cache_bypassed():
+            self.bypassed += 1
+            return None
+        data = self.store.get(self._key(url, digest, query, model_id))
+        if data is None:
+            return None
+        self.reused += 1
+        return json.loads(data)["summary"]
+
+    def save(self, url: str, digest: str, query: str, model_id: str, summary: str):
+        if llm_cache_bypassed():
+            return
+        entry = {"url": url, "content_digest": digest, "query": query, "model": model_id, "summary": summary}
+        self.store.set(self._key(url, digest, query, model_id), json.dumps(entry).encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "reused": self.reused, "bypassed": self.bypassed}
+
+
+_research_store: Optional[ResearchStore] = None
+_research_store_lock = threading.Lock()
+
+
+def get_research_store() -> Optional[ResearchStore]:
+    """Returns the process-wide research store, or None if it is disabled."""
+    global _research_store
+    if os.getenv("RESEARCH_STORE_ENABLED", "true").lower() != "true":
+        return None
+    with _research_store_lock:
+        if _research_store is None:
+            ttl = float(os.getenv("RESEARCH_STORE_TTL", str(7 * 24 * 3600)))
+            store = DiskCache(
+                os.getenv("RESEARCH_STORE_PATH") or os.path.join(get_cache_dir(), "research.sqlite"),
+                ttl=ttl if ttl > 0 else None,
+                max_bytes=int(os.getenv("RESEARCH_STORE_MAX_MB", "128")) * 1024 * 1024,
+            )
+            _research_store = ResearchStore(store)
+        return _research_store
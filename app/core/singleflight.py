@@ -0,0 +1,134 @@
+"""
+Single-flight de-duplication of identical in-flight work.
+
+The first caller for a key (the leader) does the work; callers arriving with
+the same key while it is still running (followers) wait for the leader's
+result instead of repeating it. Nothing is remembered once the leader
+finishes, so this is not a cache: it only collapses concurrent duplicates.
+
+Results travel through concurrent.futures.Future, so leaders and followers
+may be any mix of threads and asyncio tasks, even on different event loops.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError as FutureCancelledError
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.retried = 0
+
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """
+        Registers interest in `key`. Returns the shared future and whether the
+        caller is the leader, in which case it must call publish() exactly once.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def publish(self, key: str, future: Future, value: Any = None, error: Optional[BaseException] = None):
+        """Completes a leader's flight and releases the key for new callers."""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if isinstance(error, (asyncio.CancelledError, FutureCancelledError, GeneratorExit)):
+            # Leader went away (cancelled, or its stream was abandoned);
+            # followers retry rather than fail
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def follow(self, future: Future) -> Tuple[bool, Any]:
+        """
+        Waits for a leader. Returns (True, value), or (False, None) if the
+        leader was cancelled and the caller should join() again.
+        """
+        try:
+            return True, future.result()
+        except FutureCancelledError:
+            self._count_retry()
+            return False, None
+
+    async def afollow(self, future: Future) -> Tuple[bool, Any]:
+        """Async variant of follow()."""
+        try:
+            return True, await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if task is not None and task.cancelling():
+                raise
+            # The leader was cancelled, not us
+            self._count_retry()
+            return False, None
+
+    def _count_retry(self):
+        with self._lock:
+            self.retried += 1
+
+    def do(self, key: str, fn: Callable[[], T], clone: Optional[Callable[[T], T]] = None) -> T:
+        """
+        Runs fn() once for all concurrent callers with the same key. `clone`
+        gives each follower (and the stored result) its own copy, for results
+        callers go on to mutate.
+        """
+        while True:
+            future, leader = self.join(key)
+            if leader:
+                break
+            done, value = self.follow(future)
+            if done:
+                return clone(value) if clone else value
+
+        try:
+            value = fn()
+        except BaseException as e:
+            self.publish(key, future, error=e)
+            raise
+        self.publish(key, future, value=clone(value) if clone else value)
+        return value
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]], clone: Optional[Callable[[T], T]] = None) -> T:
+        """Async variant of do(); followers wait without blocking the event loop."""
+        while True:
+            future, leader = self.join(key)
+            if leader:
+                break
+            done, value = await self.afollow(future)
+            if done:
+                return clone(value) if clone else value
+
+        try:
+            value = await fn()
+        except BaseException as e:
+            self.publish(key, future, error=e)
+            raise
+        self.publish(key, future, value=clone(value) if clone else value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "retried": self.retried,
+            }
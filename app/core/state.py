@@ -1,6 +1,7 @@
-from typing import List, Dict, Annotated, TypedDict
+from typing import List, Dict, Annotated, Optional, TypedDict
 import operator
-from app.core.vfs import VFS
+from app.core.vfs import VFS, VFSData
+from app.core.vector_index import ResearchIndexData
 
 # We can't put VFS in a Pydantic model easily if we want it to be mutable and shared efficiently, 
 # but for LangGraph state, it needs to be serializable if we use persistence.
@@ -16,6 +17,28 @@ class Task(TypedDict):
     params: Dict # extra params
 
 
+def merge_plan(current: List[Task], update: List[Task]) -> List[Task]:
+    """
+    Reducer for plan: tasks in the update replace the tasks with the same id
+    and new ids are appended. Parallel research branches each return just
+    their own task, so their status updates don't overwrite each other.
+    """
+    updated = {task["id"]: task for task in update or []}
+    merged = [updated.pop(task["id"], task) for task in current or []]
+    merged.extend(updated.values())
+    return merged
+
+
+def advance_index(current: int, update: int) -> int:
+    """Reducer for current_task_index: parallel branches can only move it forward."""
+    return max(current or 0, update)
+
+
+def latest(current: Optional[str], update: Optional[str]) -> Optional[str]:
+    """Reducer for values every parallel branch writes the same way (e.g. research_batch)."""
+    return update
+
+
 class FAQItem(TypedDict):
     question: str
     answer: str
@@ -55,13 +78,21 @@ class AgentState(TypedDict):
     language: str
     
     # Execution State
-    plan: List[Task]
-    current_task_index: int
+    # Research tasks can complete in parallel: plan merges per-task updates
+    # and the index only moves forward
+    plan: Annotated[List[Task], merge_plan]
+    current_task_index: Annotated[int, advance_index]
+    # Research batch in progress: its tasks share page claims, which
+    # collect_research releases when it clears this
+    research_batch: Annotated[Optional[str], latest]
+    
+    # Using a serializable representation for VFS: filename -> File.
+    # Nodes return only the files they wrote or deleted (see merge_vfs).
+    vfs_data: VFSData
     
-    # Using a serializable representation for VFS. 
-    # In a real heavy production, we might store just a reference/ID, 
-    # but here we'll store the files dict directly.
-    vfs_data: Dict[str, Dict] # Filename -> File dict representation
+    # Vector index over research/, built by the first write task and
+    # extended by later ones; checkpointed so resumed jobs don't re-embed
+    research_index: Optional[ResearchIndexData]
     
     # SEO Analysis Reports (new fields)
     faqs: List[FAQItem]  # Generated FAQ section
@@ -0,0 +1,229 @@
+"""
+In-process metrics in Prometheus text format.
+
+A deliberately small subset of the Prometheus data model (counters, gauges
+and histograms with labels) so the hot path is a dict lookup and an add
+under a lock, with no extra dependency. `render()` produces the exposition
+format served by the API's /metrics endpoint.
+
+LLM calls are instrumented through `LLMCall`, one per upstream request made
+by app/core/llm.py; retries and HTTP status codes come from the httpx
+response hooks there.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [non-cumulative bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return int(sum(series[:-1])) if series else 0
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+
+    def _add(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+LLM_CALLS = REGISTRY.counter(
+    "llm_calls_total", "Upstream LLM requests by outcome (ok, error, cancelled).", ["node", "model", "outcome"]
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_call_duration_seconds", "Wall time of completed upstream LLM requests.", ["node", "model"]
+)
+LLM_TTFT = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Time to the first streamed chunk.", ["node", "model"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the provider.", ["node", "model", "direction"]
+)
+LLM_IN_FLIGHT = REGISTRY.gauge("llm_calls_in_flight", "Upstream LLM requests currently running.", ["model"])
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "Requests re-sent by the client after a failure.", ["model"])
+LLM_RESPONSES = REGISTRY.counter("llm_http_responses_total", "HTTP responses from the LLM API.", ["model", "code"])
+
+
+class LLMCall:
+    """
+    Timer for one upstream LLM request. Call first_token() on the first
+    streamed chunk, then exactly one of finish() or fail().
+    """
+
+    __slots__ = ("node", "model", "started", "ttft")
+
+    def __init__(self, model: str, node: Optional[str]):
+        self.model = model
+        self.node = node or "unknown"
+        self.started = time.perf_counter()
+        self.ttft: Optional[float] = None
+        LLM_IN_FLIGHT.inc(model=model)
+
+    def first_token(self) -> float:
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+            LLM_TTFT.observe(self.ttft, node=self.node, model=self.model)
+        return self.ttft
+
+    def finish(self, usage: Dict[str, int]) -> float:
+        elapsed = time.perf_counter() - self.started
+        LLM_IN_FLIGHT.dec(model=self.model)
+        LLM_CALLS.inc(node=self.node, model=self.model, outcome="ok")
+        LLM_LATENCY.observe(elapsed, node=self.node, model=self.model)
+        if usage.get("input_tokens"):
+            LLM_TOKENS.inc(usage["input_tokens"], node=self.node, model=self.model, direction="input")
+        if usage.get("output_tokens"):
+            LLM_TOKENS.inc(usage["output_tokens"], node=self.node, model=self.model, direction="output")
+        return elapsed
+
+    def fail(self, error: BaseException):
+        LLM_IN_FLIGHT.dec(model=self.model)
+        # Hedge losers and abandoned streams are cancelled, not failed
+        cancelled = type(error).__name__ in ("CancelledError", "GeneratorExit")
+        LLM_CALLS.inc(node=self.node, model=self.model, outcome="cancelled" if cancelled else "error")
+
+
+def observe_http_response(model: str, status_code: int, retry_count: int):
+    LLM_RESPONSES.inc(model=model, code=str(status_code))
+    if retry_count:
+        LLM_RETRIES.inc(model=model)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,305 @@
+"""
+Token counting and prompt budgeting.
+
+Counts tokens per model: exactly with tiktoken for the gpt-oss models when it
+is installed, otherwise with a per-model characters-per-token ratio that is
+calibrated from the prompt token counts Groq reports back on every call.
+
+Prompt builders render through `fit_prompt()`, which measures the fixed
+instructions, splits what is left of the model's input budget across the
+variable parts (draft, research, ...) and trims each part on section, then
+paragraph, then sentence boundaries instead of slicing at a fixed character
+offset.
+"""
+
+import math
+import os
+import re
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to calibrated ratios
+    tiktoken = None
+
+# Context window (tokens) by model id. "default" covers unknown models.
+CONTEXT_WINDOWS: Dict[str, int] = {
+    "openai/gpt-oss-120b": 131072,
+    "openai/gpt-oss-20b": 131072,
+    "qwen/qwen3-32b": 131072,
+    "moonshotai/kimi-k2-instruct": 131072,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 131072,
+    "default": 131072,
+}
+
+# Starting characters-per-token ratios for English prose; refined at runtime
+DEFAULT_CHARS_PER_TOKEN: Dict[str, float] = {
+    "openai/gpt-oss-120b": 4.2,
+    "openai/gpt-oss-20b": 4.2,
+    "qwen/qwen3-32b": 3.9,
+    "moonshotai/kimi-k2-instruct": 4.0,
+    "meta-llama/llama-4-maverick-17b-128e-instruct": 4.1,
+    "default": 3.8,
+}
+
+# Models whose tokenizer tiktoken ships
+_TIKTOKEN_ENCODINGS = {
+    "openai/gpt-oss-120b": "o200k_base",
+    "openai/gpt-oss-20b": "o200k_base",
+}
+
+TRUNCATION_MARKER = "\n\n[... truncated]"
+
+# Weight of each new observation when calibrating chars-per-token
+_CALIBRATION_ALPHA = 0.2
+
+
+def expected_output_tokens() -> int:
+    """Output tokens reserved per call (LLM_EXPECTED_OUTPUT_TOKENS, default 1000)."""
+    return int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1000"))
+
+
+class TokenCounter:
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+        self.chars_per_token = DEFAULT_CHARS_PER_TOKEN.get(model_id, DEFAULT_CHARS_PER_TOKEN["default"])
+        self._encoding = None
+        encoding_name = _TIKTOKEN_ENCODINGS.get(model_id)
+        if tiktoken is not None and encoding_name:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception:
+                # Encoding files unavailable offline; stay on the ratio
+                self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def calibrate(self, chars: int, tokens: int):
+        """Moves the ratio towards an observed (prompt chars, prompt tokens) pair."""
+        if self.exact or chars <= 0 or tokens <= 0:
+            return
+        observed = chars / tokens
+        self.chars_per_token += _CALIBRATION_ALPHA * (observed - self.chars_per_token)
+
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model_id: Optional[str] = None) -> TokenCounter:
+    model_id = model_id or "default"
+    with _counters_lock:
+        counter = _counters.get(model_id)
+        if counter is None:
+            counter = TokenCounter(model_id)
+            _counters[model_id] = counter
+        return counter
+
+
+def count_tokens(text: str, model_id: Optional[str] = None) -> int:
+    return get_token_counter(model_id).count(text)
+
+
+def _message_text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+def count_message_tokens(messages: Sequence[BaseMessage], model_id: Optional[str] = None) -> int:
+    counter = get_token_counter(model_id)
+    return sum(counter.count(_message_text(m)) for m in messages)
+
+
+def estimate_request_tokens(messages: Sequence[BaseMessage], model_id: Optional[str] = None) -> int:
+    """Token cost of a request for rate limiting: prompt tokens plus an output allowance."""
+    return count_message_tokens(messages, model_id) + expected_output_tokens()
+
+
+def input_budget(model_id: Optional[str] = None) -> int:
+    """
+    Prompt tokens one call may use: the context window, capped at
+    PROMPT_TPM_SHARE of the model's current TPM limit so that a single call
+    can't drain a minute of the rate limit, minus the output allowance, and
+    capped by PROMPT_INPUT_BUDGET if set.
+    """
+    # Imported here: rate_limit must stay importable without this module
+    from app.core.rate_limit import get_rate_limiter
+
+    model_id = model_id or "default"
+    output = expected_output_tokens()
+    window = CONTEXT_WINDOWS.get(model_id, CONTEXT_WINDOWS["default"])
+    # The limiter's TPM adapts to the account's real tier from response headers
+    tpm = get_rate_limiter(model_id).tokens.capacity
+    share = float(os.getenv("PROMPT_TPM_SHARE", "0.5"))
+    budget = int(min(window, tpm * share)) - output
+    override = os.getenv("PROMPT_INPUT_BUDGET")
+    if override:
+        budget = min(budget, int(override))
+    return max(budget, 0)
+
+
+def allocate(budget: int, sizes: Dict[str, int], weights: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """
+    Water-filling split of `budget` tokens across parts. Parts smaller than
+    their (weighted) fair share keep everything and hand the rest to the
+    others; the remaining parts share what is left in proportion to weight.
+    """
+    weights = weights or {}
+    allocation: Dict[str, int] = {}
+    pending = {name: size for name, size in sizes.items()}
+    remaining = max(budget, 0)
+    while pending:
+        total_weight = sum(weights.get(name, 1.0) for name in pending)
+        fits = {
+            name: size for name, size in pending.items()
+            if size <= remaining * weights.get(name, 1.0) / total_weight
+        }
+        if not fits:
+            for name in pending:
+                allocation[name] = int(remaining * weights.get(name, 1.0) / total_weight)
+            break
+        for name, size in fits.items():
+            allocation[name] = size
+            remaining -= size
+            del pending[name]
+    return allocation
+
+
+# Boundaries tried in order when trimming: markdown sections, paragraphs, sentences
+_SPLITTERS = [
+    re.compile(r"(?m)(?=^#{1,6} )"),
+    re.compile(r"(?<=\n\n)"),
+    re.compile(r"(?<=[.!?] )"),
+]
+
+
+def _take_prefix(text: str, budget: int, counter: TokenCounter, level: int = 0) -> str:
+    if counter.count(text) <= budget:
+        return text
+    if level >= len(_SPLITTERS):
+        # No boundary left: cut on characters
+        return text[: max(int(budget * counter.chars_per_token), 0)]
+    pieces = [p for p in _SPLITTERS[level].split(text) if p]
+    if len(pieces) <= 1:
+        return _take_prefix(text, budget, counter, level + 1)
+    kept = []
+    used = 0
+    for piece in pieces:
+        cost = counter.count(piece)
+        if used + cost > budget:
+            if not kept:
+                return _take_prefix(piece, budget, counter, level + 1)
+            break
+        kept.append(piece)
+        used += cost
+    return "".join(kept)
+
+
+def trim_to_tokens(text: str, max_tokens: int, model_id: Optional[str] = None) -> str:
+    """Keeps the head of `text` within `max_tokens`, cutting at the coarsest boundary that fits."""
+    counter = get_token_counter(model_id)
+    if counter.count(text) <= max_tokens:
+        return text
+    budget = max_tokens - counter.count(TRUNCATION_MARKER)
+    if budget <= 0:
+        return ""
+    return _take_prefix(text, budget, counter).rstrip() + TRUNCATION_MARKER
+
+
+def fit_prompt(
+    model_id: Optional[str],
+    render: Callable[..., str],
+    weights: Optional[Dict[str, float]] = None,
+    budget: Optional[int] = None,
+    max_chars: Optional[Dict[str, int]] = None,
+    **parts: str,
+) -> str:
+    """
+    Renders `render(**parts)` with the parts trimmed so the whole prompt fits
+    the model's input budget. The instructions (everything `render` produces
+    with empty parts) are always kept in full. `max_chars` caps single parts
+    (in characters, converted at the model's ratio) below that budget.
+    """
+    counter = get_token_counter(model_id)
+    budget = input_budget(model_id) if budget is None else budget
+    for name, chars in (max_chars or {}).items():
+        parts[name] = trim_to_tokens(parts[name], int(chars / counter.chars_per_token), model_id)
+    overhead = counter.count(render(**{name: "" for name in parts}))
+    sizes = {name: counter.count(text) for name, text in parts.items()}
+    if overhead + sum(sizes.values()) <= budget:
+        return render(**parts)
+    allocation = allocate(budget - overhead, sizes, weights)
+    trimmed = {name: trim_to_tokens(text, allocation[name], model_id) for name, text in parts.items()}
+    return render(**trimmed)
+
+
+class TokenUsageLog:
+    """Actual prompt/completion token counts per call, plus per-model totals."""
+
+    def __init__(self, maxlen: int = 500):
+        self._lock = threading.Lock()
+        self.calls: deque = deque(maxlen=maxlen)
+        self.totals: Dict[str, Dict[str, Any]] = {}
+
+    def record(
+        self,
+        model_id: str,
+        messages: Sequence[BaseMessage],
+        input_tokens: Optional[int],
+        output_tokens: Optional[int],
+        node: Optional[str] = None,
+    ):
+        counter = get_token_counter(model_id)
+        estimated = count_message_tokens(messages, model_id)
+        if input_tokens:
+            counter.calibrate(sum(len(_message_text(m)) for m in messages), input_tokens)
+        with self._lock:
+            self.calls.append({
+                "model": model_id,
+                "node": node,
+                "estimated_input_tokens": estimated,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+            })
+            totals = self.totals.setdefault(model_id, {
+                "calls": 0, "input_tokens": 0, "output_tokens": 0, "estimated_input_tokens": 0,
+            })
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens or 0
+            totals["output_tokens"] += output_tokens or 0
+            totals["estimated_input_tokens"] += estimated
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {}
+            for model_id, totals in self.totals.items():
+                counter = get_token_counter(model_id)
+                models[model_id] = {
+                    **totals,
+                    "chars_per_token": round(counter.chars_per_token, 3),
+                    "exact": counter.exact,
+                }
+            return {"models": models, "recent_calls": list(self.calls)[-20:]}
+
+
+_usage_log = TokenUsageLog()
+
+
+def record_usage(model_id, messages, input_tokens, output_tokens, node=None):
+    _usage_log.record(model_id, messages, input_tokens, output_tokens, node)
+
+
+def get_token_stats() -> Dict[str, Any]:
+    return _usage_log.stats()
@@ -0,0 +1,243 @@
+"""
+Per-job vector index over the research files.
+
+Research only grows during a job, so the index is built once and extended:
+each sync() chunks and embeds just the research files it hasn't seen (or
+whose content changed, which rebuilds it) and adds them to a FAISS index.
+Every write task, and the FAQ and linking agents, search the same index.
+
+Each sync's chunks, fingerprints and float32 vectors are written to the
+blob store as one batch, and the index travels in graph state as
+ResearchIndexData holding only the batch hashes, the same way VFS files hold
+their segment hashes. A checkpoint therefore stays small however much
+research is indexed, each revision adds only its own batch, and a resumed
+job picks the index up without re-embedding anything. Within a process the
+live ResearchIndex is memoized by job index id and revision, so the batches
+aren't reloaded for every task either.
+"""
+
+import base64
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, TypedDict
+
+import faiss
+import numpy as np
+
+from app.core.blobstore import get_blob_store
+from app.core.dedup import FingerprintSet, from_hex, minhash, threshold, to_hex
+from app.core.vfs import VFS
+
+# Paragraphs shorter than this are headings and fragments, not facts
+MIN_CHUNK_CHARS = 50
+
+# Live indexes kept per process (one per recently active job)
+MAX_LIVE_INDEXES = 16
+
+# Singleton for embedding model to avoid reloading
+_embedding_model = None
+
+
+def embedding_model_id() -> str:
+    """Path or name of the embedding model get_embedding_model() loads."""
+    # Check for local model first, then fall back to download
+    # Set EMBEDDING_MODEL_PATH in .env to use a local model
+    model_path = os.getenv("EMBEDDING_MODEL_PATH")
+    if model_path and os.path.exists(model_path):
+        return model_path
+    # Default: download from HuggingFace (requires internet)
+    return os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+
+
+def get_embedding_model():
+    global _embedding_model
+    if _embedding_model is None:
+        model_id = embedding_model_id()
+        if model_id == os.getenv("EMBEDDING_MODEL_PATH"):
+            print(f"  [Embeddings] Loading local embedding model from: {model_id}")
+        else:
+            print(f"  [Embeddings] Loading embedding model: {model_id}")
+        # Imported here: graph state types import this module, and loading torch is slow
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer(model_id)
+    return _embedding_model
+
+
+class Chunk(NamedTuple):
+    source: str
+    text: str
+
+    def render(self) -> str:
+        return f"Source: {self.source}\nContent: {self.text}"
+
+
+class ResearchIndexData(TypedDict):
+    id: str
+    revision: int
+    model: str
+    files: Dict[str, List[str]]  # research file -> content segments it was indexed at
+    batches: List[str]  # blob hashes of the chunk batches, in index order
+
+
+def chunk_file(vfs: VFS, filename: str) -> List[Chunk]:
+    """Paragraph chunks of one research file, tagged with its source URL."""
+    source = vfs.get_file(filename).metadata.get("url", "unknown")
+    paragraphs = (p.strip() for p in vfs.read_file(filename).split("\n\n"))
+    return [Chunk(source, p) for p in paragraphs if len(p) > MIN_CHUNK_CHARS]
+
+
+def chunk_research(vfs: VFS) -> Tuple[List[Chunk], int]:
+    """All research chunks minus near duplicates, and how many were dropped; no index needed."""
+    # Syndicated sources restate the same facts; keep one copy of each chunk
+    seen = FingerprintSet("chunk", threshold("DEDUP_CHUNK_THRESHOLD", 0.7))
+    chunks = [c for f in vfs.iter_prefix("research/") for c in chunk_file(vfs, f) if seen.add_if_new(minhash(c.text))]
+    return chunks, seen.dropped
+
+
+class ResearchIndex:
+    def __init__(self, model_id: str, index_id: Optional[str] = None):
+        self.model_id = model_id
+        self.id = index_id or uuid.uuid4().hex
+        self.revision = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.files: Dict[str, Tuple[str, ...]] = {}
+        self.chunks: List[Chunk] = []
+        self.fingerprints: List[str] = []
+        self.batches: List[str] = []
+        self._index: Optional[faiss.IndexFlatL2] = None
+
+    def _add_vectors(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self._index is None:
+            self._index = faiss.IndexFlatL2(vectors.shape[1])
+        self._index.add(vectors)
+
+    @staticmethod
+    def _put_batch(chunks: List[Chunk], fingerprints: List[str], vectors: np.ndarray) -> str:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return get_blob_store().put(json.dumps({
+            "chunks": [list(c) for c in chunks],
+            "fingerprints": fingerprints,
+            "dim": vectors.shape[1],
+            "vectors": base64.b64encode(vectors.tobytes()).decode("ascii"),
+        }))
+
+    def _load_batch(self, digest: str):
+        batch = json.loads(get_blob_store().get(digest))
+        self.chunks.extend(Chunk(*c) for c in batch["chunks"])
+        self.fingerprints.extend(batch["fingerprints"])
+        self._add_vectors(np.frombuffer(base64.b64decode(batch["vectors"]), dtype=np.float32).reshape(-1, batch["dim"]))
+        self.batches.append(digest)
+
+    def sync(self, vfs: VFS, encode: Callable[[List[str]], np.ndarray]) -> Tuple[int, int]:
+        """
+        Indexes research files added since the last sync; rebuilds if an
+        indexed file changed or went away. Returns (chunks added, near
+        duplicates dropped). Nothing changes if `encode` fails.
+        """
+        with self._lock:
+            current = {name: vfs.get_file(name).segments for name in vfs.iter_prefix("research/")}
+            rebuild = any(current.get(name) != segments for name, segments in self.files.items())
+            indexed = {} if rebuild else self.files
+            fingerprints = [] if rebuild else self.fingerprints
+
+            seen = FingerprintSet("chunk", threshold("DEDUP_CHUNK_THRESHOLD", 0.7), [from_hex(f) for f in fingerprints])
+            new_chunks, new_fingerprints = [], []
+            for name in current:
+                if name in indexed:
+                    continue
+                for chunk in chunk_file(vfs, name):
+                    signature = minhash(chunk.text)
+                    if seen.add_if_new(signature):
+                        new_chunks.append(chunk)
+                        new_fingerprints.append(to_hex(signature))
+            if not rebuild and len(current) == len(self.files):
+                return 0, seen.dropped
+
+            batch = None
+            if new_chunks:
+                vectors = encode([c.render() for c in new_chunks])
+                batch = self._put_batch(new_chunks, new_fingerprints, vectors)
+            if rebuild:
+                self._reset()
+            if batch is not None:
+                self._add_vectors(vectors)
+                self.batches = self.batches + [batch]
+            self.files = current
+            self.chunks = self.chunks + new_chunks
+            self.fingerprints = self.fingerprints + new_fingerprints
+            self.revision += 1
+            return len(new_chunks), seen.dropped
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Chunk]:
+        """The k chunks nearest to the query embedding, nearest first."""
+        with self._lock:
+            if self._index is None or not self.chunks:
+                return []
+            _, ids = self._index.search(np.asarray(query_vector, dtype=np.float32).reshape(1, -1), min(k, len(self.chunks)))
+            return [self.chunks[i] for i in ids[0] if 0 <= i < len(self.chunks)]
+
+    def to_data(self) -> ResearchIndexData:
+        with self._lock:
+            return {
+                "id": self.id,
+                "revision": self.revision,
+                "model": self.model_id,
+                "files": {name: list(segments) for name, segments in self.files.items()},
+                "batches": list(self.batches),
+            }
+
+    @classmethod
+    def from_data(cls, data: ResearchIndexData) -> "ResearchIndex":
+        index = cls(data["model"], data["id"])
+        index.revision = data["revision"]
+        index.files = {name: tuple(segments) for name, segments in data["files"].items()}
+        for digest in data["batches"]:
+            index._load_batch(digest)
+        return index
+
+
+_live: "OrderedDict[str, ResearchIndex]" = OrderedDict()
+_live_lock = threading.Lock()
+
+
+def get_research_index(data: Optional[ResearchIndexData], model_id: str) -> ResearchIndex:
+    """
+    The job's index for `data` (None starts a new one). Reuses the live
+    index when it is at the same revision; a checkpoint from another process
+    or an earlier revision is loaded from its batches instead.
+    """
+    if data is not None and data["model"] != model_id:
+        # Vectors from another embedding model can't be compared
+        data = None
+    with _live_lock:
+        live = _live.get(data["id"]) if data is not None else None
+        if live is None or live.revision != data["revision"]:
+            live = ResearchIndex.from_data(data) if data is not None else ResearchIndex(model_id)
+            _live[live.id] = live
+        _live.move_to_end(live.id)
+        while len(_live) > MAX_LIVE_INDEXES:
+            _live.popitem(last=False)
+        return live
+
+
+def rank_research(data: Optional[ResearchIndexData], query: str, k: int) -> Optional[List[Chunk]]:
+    """
+    The k research chunks most relevant to `query` from the job's index, or
+    None if there is no index or the embedding model can't be loaded.
+    """
+    if not data or not data["batches"]:
+        return None
+    try:
+        model = get_embedding_model()
+        index = get_research_index(data, embedding_model_id())
+        return index.search(model.encode([query])[0], k)
+    except Exception as e:
+        print(f"  [Embeddings] Research index unavailable ({e})")
+        return None
@@ -1,38 +1,313 @@
-from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+from bisect import bisect_left, insort
+from fnmatch import fnmatchcase
 import hashlib
+from app.core.blobstore import get_blob_store
 
-class File(BaseModel):
-    name: str
-    content: str
-    metadata: Dict[str, str] = Field(default_factory=dict)
+class File:
+    """
+    A VFS file: a compact record of name, metadata, version and the blob
+    hashes of its content segments. Only those fields are part of graph
+    state and checkpoints; the text lives in the blob store and is joined on
+    first access to `content`.
+
+    Most files have one segment. Appending adds a segment instead of
+    rewriting the text, so growing a draft section by section stays linear,
+    and `tail()` only reads the last segments.
+    """
+
+    __slots__ = ("name", "segments", "metadata", "version", "_text")
+
+    def __init__(
+        self,
+        name: str,
+        content: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        version: int = 0,
+        segments: Tuple[str, ...] = (),
+        content_hash: Optional[str] = None,
+    ):
+        self.name = name
+        self.metadata = metadata if metadata is not None else {}
+        self.version = version
+        self._text = content
+        if content is not None:
+            segments = (get_blob_store().put(content),)
+        elif content_hash:
+            # Checkpoints written before files were segmented
+            segments = (content_hash,)
+        self.segments = tuple(segments)
+
+    def _asdict(self) -> dict:
+        # Persistent fields only; also what the checkpoint serializer stores
+        return {"name": self.name, "segments": self.segments, "metadata": self.metadata, "version": self.version}
+
+    def __repr__(self) -> str:
+        return f"File(name={self.name!r}, segments={len(self.segments)}, version={self.version})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, File) and self._asdict() == other._asdict()
+
+    __hash__ = None
+
+    @property
+    def content(self) -> str:
+        if self._text is None:
+            store = get_blob_store()
+            self._text = "".join(store.get(digest) for digest in self.segments)
+        return self._text
+
+    def tail(self, chars: int) -> str:
+        """Last `chars` characters, reading only as many segments as needed."""
+        if self._text is not None:
+            return self._text[-chars:] if chars > 0 else ""
+        store = get_blob_store()
+        parts: List[str] = []
+        length = 0
+        for digest in reversed(self.segments):
+            if length >= chars:
+                break
+            part = store.get(digest)
+            parts.append(part)
+            length += len(part)
+        text = "".join(reversed(parts))
+        return text[-chars:] if chars > 0 else ""
+
+    def appended(self, text: str, version: Optional[int] = None, metadata: Optional[Dict[str, str]] = None) -> "File":
+        """New File with `text` added as a segment; this one is unchanged."""
+        return File(
+            self.name,
+            metadata=self.metadata if metadata is None else metadata,
+            version=self.version + 1 if version is None else version,
+            segments=self.segments + (get_blob_store().put(text),),
+        )
+
+    def with_version(self, version: int) -> "File":
+        file = File(self.name, metadata=self.metadata, version=version, segments=self.segments)
+        file._text = self._text
+        return file
+
+# A change set for vfs_data: filename -> new File, or None to delete the file
+VFSDelta = Dict[str, Optional[File]]
+
+def _version(file) -> int:
+    if isinstance(file, dict):
+        return file.get("version", 0)
+    return getattr(file, "version", 0)
+
+def _metadata_items(file):
+    metadata = file.get("metadata") if isinstance(file, dict) else getattr(file, "metadata", None)
+    return [(key, value) for key, value in (metadata or {}).items() if isinstance(value, str)]
+
+class FileTable(dict):
+    """
+    The vfs_data mapping, plus a sorted name list for prefix and glob
+    queries and a (metadata key, value) -> names index. The indexes are built
+    on the first query and then carried forward by merge_vfs, which updates
+    them for each delta instead of rebuilding, so queries cost
+    O(log n + matches). Checkpoints store it as a plain dict.
+
+    A FileTable is never modified once merge_vfs returns it; index sets are
+    shared between successive tables and replaced, not mutated, on change.
+    """
+
+    __slots__ = ("_names", "_meta")
+
+    def __init__(self, files: Optional[Mapping[str, File]] = None):
+        super().__init__(files or {})
+        self._names: Optional[List[str]] = None
+        self._meta: Optional[Dict[Tuple[str, str], Set[str]]] = None
+        if isinstance(files, FileTable) and files._names is not None:
+            self._meta = dict(files._meta)
+            self._names = list(files._names)
+
+    def _index(self) -> List[str]:
+        if self._names is None:
+            meta: Dict[Tuple[str, str], Set[str]] = {}
+            for name, file in self.items():
+                for item in _metadata_items(file):
+                    meta.setdefault(item, set()).add(name)
+            # _meta first: a concurrent reader that sees _names also sees _meta
+            self._meta = meta
+            self._names = sorted(self)
+        return self._names
+
+    def _unindex(self, name: str, file):
+        i = bisect_left(self._names, name)
+        del self._names[i]
+        for item in _metadata_items(file):
+            remaining = self._meta.get(item, set()) - {name}
+            if remaining:
+                self._meta[item] = remaining
+            else:
+                self._meta.pop(item, None)
+
+    def _put(self, name: str, file):
+        previous = self.get(name)
+        self[name] = file
+        if self._names is None:
+            return
+        if previous is not None:
+            self._unindex(name, previous)
+        insort(self._names, name)
+        for item in _metadata_items(file):
+            self._meta[item] = self._meta.get(item, set()) | {name}
+
+    def _drop(self, name: str):
+        previous = self.pop(name, None)
+        if previous is not None and self._names is not None:
+            self._unindex(name, previous)
+
+    def iter_prefix(self, prefix: str) -> Iterator[str]:
+        names = self._index()
+        for i in range(bisect_left(names, prefix), len(names)):
+            if not names[i].startswith(prefix):
+                break
+            yield names[i]
+
+    def find(self, **metadata: str) -> Set[str]:
+        self._index()
+        matches = [self._meta.get(item, set()) for item in metadata.items()]
+        if not matches:
+            return set(self)
+        matches.sort(key=len)
+        return set(matches[0]).intersection(*matches[1:])
+
+def merge_vfs(current: Optional[Dict[str, File]], delta: Optional[VFSDelta]) -> Dict[str, File]:
+    """
+    LangGraph reducer for vfs_data. Applies a delta of writes (File) and
+    deletes (None) on top of the current files, so nodes only return what
+    they changed. Entries identical to the current file are no-ops, which
+    keeps it safe to pass a full file set. A write always ends up at least
+    one version above the file it replaces.
+    """
+    merged = FileTable(current)
+    for name, file in (delta or {}).items():
+        previous = merged.get(name)
+        if file is None:
+            merged._drop(name)
+            continue
+        if file is previous:
+            continue
+        version = _version(previous) + 1 if previous is not None else 1
+        if isinstance(file, File) and file.version < version:
+            file = file.with_version(version)
+        merged._put(name, file)
+    return merged
+
+def diff_vfs(before: Mapping[str, File], after: Optional[Mapping[str, File]]) -> VFSDelta:
+    """Delta that turns `before` into `after` (e.g. a subgraph's final vfs_data)."""
+    if after is None:
+        return {}
+    delta: VFSDelta = {name: file for name, file in after.items() if before.get(name) is not file}
+    for name in before:
+        if name not in after:
+            delta[name] = None
+    return delta
+
+# State field type: vfs_data updates are deltas merged by merge_vfs
+VFSData = Annotated[Dict[str, File], merge_vfs]
 
 class VFS:
-    def __init__(self):
-        self._files: Dict[str, File] = {}
+    """
+    Working view over a node's vfs_data. The state's files are read in place
+    and never modified; writes and deletes are collected so the node can
+    return just those via changes().
+    """
+
+    def __init__(self, files: Optional[Mapping[str, File]] = None):
+        self._base: Mapping[str, File] = files if files is not None else {}
+        self._table: Optional[FileTable] = None
+        self._changes: VFSDelta = {}
+
+    def _indexed(self) -> FileTable:
+        # vfs_data from the reducer is already a FileTable; plain dicts are wrapped once
+        if self._table is None:
+            self._table = self._base if isinstance(self._base, FileTable) else FileTable(self._base)
+        return self._table
+
+    def _lookup(self, filename: str) -> Optional[File]:
+        if filename in self._changes:
+            return self._changes[filename]
+        return self._base.get(filename)
 
     def list_files(self) -> List[str]:
         """Returns a list of filenames in the VFS."""
-        return list(self._files.keys())
+        names = [name for name in self._base if self._changes.get(name, True) is not None]
+        names.extend(name for name, file in self._changes.items() if file is not None and name not in self._base)
+        return names
+
+    def iter_prefix(self, prefix: str) -> Iterator[str]:
+        """Filenames starting with `prefix` (e.g. "research/"), in name order."""
+        names = [name for name in self._indexed().iter_prefix(prefix) if name not in self._changes]
+        names.extend(name for name, file in self._changes.items() if file is not None and name.startswith(prefix))
+        return iter(sorted(names))
+
+    def glob(self, pattern: str) -> List[str]:
+        """Filenames matching a shell-style pattern such as "research/*.md"."""
+        literal = len(pattern)
+        for wildcard in "*?[":
+            if wildcard in pattern:
+                literal = min(literal, pattern.index(wildcard))
+        return [name for name in self.iter_prefix(pattern[:literal]) if fnmatchcase(name, pattern)]
+
+    def find(self, **metadata: str) -> List[str]:
+        """Filenames whose metadata has all the given values, e.g. find(url=...)."""
+        names = {name for name in self._indexed().find(**metadata) if name not in self._changes}
+        for name, file in self._changes.items():
+            if file is not None and all(file.metadata.get(key) == value for key, value in metadata.items()):
+                names.add(name)
+        return sorted(names)
 
     def read_file(self, filename: str) -> str:
         """Reads the content of a file."""
-        if filename not in self._files:
-            raise FileNotFoundError(f"File {filename} not found in VFS.")
-        return self._files[filename].content
+        return self.get_file(filename).content
 
     def write_file(self, filename: str, content: str, metadata: Optional[Dict[str, str]] = None):
         """Writes content to a file. Overwrites if exists."""
         if metadata is None:
             metadata = {}
-        self._files[filename] = File(name=filename, content=content, metadata=metadata)
+        previous = self._base.get(filename)
+        version = _version(previous) + 1 if previous is not None else 1
+        self._changes[filename] = File(name=filename, content=content, metadata=metadata, version=version)
+
+    def append_file(self, filename: str, content: str, metadata: Optional[Dict[str, str]] = None):
+        """
+        Appends content to a file (creating it if missing) without rebuilding
+        its existing text.
+        """
+        current = self._lookup(filename)
+        if current is None:
+            self.write_file(filename, content, metadata)
+            return
+        previous = self._base.get(filename)
+        version = _version(previous) + 1 if previous is not None else 1
+        self._changes[filename] = current.appended(content, version=version, metadata=metadata)
+
+    def tail(self, filename: str, chars: int) -> str:
+        """Last `chars` characters of a file."""
+        return self.get_file(filename).tail(chars)
+
+    def delete_file(self, filename: str):
+        """Removes a file."""
+        if not self.exists(filename):
+            raise FileNotFoundError(f"File {filename} not found in VFS.")
+        if filename in self._base:
+            self._changes[filename] = None
+        else:
+            del self._changes[filename]
 
     def exists(self, filename: str) -> bool:
         """Checks if a file exists."""
-        return filename in self._files
+        return self._lookup(filename) is not None
 
     def get_file(self, filename: str) -> File:
         """Returns the File object (including metadata)."""
-        if filename not in self._files:
+        file = self._lookup(filename)
+        if file is None:
             raise FileNotFoundError(f"File {filename} not found in VFS.")
-        return self._files[filename]
+        return file
+
+    def changes(self) -> VFSDelta:
+        """Writes and deletes since this view was created, for a vfs_data update."""
+        return dict(self._changes)
@@ -1,33 +1,35 @@
-from typing import TypedDict, List, Annotated
+from typing import TypedDict, List, Annotated, Optional
 import operator
 from langgraph.graph import StateGraph, END
-from app.core.vfs import VFS
+from langchain_core.runnables import RunnableLambda
+from app.core.vfs import VFS, VFSData
 from app.core.llm import (
     get_qwen_model,
     get_kimi_model,
     get_llama_model,
     get_optimizer_model
 )
+from app.core.tokens import fit_prompt
 
 class EvaluatorState(TypedDict):
     draft_file: str
-    vfs_data: dict
+    vfs_data: VFSData
     critiques: Annotated[List[str], operator.add]
 
 def get_draft(state: EvaluatorState) -> str:
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
+    vfs = VFS(state.get("vfs_data", {}))
     if vfs.exists(state["draft_file"]):
         return vfs.read_file(state["draft_file"])
     return ""
 
-def critique_qwen_node(state: EvaluatorState):
-    """Critic 1: Qwen - Structure & SEO"""
-    draft = get_draft(state)
-    if not draft: return {"critiques": ["Qwen: No draft to critique."]}
-    
-    llm = get_qwen_model()
-    prompt = f"""
+# Most of the draft each critic sees
+CRITIC_DRAFT_CHARS = 8000
+
+def build_qwen_prompt(draft: str, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, _qwen_template, max_chars={"draft": CRITIC_DRAFT_CHARS}, draft=draft)
+
+def _qwen_template(draft: str) -> str:
+    return f"""
     You are an expert SEO and Content Structure Critic.
     Analyze the following blog post draft.
     
@@ -38,25 +40,41 @@ def critique_qwen_node(state: EvaluatorState):
     4. Formatting (bullet points, readability)
     
     Draft:
-    {draft[:8000]}... (truncated if too long)
+    {draft}
     
     Provide a structured critique and concrete suggestions for improvement.
     Label your response "CRITIC: QWEN (SEO/STRUCTURE)".
     """
+
+def critique_qwen_node(state: EvaluatorState):
+    """Critic 1: Qwen - Structure & SEO"""
+    draft = get_draft(state)
+    if not draft: return {"critiques": ["Qwen: No draft to critique."]}
     
+    llm = get_qwen_model()
     try:
-        response = llm.invoke(prompt)
+        response = llm.invoke(build_qwen_prompt(draft, llm.model_name))
         return {"critiques": [response.content]}
     except Exception as e:
         return {"critiques": [f"Qwen Error: {str(e)}"]}
 
-def critique_kimi_node(state: EvaluatorState):
-    """Critic 2: Kimi - Engagement & Tone"""
+async def acritique_qwen_node(state: EvaluatorState):
+    """Async variant of critique_qwen_node."""
     draft = get_draft(state)
-    if not draft: return {"critiques": ["Kimi: No draft to critique."]}
+    if not draft: return {"critiques": ["Qwen: No draft to critique."]}
     
-    llm = get_kimi_model()
-    prompt = f"""
+    llm = get_qwen_model()
+    try:
+        response = await llm.ainvoke(build_qwen_prompt(draft, llm.model_name))
+        return {"critiques": [response.content]}
+    except Exception as e:
+        return {"critiques": [f"Qwen Error: {str(e)}"]}
+
+def build_kimi_prompt(draft: str, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, _kimi_template, max_chars={"draft": CRITIC_DRAFT_CHARS}, draft=draft)
+
+def _kimi_template(draft: str) -> str:
+    return f"""
     You are an expert Content Editor focusing on User Engagement.
     Analyze the following blog post draft.
     
@@ -67,25 +85,41 @@ def critique_kimi_node(state: EvaluatorState):
     4. Hook and Conclusion strength
     
     Draft:
-    {draft[:8000]}... (truncated if too long)
+    {draft}
     
     Provide a structured critique and concrete suggestions for improvement.
     Label your response "CRITIC: KIMI (ENGAGEMENT)".
     """
+
+def critique_kimi_node(state: EvaluatorState):
+    """Critic 2: Kimi - Engagement & Tone"""
+    draft = get_draft(state)
+    if not draft: return {"critiques": ["Kimi: No draft to critique."]}
     
+    llm = get_kimi_model()
     try:
-        response = llm.invoke(prompt)
+        response = llm.invoke(build_kimi_prompt(draft, llm.model_name))
         return {"critiques": [response.content]}
     except Exception as e:
         return {"critiques": [f"Kimi Error: {str(e)}"]}
 
-def critique_llama_node(state: EvaluatorState):
-    """Critic 3: Llama 4 - Logic & Accuracy"""
+async def acritique_kimi_node(state: EvaluatorState):
+    """Async variant of critique_kimi_node."""
     draft = get_draft(state)
-    if not draft: return {"critiques": ["Llama: No draft to critique."]}
+    if not draft: return {"critiques": ["Kimi: No draft to critique."]}
     
-    llm = get_llama_model()
-    prompt = f"""
+    llm = get_kimi_model()
+    try:
+        response = await llm.ainvoke(build_kimi_prompt(draft, llm.model_name))
+        return {"critiques": [response.content]}
+    except Exception as e:
+        return {"critiques": [f"Kimi Error: {str(e)}"]}
+
+def build_llama_prompt(draft: str, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, _llama_template, max_chars={"draft": CRITIC_DRAFT_CHARS}, draft=draft)
+
+def _llama_template(draft: str) -> str:
+    return f"""
     You are an expert Fact-Checker and Logician.
     Analyze the following blog post draft.
     
@@ -96,27 +130,38 @@ def critique_llama_node(state: EvaluatorState):
     4. Depth of coverage
     
     Draft:
-    {draft[:8000]}... (truncated if too long)
+    {draft}
     
     Provide a structured critique and concrete suggestions for improvement.
     Label your response "CRITIC: LLAMA (LOGIC)".
     """
+
+def critique_llama_node(state: EvaluatorState):
+    """Critic 3: Llama 4 - Logic & Accuracy"""
+    draft = get_draft(state)
+    if not draft: return {"critiques": ["Llama: No draft to critique."]}
     
+    llm = get_llama_model()
     try:
-        response = llm.invoke(prompt)
+        response = llm.invoke(build_llama_prompt(draft, llm.model_name))
         return {"critiques": [response.content]}
     except Exception as e:
         return {"critiques": [f"Llama Error: {str(e)}"]}
 
-def optimize_node(state: EvaluatorState):
-    """Optimizer: Rewrites the article based on critiques."""
+async def acritique_llama_node(state: EvaluatorState):
+    """Async variant of critique_llama_node."""
     draft = get_draft(state)
-    if not draft: return {}
-    
-    critiques_text = "\n\n".join(state["critiques"])
-    llm = get_optimizer_model()
+    if not draft: return {"critiques": ["Llama: No draft to critique."]}
     
-    prompt = f"""
+    llm = get_llama_model()
+    try:
+        response = await llm.ainvoke(build_llama_prompt(draft, llm.model_name))
+        return {"critiques": [response.content]}
+    except Exception as e:
+        return {"critiques": [f"Llama Error: {str(e)}"]}
+
+def build_optimize_prompt(draft: str, critiques_text: str) -> str:
+    return f"""
     You are a Master Editor.
     Your task is to Rewrite and Optimize the following blog post based on the critiques provided by three expert reviewers.
     
@@ -134,17 +179,40 @@ def optimize_node(state: EvaluatorState):
     5. Ensure the final output is a complete, polished article.
     6. Do not include the critiques in the final output, only the improved article content.
     """
+
+def _save_optimized(state: EvaluatorState, new_content: str):
+    vfs = VFS(state.get("vfs_data", {}))
+    vfs.write_file(state["draft_file"], new_content)
+    return {"vfs_data": vfs.changes()}
+
+def optimize_node(state: EvaluatorState):
+    """Optimizer: Rewrites the article based on critiques."""
+    draft = get_draft(state)
+    if not draft: return {}
+    
+    critiques_text = "\n\n".join(state["critiques"])
+    llm = get_optimizer_model()
+    
+    print("  [Optimizer] Optimizing draft based on critiques...")
+    try:
+        response = llm.invoke(build_optimize_prompt(draft, critiques_text), stream=True)
+        return _save_optimized(state, response.content)
+    except Exception as e:
+        print(f"  [Optimizer] Failed: {e}")
+        return {}
+
+async def aoptimize_node(state: EvaluatorState):
+    """Async variant of optimize_node."""
+    draft = get_draft(state)
+    if not draft: return {}
+    
+    critiques_text = "\n\n".join(state["critiques"])
+    llm = get_optimizer_model()
     
     print("  [Optimizer] Optimizing draft based on critiques...")
     try:
-        response = llm.invoke(prompt)
-        new_content = response.content
-        
-        vfs = VFS()
-        vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
-        vfs.write_file(state["draft_file"], new_content)
-        
-        return {"vfs_data": vfs._files}
+        response = await llm.ainvoke(build_optimize_prompt(draft, critiques_text), stream=True)
+        return _save_optimized(state, response.content)
     except Exception as e:
         print(f"  [Optimizer] Failed: {e}")
         return {}
@@ -152,10 +220,10 @@ def optimize_node(state: EvaluatorState):
 def create_evaluator_graph():
     workflow = StateGraph(EvaluatorState)
     
-    workflow.add_node("critique_qwen", critique_qwen_node)
-    workflow.add_node("critique_kimi", critique_kimi_node)
-    workflow.add_node("critique_llama", critique_llama_node)
-    workflow.add_node("optimize", optimize_node)
+    workflow.add_node("critique_qwen", RunnableLambda(critique_qwen_node, afunc=acritique_qwen_node))
+    workflow.add_node("critique_kimi", RunnableLambda(critique_kimi_node, afunc=acritique_kimi_node))
+    workflow.add_node("critique_llama", RunnableLambda(critique_llama_node, afunc=acritique_llama_node))
+    workflow.add_node("optimize", RunnableLambda(optimize_node, afunc=aoptimize_node))
     
     # We use a dummy setup node to allow parallel branching from the start.
     workflow.add_node("setup", lambda x: {})
@@ -5,17 +5,22 @@ Generates FAQ section from research data and article content.
 Extracts common questions from search snippets and creates Q&A pairs.
 """
 
-from typing import TypedDict, List, Dict
+from typing import TypedDict, List, Dict, Optional
 from langgraph.graph import StateGraph, END
-from app.core.vfs import VFS
+from langchain_core.runnables import RunnableLambda
+from app.core.vfs import VFS, VFSData
 from app.core.llm import get_writer_model
+from app.core.tokens import fit_prompt
+from app.core.vector_index import ResearchIndexData, rank_research
+import asyncio
 import json
 import re
 
 
 class FAQState(TypedDict):
-    vfs_data: dict
+    vfs_data: VFSData
     draft_file: str
+    research_index: Optional[ResearchIndexData]  # The job's vector index, if the writer built one
     faqs: List[Dict[str, str]]  # List of {"question": "...", "answer": "..."}
 
 
@@ -24,38 +29,57 @@ class FAQItem(TypedDict):
     answer: str
 
 
-def extract_questions_node(state: FAQState) -> dict:
-    """
-    Extracts potential FAQ questions from:
-    1. Research summaries (common themes)
-    2. Search snippets (what people are asking)
-    3. Article content (topics covered)
-    """
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
-    
-    # Collect all research content
-    research_content = []
-    for filename in vfs.list_files():
-        if filename.startswith("research/"):
-            content = vfs.read_file(filename)
-            research_content.append(content)
+# Research chunks taken from the job's vector index, most relevant to the draft first
+FAQ_RESEARCH_CHUNKS = 24
+
+# Opening of the draft used as the relevance query
+FAQ_QUERY_CHARS = 2000
+
+# Most research and draft an FAQ prompt carries; with an index, the most relevant research
+FAQ_RESEARCH_CHARS = 4000
+FAQ_DRAFT_CHARS = 3000
+
+
+def _gather_inputs(state: FAQState):
+    vfs = VFS(state.get("vfs_data", {}))
     
     # Get the draft
     draft = ""
     if vfs.exists(state["draft_file"]):
         draft = vfs.read_file(state["draft_file"])
     
-    llm = get_writer_model()
+    # With an index, fit_prompt trims the least relevant research instead of the last files
+    ranked = rank_research(state.get("research_index"), draft[:FAQ_QUERY_CHARS], FAQ_RESEARCH_CHUNKS) if draft else None
+    if ranked:
+        return [chunk.render() for chunk in ranked], draft
     
-    prompt = f"""
+    # Collect all research content
+    research_content = []
+    for filename in vfs.iter_prefix("research/"):
+        research_content.append(vfs.read_file(filename))
+    return research_content, draft
+
+
+def build_faq_prompt(research_content: List[str], draft: str, model_id: Optional[str] = None) -> str:
+    # Research gets the larger share when both have to be trimmed
+    return fit_prompt(
+        model_id,
+        _faq_template,
+        weights={"research": 4, "draft": 3},
+        max_chars={"research": FAQ_RESEARCH_CHARS, "draft": FAQ_DRAFT_CHARS},
+        research="\n\n".join(research_content),
+        draft=draft,
+    )
+
+def _faq_template(research: str, draft: str) -> str:
+    return f"""
     You are an FAQ generator. Analyze the research and article below, then generate 5-7 frequently asked questions with concise answers.
     
     RESEARCH SUMMARIES:
-    {chr(10).join(research_content[:3])[:4000]}
+    {research}
     
     ARTICLE DRAFT (excerpt):
-    {draft[:3000]}
+    {draft}
     
     RULES:
     1. Questions should be what real users would search for
@@ -72,41 +96,74 @@ def extract_questions_node(state: FAQState) -> dict:
         {{"question": "How do I use X?", "answer": "You can use X by..."}}
     ]
     """
+
+
+def parse_faqs(content: str) -> dict:
+    # Clean markdown if present
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    
+    faqs = json.loads(content.strip())
+    
+    # Validate structure
+    validated_faqs = []
+    for faq in faqs:
+        if isinstance(faq, dict) and "question" in faq and "answer" in faq:
+            validated_faqs.append({
+                "question": str(faq["question"]),
+                "answer": str(faq["answer"])
+            })
+    
+    print(f"  [FAQ] Generated {len(validated_faqs)} FAQ items")
+    return {"faqs": validated_faqs}
+
+
+def faq_fallback(e: Exception) -> dict:
+    print(f"  [FAQ] Generation failed: {e}")
+    # Return fallback FAQs
+    return {"faqs": [
+        {"question": "What are the main benefits?", "answer": "The main benefits include improved efficiency, better outcomes, and time savings."},
+        {"question": "How do I get started?", "answer": "Start by understanding the basics, then gradually implement the key concepts discussed in this article."},
+        {"question": "Is this suitable for beginners?", "answer": "Yes, the concepts covered are accessible to beginners while also providing value for experienced practitioners."}
+    ]}
+
+
+def extract_questions_node(state: FAQState) -> dict:
+    """
+    Extracts potential FAQ questions from:
+    1. Research summaries (common themes)
+    2. Search snippets (what people are asking)
+    3. Article content (topics covered)
+    """
+    research_content, draft = _gather_inputs(state)
+    
+    llm = get_writer_model()
+    
+    print("  [FAQ] Generating FAQ section...")
+    
+    try:
+        response = llm.invoke(build_faq_prompt(research_content, draft, llm.model_name))
+        return parse_faqs(response.content)
+    except Exception as e:
+        return faq_fallback(e)
+
+
+async def aextract_questions_node(state: FAQState) -> dict:
+    """Async variant of extract_questions_node."""
+    # Ranking research embeds the draft opening, which is CPU-bound
+    research_content, draft = await asyncio.to_thread(_gather_inputs, state)
+    
+    llm = get_writer_model()
     
     print("  [FAQ] Generating FAQ section...")
     
     try:
-        response = llm.invoke(prompt)
-        content = response.content
-        
-        # Clean markdown if present
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        faqs = json.loads(content.strip())
-        
-        # Validate structure
-        validated_faqs = []
-        for faq in faqs:
-            if isinstance(faq, dict) and "question" in faq and "answer" in faq:
-                validated_faqs.append({
-                    "question": str(faq["question"]),
-                    "answer": str(faq["answer"])
-                })
-        
-        print(f"  [FAQ] Generated {len(validated_faqs)} FAQ items")
-        return {"faqs": validated_faqs}
-        
+        response = await llm.ainvoke(build_faq_prompt(research_content, draft, llm.model_name))
+        return parse_faqs(response.content)
     except Exception as e:
-        print(f"  [FAQ] Generation failed: {e}")
-        # Return fallback FAQs
-        return {"faqs": [
-            {"question": "What are the main benefits?", "answer": "The main benefits include improved efficiency, better outcomes, and time savings."},
-            {"question": "How do I get started?", "answer": "Start by understanding the basics, then gradually implement the key concepts discussed in this article."},
-            {"question": "Is this suitable for beginners?", "answer": "Yes, the concepts covered are accessible to beginners while also providing value for experienced practitioners."}
-        ]}
+        return faq_fallback(e)
 
 
 def format_faq_node(state: FAQState) -> dict:
@@ -127,15 +184,14 @@ def format_faq_node(state: FAQState) -> dict:
         faq_markdown += f"### {question}\n\n{answer}\n\n"
     
     # Save to VFS for inclusion in final article
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
+    vfs = VFS(state.get("vfs_data", {}))
     vfs.write_file("faq_section.md", faq_markdown)
     
     print(f"  [FAQ] Formatted {len(faqs)} FAQ items")
     
     return {
         "faqs": faqs,
-        "vfs_data": vfs._files
+        "vfs_data": vfs.changes()
     }
 
 
@@ -143,7 +199,7 @@ def create_faq_graph():
     """Creates the FAQ generation subgraph."""
     workflow = StateGraph(FAQState)
     
-    workflow.add_node("extract_questions", extract_questions_node)
+    workflow.add_node("extract_questions", RunnableLambda(extract_questions_node, afunc=aextract_questions_node))
     workflow.add_node("format_faq", format_faq_node)
     
     workflow.set_entry_point("extract_questions")
@@ -1,39 +1,35 @@
 from typing import TypedDict, List, Optional
 from langgraph.graph import StateGraph, END
-from app.core.vfs import VFS
+from langchain_core.runnables import RunnableLambda
+from app.core.vfs import VFS, VFSData
 from app.core.llm import get_optimizer_model, get_writer_model
+from app.core.tokens import fit_prompt
 import json
 
 class HumanizerState(TypedDict):
     draft_file: str
-    vfs_data: dict
+    vfs_data: VFSData
     last_critique: Optional[dict]
     iteration_count: int
 
 def get_draft(state: HumanizerState) -> str:
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
+    vfs = VFS(state.get("vfs_data", {}))
     if vfs.exists(state["draft_file"]):
         return vfs.read_file(state["draft_file"])
     return ""
 
-def humanization_critic_node(state: HumanizerState):
-    """
-    Node A: The Linguistic Forensics Critic.
-    Scans specifically for AI artifacts (Hedging, Connectors, Nominalization, Sensory Vacuum).
-    """
-    print("--- Humanization Critic ---")
-    draft = get_draft(state)
-    if not draft:
-        return {"last_critique": {"ai_artifact_score": 0}, "iteration_count": state.get("iteration_count", 0)}
+# Most of the draft the critic sees
+CRITIC_DRAFT_CHARS = 10000
 
-    llm = get_optimizer_model()
-    
-    prompt = f"""
+def build_critic_prompt(draft: str, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, _critic_template, max_chars={"draft": CRITIC_DRAFT_CHARS}, draft=draft)
+
+def _critic_template(draft: str) -> str:
+    return f"""
     You are a Linguistic Forensics Expert. Analyze the draft for 'AI Artifacts' - patterns that reveal machine authorship.
     
     Draft:
-    {draft[:10000]}... (truncated)
+    {draft}
     
     DETECTION CATEGORIES:
     
@@ -82,45 +78,64 @@ def humanization_critic_node(state: HumanizerState):
         "general_feedback": "specific actionable feedback"
     }}
     """
-    
-    try:
-        response = llm.invoke(prompt)
-        content = response.content
-        # Basic JSON extraction if wrapped in code blocks
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-            
-        critique = json.loads(content.strip())
-        print(f"  [Humanizer] AI Artifact Score: {critique.get('ai_artifact_score')}")
-        return {
-            "last_critique": critique, 
-            "iteration_count": state.get("iteration_count", 0)
-        }
-    except Exception as e:
-        print(f"  [Humanizer] Critic Error: {e}")
-        # Return a dummy critique to avoid crashing, assuming score 0 to exit loop
-        return {
-            "last_critique": {"ai_artifact_score": 0, "general_feedback": "Error in critic"}, 
-            "iteration_count": state.get("iteration_count", 0)
-        }
 
-def refiner_node(state: HumanizerState):
+def parse_critique(content: str, iteration_count: int) -> dict:
+    # Basic JSON extraction if wrapped in code blocks
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+        
+    critique = json.loads(content.strip())
+    print(f"  [Humanizer] AI Artifact Score: {critique.get('ai_artifact_score')}")
+    return {
+        "last_critique": critique, 
+        "iteration_count": iteration_count
+    }
+
+def critique_error(e: Exception, iteration_count: int) -> dict:
+    print(f"  [Humanizer] Critic Error: {e}")
+    # Return a dummy critique to avoid crashing, assuming score 0 to exit loop
+    return {
+        "last_critique": {"ai_artifact_score": 0, "general_feedback": "Error in critic"}, 
+        "iteration_count": iteration_count
+    }
+
+def humanization_critic_node(state: HumanizerState):
     """
-    Node B: The Refiner Agent.
-    Rewrites specific sections using Chain of Density (CoD) and sensory injection.
+    Node A: The Linguistic Forensics Critic.
+    Scans specifically for AI artifacts (Hedging, Connectors, Nominalization, Sensory Vacuum).
     """
-    print("--- Refiner Agent ---")
+    print("--- Humanization Critic ---")
     draft = get_draft(state)
-    critique = state.get("last_critique", {})
+    if not draft:
+        return {"last_critique": {"ai_artifact_score": 0}, "iteration_count": state.get("iteration_count", 0)}
+
+    llm = get_optimizer_model()
     
-    if not draft or not critique:
-        return {}
+    try:
+        response = llm.invoke(build_critic_prompt(draft, llm.model_name))
+        return parse_critique(response.content, state.get("iteration_count", 0))
+    except Exception as e:
+        return critique_error(e, state.get("iteration_count", 0))
 
-    llm = get_optimizer_model() # Using high quality model for rewriting
+async def ahumanization_critic_node(state: HumanizerState):
+    """Async variant of humanization_critic_node."""
+    print("--- Humanization Critic ---")
+    draft = get_draft(state)
+    if not draft:
+        return {"last_critique": {"ai_artifact_score": 0}, "iteration_count": state.get("iteration_count", 0)}
+
+    llm = get_optimizer_model()
     
-    prompt = f"""
+    try:
+        response = await llm.ainvoke(build_critic_prompt(draft, llm.model_name))
+        return parse_critique(response.content, state.get("iteration_count", 0))
+    except Exception as e:
+        return critique_error(e, state.get("iteration_count", 0))
+
+def build_refiner_prompt(draft: str, critique: dict) -> str:
+    return f"""
     You are a Ruthless Human Voice Editor. Your ONLY job: make this text sound like a skilled human wrote it, not a machine.
     
     Input Draft:
@@ -196,23 +211,55 @@ def refiner_node(state: HumanizerState):
     OUTPUT: The completely rewritten article. No preamble. No "Here is the revised..."
     Just the article in Markdown format.
     """
+
+def save_refined(state: HumanizerState, new_content: str) -> dict:
+    # Strip potential chat prefixes
+    if new_content.strip().lower().startswith("here is"):
+        new_content = new_content.split("\n", 1)[-1]
+        
+    vfs = VFS(state.get("vfs_data", {}))
+    vfs.write_file(state["draft_file"], new_content)
+    
+    return {
+        "vfs_data": vfs.changes(), 
+        "iteration_count": state["iteration_count"] + 1
+    }
+
+def refiner_node(state: HumanizerState):
+    """
+    Node B: The Refiner Agent.
+    Rewrites specific sections using Chain of Density (CoD) and sensory injection.
+    """
+    print("--- Refiner Agent ---")
+    draft = get_draft(state)
+    critique = state.get("last_critique", {})
+    
+    if not draft or not critique:
+        return {}
+
+    llm = get_optimizer_model() # Using high quality model for rewriting
     
     try:
-        response = llm.invoke(prompt)
-        new_content = response.content
-        
-        # Strip potential chat prefixes
-        if new_content.strip().lower().startswith("here is"):
-            new_content = new_content.split("\n", 1)[-1]
-            
-        vfs = VFS()
-        vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
-        vfs.write_file(state["draft_file"], new_content)
-        
-        return {
-            "vfs_data": vfs._files, 
-            "iteration_count": state["iteration_count"] + 1
-        }
+        response = llm.invoke(build_refiner_prompt(draft, critique), stream=True)
+        return save_refined(state, response.content)
+    except Exception as e:
+        print(f"  [Humanizer] Refiner Error: {e}")
+        return {"iteration_count": state["iteration_count"] + 1}
+
+async def arefiner_node(state: HumanizerState):
+    """Async variant of refiner_node."""
+    print("--- Refiner Agent ---")
+    draft = get_draft(state)
+    critique = state.get("last_critique", {})
+    
+    if not draft or not critique:
+        return {}
+
+    llm = get_optimizer_model()
+    
+    try:
+        response = await llm.ainvoke(build_refiner_prompt(draft, critique), stream=True)
+        return save_refined(state, response.content)
     except Exception as e:
         print(f"  [Humanizer] Refiner Error: {e}")
         return {"iteration_count": state["iteration_count"] + 1}
@@ -236,8 +283,8 @@ def should_continue(state: HumanizerState):
 def create_humanizer_graph():
     workflow = StateGraph(HumanizerState)
     
-    workflow.add_node("humanization_critic", humanization_critic_node)
-    workflow.add_node("refiner", refiner_node)
+    workflow.add_node("humanization_critic", RunnableLambda(humanization_critic_node, afunc=ahumanization_critic_node))
+    workflow.add_node("refiner", RunnableLambda(refiner_node, afunc=arefiner_node))
     
     workflow.set_entry_point("humanization_critic")
     
@@ -8,17 +8,20 @@ Extracts and analyzes keywords from the article:
 - Keyword density analysis
 """
 
-from typing import TypedDict, List, Dict
+from typing import TypedDict, List, Dict, Optional
+from functools import partial
 from langgraph.graph import StateGraph, END
-from app.core.vfs import VFS
+from langchain_core.runnables import RunnableLambda
+from app.core.vfs import VFS, VFSData
 from app.core.llm import get_researcher_model
+from app.core.tokens import fit_prompt
 import json
 import re
 from collections import Counter
 
 
 class KeywordState(TypedDict):
-    vfs_data: dict
+    vfs_data: VFSData
     draft_file: str
     topic: str
     keyword_report: Dict  # Structured keyword analysis
@@ -32,28 +35,21 @@ class KeywordReport(TypedDict):
     recommendations: List[str]
 
 
-def extract_keywords_node(state: KeywordState) -> dict:
-    """
-    Uses LLM to identify primary, secondary, and LSI keywords.
-    """
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
-    
-    draft = ""
-    if vfs.exists(state["draft_file"]):
-        draft = vfs.read_file(state["draft_file"])
-    
-    topic = state.get("topic", "")
-    
-    llm = get_researcher_model()
-    
-    prompt = f"""
+# Most of the draft keyword extraction sees
+KEYWORDS_DRAFT_CHARS = 6000
+
+
+def build_keywords_prompt(topic: str, draft: str, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, partial(_keywords_template, topic), max_chars={"draft": KEYWORDS_DRAFT_CHARS}, draft=draft)
+
+def _keywords_template(topic: str, draft: str) -> str:
+    return f"""
     You are an SEO keyword analyst. Analyze the article below and extract keywords.
     
     TOPIC: {topic}
     
     ARTICLE:
-    {draft[:6000]}
+    {draft}
     
     Extract:
     1. PRIMARY KEYWORD: The main keyword the article should rank for (2-4 words)
@@ -69,50 +65,85 @@ def extract_keywords_node(state: KeywordState) -> dict:
         "lsi_keywords": ["related term 1", "related term 2", "related term 3"]
     }}
     """
+
+def parse_keywords(content: str, topic: str) -> dict:
+    # Clean markdown if present
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    
+    keywords = json.loads(content.strip())
+    
+    return {
+        "keyword_report": {
+            "primary_keyword": keywords.get("primary_keyword", topic),
+            "secondary_keywords": keywords.get("secondary_keywords", []),
+            "lsi_keywords": keywords.get("lsi_keywords", []),
+            "keyword_density": {},
+            "recommendations": []
+        }
+    }
+
+def keywords_fallback(e: Exception, topic: str) -> dict:
+    print(f"  [Keywords] Extraction failed: {e}")
+    return {
+        "keyword_report": {
+            "primary_keyword": topic,
+            "secondary_keywords": [],
+            "lsi_keywords": [],
+            "keyword_density": {},
+            "recommendations": ["Unable to extract keywords automatically"]
+        }
+    }
+
+def _load_draft(state: KeywordState) -> str:
+    vfs = VFS(state.get("vfs_data", {}))
+    
+    draft = ""
+    if vfs.exists(state["draft_file"]):
+        draft = vfs.read_file(state["draft_file"])
+    return draft
+
+def extract_keywords_node(state: KeywordState) -> dict:
+    """
+    Uses LLM to identify primary, secondary, and LSI keywords.
+    """
+    draft = _load_draft(state)
+    topic = state.get("topic", "")
+    
+    llm = get_researcher_model()
     
     print("  [Keywords] Extracting keywords...")
     
     try:
-        response = llm.invoke(prompt)
-        content = response.content
-        
-        # Clean markdown if present
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        keywords = json.loads(content.strip())
-        
-        return {
-            "keyword_report": {
-                "primary_keyword": keywords.get("primary_keyword", topic),
-                "secondary_keywords": keywords.get("secondary_keywords", []),
-                "lsi_keywords": keywords.get("lsi_keywords", []),
-                "keyword_density": {},
-                "recommendations": []
-            }
-        }
-        
+        response = llm.invoke(build_keywords_prompt(topic, draft, llm.model_name))
+        return parse_keywords(response.content, topic)
     except Exception as e:
-        print(f"  [Keywords] Extraction failed: {e}")
-        return {
-            "keyword_report": {
-                "primary_keyword": topic,
-                "secondary_keywords": [],
-                "lsi_keywords": [],
-                "keyword_density": {},
-                "recommendations": ["Unable to extract keywords automatically"]
-            }
-        }
+        return keywords_fallback(e, topic)
+
+
+async def aextract_keywords_node(state: KeywordState) -> dict:
+    """Async variant of extract_keywords_node."""
+    draft = _load_draft(state)
+    topic = state.get("topic", "")
+    
+    llm = get_researcher_model()
+    
+    print("  [Keywords] Extracting keywords...")
+    
+    try:
+        response = await llm.ainvoke(build_keywords_prompt(topic, draft, llm.model_name))
+        return parse_keywords(response.content, topic)
+    except Exception as e:
+        return keywords_fallback(e, topic)
 
 
 def analyze_density_node(state: KeywordState) -> dict:
     """
     Calculates keyword density and provides SEO recommendations.
     """
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
+    vfs = VFS(state.get("vfs_data", {}))
     
     draft = ""
     if vfs.exists(state["draft_file"]):
@@ -179,7 +210,7 @@ def analyze_density_node(state: KeywordState) -> dict:
     
     return {
         "keyword_report": report,
-        "vfs_data": vfs._files
+        "vfs_data": vfs.changes()
     }
 
 
@@ -218,7 +249,7 @@ def create_keyword_analyzer_graph():
     """Creates the keyword analysis subgraph."""
     workflow = StateGraph(KeywordState)
     
-    workflow.add_node("extract_keywords", extract_keywords_node)
+    workflow.add_node("extract_keywords", RunnableLambda(extract_keywords_node, afunc=aextract_keywords_node))
     workflow.add_node("analyze_density", analyze_density_node)
     
     workflow.set_entry_point("extract_keywords")
@@ -6,18 +6,24 @@ Generates structured linking suggestions:
 - External links: 2-4 authoritative sources with placement context
 """
 
-from typing import TypedDict, List, Dict
+from typing import TypedDict, List, Dict, Optional
+from functools import partial
 from langgraph.graph import StateGraph, END
-from app.core.vfs import VFS
+from langchain_core.runnables import RunnableLambda
+from app.core.vfs import VFS, VFSData
 from app.core.llm import get_researcher_model
+from app.core.tokens import fit_prompt, trim_to_tokens
+from app.core.vector_index import ResearchIndexData, rank_research
+import asyncio
 import json
 
 
 class LinkingState(TypedDict):
-    vfs_data: dict
+    vfs_data: VFSData
     draft_file: str
     topic: str
     linking_report: Dict  # Structured linking suggestions
+    research_index: Optional[ResearchIndexData]  # The job's vector index, if the writer built one
 
 
 class InternalLink(TypedDict):
@@ -38,28 +44,39 @@ class LinkingReport(TypedDict):
     external_links: List[ExternalLink]
 
 
-def suggest_internal_links_node(state: LinkingState) -> dict:
-    """
-    Suggests internal linking opportunities based on article content.
-    """
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
+def _load(state: LinkingState):
+    vfs = VFS(state.get("vfs_data", {}))
     
     draft = ""
     if vfs.exists(state["draft_file"]):
         draft = vfs.read_file(state["draft_file"])
-    
-    topic = state.get("topic", "")
-    
-    llm = get_researcher_model()
-    
-    prompt = f"""
+    return vfs, draft
+
+
+def _strip_json(content: str) -> str:
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    return content.strip()
+
+
+# Most of the draft internal linking sees
+INTERNAL_LINKS_DRAFT_CHARS = 5000
+
+
+def build_internal_links_prompt(topic: str, draft: str, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, partial(_internal_links_template, topic), max_chars={"draft": INTERNAL_LINKS_DRAFT_CHARS}, draft=draft)
+
+
+def _internal_links_template(topic: str, draft: str) -> str:
+    return f"""
     You are an SEO linking strategist. Analyze the article and suggest internal linking opportunities.
     
     TOPIC: {topic}
     
     ARTICLE:
-    {draft[:5000]}
+    {draft}
     
     Generate 3-5 INTERNAL LINK suggestions. For each:
     1. Identify a phrase in the article that could be linked
@@ -79,91 +96,126 @@ def suggest_internal_links_node(state: LinkingState) -> dict:
         ]
     }}
     """
+
+
+def parse_internal_links(content: str) -> dict:
+    data = json.loads(_strip_json(content))
+    internal_links = data.get("internal_links", [])
+    
+    # Validate structure
+    validated = []
+    for link in internal_links[:5]:
+        if isinstance(link, dict) and "anchor_text" in link:
+            validated.append({
+                "anchor_text": str(link.get("anchor_text", "")),
+                "suggested_target": str(link.get("suggested_target", "")),
+                "context": str(link.get("context", ""))
+            })
     
-    print("  [Linking] Generating internal link suggestions...")
-    
-    try:
-        response = llm.invoke(prompt)
-        content = response.content
-        
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        data = json.loads(content.strip())
-        internal_links = data.get("internal_links", [])
-        
-        # Validate structure
-        validated = []
-        for link in internal_links[:5]:
-            if isinstance(link, dict) and "anchor_text" in link:
-                validated.append({
-                    "anchor_text": str(link.get("anchor_text", "")),
-                    "suggested_target": str(link.get("suggested_target", "")),
-                    "context": str(link.get("context", ""))
-                })
-        
-        return {
-            "linking_report": {
-                "internal_links": validated,
-                "external_links": []
-            }
+    return {
+        "linking_report": {
+            "internal_links": validated,
+            "external_links": []
         }
-        
-    except Exception as e:
-        print(f"  [Linking] Internal link generation failed: {e}")
-        return {
-            "linking_report": {
-                "internal_links": [
-                    {
-                        "anchor_text": topic.split()[0] + " guide",
-                        "suggested_target": f"Complete Guide to {topic}",
-                        "context": "Link from introduction to comprehensive guide"
-                    },
-                    {
-                        "anchor_text": "best practices",
-                        "suggested_target": f"{topic} Best Practices",
-                        "context": "Link from practical tips section"
-                    },
-                    {
-                        "anchor_text": "getting started",
-                        "suggested_target": f"{topic} for Beginners",
-                        "context": "Link for newcomers to the topic"
-                    }
-                ],
-                "external_links": []
-            }
+    }
+
+
+def internal_links_fallback(e: Exception, topic: str) -> dict:
+    print(f"  [Linking] Internal link generation failed: {e}")
+    return {
+        "linking_report": {
+            "internal_links": [
+                {
+                    "anchor_text": topic.split()[0] + " guide",
+                    "suggested_target": f"Complete Guide to {topic}",
+                    "context": "Link from introduction to comprehensive guide"
+                },
+                {
+                    "anchor_text": "best practices",
+                    "suggested_target": f"{topic} Best Practices",
+                    "context": "Link from practical tips section"
+                },
+                {
+                    "anchor_text": "getting started",
+                    "suggested_target": f"{topic} for Beginners",
+                    "context": "Link for newcomers to the topic"
+                }
+            ],
+            "external_links": []
         }
+    }
 
 
-def suggest_external_links_node(state: LinkingState) -> dict:
+def suggest_internal_links_node(state: LinkingState) -> dict:
     """
-    Suggests authoritative external sources to cite.
+    Suggests internal linking opportunities based on article content.
     """
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
+    _, draft = _load(state)
+    topic = state.get("topic", "")
     
-    draft = ""
-    if vfs.exists(state["draft_file"]):
-        draft = vfs.read_file(state["draft_file"])
+    llm = get_researcher_model()
     
-    topic = state.get("topic", "")
-    report = state.get("linking_report", {"internal_links": [], "external_links": []})
+    print("  [Linking] Generating internal link suggestions...")
     
-    # Collect research sources
-    research_sources = []
-    for filename in vfs.list_files():
-        if filename.startswith("research/"):
-            file_obj = vfs.get_file(filename)
-            if file_obj and file_obj.metadata:
-                url = file_obj.metadata.get("url", "")
-                if url and url != "unknown":
-                    research_sources.append(url)
+    try:
+        response = llm.invoke(build_internal_links_prompt(topic, draft, llm.model_name))
+        return parse_internal_links(response.content)
+    except Exception as e:
+        return internal_links_fallback(e, topic)
+
+
+async def asuggest_internal_links_node(state: LinkingState) -> dict:
+    """Async variant of suggest_internal_links_node."""
+    _, draft = _load(state)
+    topic = state.get("topic", "")
     
     llm = get_researcher_model()
     
-    prompt = f"""
+    print("  [Linking] Generating internal link suggestions...")
+    
+    try:
+        response = await llm.ainvoke(build_internal_links_prompt(topic, draft, llm.model_name))
+        return parse_internal_links(response.content)
+    except Exception as e:
+        return internal_links_fallback(e, topic)
+
+
+def collect_research_sources(vfs: VFS) -> List[str]:
+    research_sources = []
+    for filename in vfs.iter_prefix("research/"):
+        file_obj = vfs.get_file(filename)
+        if file_obj and file_obj.metadata:
+            url = file_obj.metadata.get("url", "")
+            if url and url != "unknown":
+                research_sources.append(url)
+    return research_sources
+
+
+# Research chunks ranked against the topic to order the sources
+LINKING_RESEARCH_CHUNKS = 12
+
+
+def rank_research_sources(state: LinkingState, vfs: VFS) -> List[str]:
+    """Research source URLs; with the job's vector index, those most relevant to the topic come first."""
+    research_sources = collect_research_sources(vfs)
+    ranked = rank_research(state.get("research_index"), state.get("topic", ""), LINKING_RESEARCH_CHUNKS)
+    if ranked:
+        first = list(dict.fromkeys(c.source for c in ranked if c.source in research_sources))
+        research_sources = first + [url for url in research_sources if url not in first]
+    return research_sources
+
+
+# Citations only need the gist of the article, not all of it
+EXTERNAL_LINKS_EXCERPT_TOKENS = 800
+
+
+def build_external_links_prompt(topic: str, research_sources: List[str], draft: str, model_id: Optional[str] = None) -> str:
+    excerpt = trim_to_tokens(draft, EXTERNAL_LINKS_EXCERPT_TOKENS, model_id)
+    return fit_prompt(model_id, partial(_external_links_template, topic, research_sources), draft=excerpt)
+
+
+def _external_links_template(topic: str, research_sources: List[str], draft: str) -> str:
+    return f"""
     You are an SEO linking strategist. Suggest authoritative external sources to cite in this article.
     
     TOPIC: {topic}
@@ -172,7 +224,7 @@ def suggest_external_links_node(state: LinkingState) -> dict:
     {json.dumps(research_sources[:5], indent=2)}
     
     ARTICLE EXCERPT:
-    {draft[:3000]}
+    {draft}
     
     Generate 2-4 EXTERNAL LINK suggestions. For each:
     1. Name of the authoritative source (e.g., "Harvard Business Review", "Stanford Study")
@@ -196,55 +248,49 @@ def suggest_external_links_node(state: LinkingState) -> dict:
         ]
     }}
     """
+
+
+def apply_external_links(report: dict, content: str, research_sources: List[str]):
+    data = json.loads(_strip_json(content))
+    external_links = data.get("external_links", [])
+    
+    # Validate structure
+    validated = []
+    for link in external_links[:4]:
+        if isinstance(link, dict) and "source_name" in link:
+            validated.append({
+                "source_name": str(link.get("source_name", "")),
+                "url": str(link.get("url", "")),
+                "anchor_text": str(link.get("anchor_text", "")),
+                "placement_context": str(link.get("placement_context", ""))
+            })
     
-    print("  [Linking] Generating external link suggestions...")
-    
-    try:
-        response = llm.invoke(prompt)
-        content = response.content
-        
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        data = json.loads(content.strip())
-        external_links = data.get("external_links", [])
-        
-        # Validate structure
-        validated = []
-        for link in external_links[:4]:
-            if isinstance(link, dict) and "source_name" in link:
-                validated.append({
-                    "source_name": str(link.get("source_name", "")),
-                    "url": str(link.get("url", "")),
-                    "anchor_text": str(link.get("anchor_text", "")),
-                    "placement_context": str(link.get("placement_context", ""))
-                })
-        
-        # Also add any research sources we actually used
-        for url in research_sources[:2]:
-            if not any(v["url"] == url for v in validated):
-                validated.append({
-                    "source_name": "Research Source",
-                    "url": url,
-                    "anchor_text": "according to research",
-                    "placement_context": "Primary research source used for this article"
-                })
-        
-        report["external_links"] = validated[:4]
-        
-    except Exception as e:
-        print(f"  [Linking] External link generation failed: {e}")
-        # Use research sources as fallback
-        for url in research_sources[:2]:
-            report["external_links"].append({
+    # Also add any research sources we actually used
+    for url in research_sources[:2]:
+        if not any(v["url"] == url for v in validated):
+            validated.append({
                 "source_name": "Research Source",
                 "url": url,
                 "anchor_text": "according to research",
-                "placement_context": "Primary research source"
+                "placement_context": "Primary research source used for this article"
             })
     
+    report["external_links"] = validated[:4]
+
+
+def apply_external_fallback(report: dict, e: Exception, research_sources: List[str]):
+    print(f"  [Linking] External link generation failed: {e}")
+    # Use research sources as fallback
+    for url in research_sources[:2]:
+        report["external_links"].append({
+            "source_name": "Research Source",
+            "url": url,
+            "anchor_text": "according to research",
+            "placement_context": "Primary research source"
+        })
+
+
+def save_linking_report(vfs: VFS, report: dict) -> dict:
     # Save report to VFS
     report_md = format_linking_report(report)
     vfs.write_file("linking_report.md", report_md)
@@ -253,10 +299,55 @@ def suggest_external_links_node(state: LinkingState) -> dict:
     
     return {
         "linking_report": report,
-        "vfs_data": vfs._files
+        "vfs_data": vfs.changes()
     }
 
 
+def suggest_external_links_node(state: LinkingState) -> dict:
+    """
+    Suggests authoritative external sources to cite.
+    """
+    vfs, draft = _load(state)
+    topic = state.get("topic", "")
+    report = state.get("linking_report", {"internal_links": [], "external_links": []})
+    
+    # Collect research sources
+    research_sources = rank_research_sources(state, vfs)
+    
+    llm = get_researcher_model()
+    
+    print("  [Linking] Generating external link suggestions...")
+    
+    try:
+        response = llm.invoke(build_external_links_prompt(topic, research_sources, draft, llm.model_name))
+        apply_external_links(report, response.content, research_sources)
+    except Exception as e:
+        apply_external_fallback(report, e, research_sources)
+    
+    return save_linking_report(vfs, report)
+
+
+async def asuggest_external_links_node(state: LinkingState) -> dict:
+    """Async variant of suggest_external_links_node."""
+    vfs, draft = _load(state)
+    topic = state.get("topic", "")
+    report = state.get("linking_report", {"internal_links": [], "external_links": []})
+    
+    research_sources = await asyncio.to_thread(rank_research_sources, state, vfs)
+    
+    llm = get_researcher_model()
+    
+    print("  [Linking] Generating external link suggestions...")
+    
+    try:
+        response = await llm.ainvoke(build_external_links_prompt(topic, research_sources, draft, llm.model_name))
+        apply_external_links(report, response.content, research_sources)
+    except Exception as e:
+        apply_external_fallback(report, e, research_sources)
+    
+    return save_linking_report(vfs, report)
+
+
 def format_linking_report(report: dict) -> str:
     """Formats linking report as markdown."""
     md = "## 🔗 Linking Strategy Report\n\n"
@@ -283,8 +374,8 @@ def create_linking_graph():
     """Creates the linking suggestion subgraph."""
     workflow = StateGraph(LinkingState)
     
-    workflow.add_node("suggest_internal", suggest_internal_links_node)
-    workflow.add_node("suggest_external", suggest_external_links_node)
+    workflow.add_node("suggest_internal", RunnableLambda(suggest_internal_links_node, afunc=asuggest_internal_links_node))
+    workflow.add_node("suggest_external", RunnableLambda(suggest_external_links_node, afunc=asuggest_external_links_node))
     
     workflow.set_entry_point("suggest_internal")
     workflow.add_edge("suggest_internal", "suggest_external")
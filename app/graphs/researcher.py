@@ -1,32 +1,59 @@
-from typing import TypedDict, List, Annotated, Any
+from typing import TypedDict, List, Annotated, Any, Dict, Optional, Tuple
+from functools import partial
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from app.core.state import AgentState
-from app.core.vfs import VFS
+from app.core.vfs import VFS, VFSData
 from app.core.llm import get_researcher_model
-from app.tools.search import DuckDuckGoSearchProvider, MockSearchProvider
+from app.core.tokens import fit_prompt
+from app.core.dedup import DEDUP_DROPPED, FingerprintSet, Signature, from_hex, minhash, threshold, to_hex
+from app.core.compression import compress_page
+from app.core.page_cache import normalize_url
+from app.core.research_store import artifact_id, content_digest, get_research_store
+from app.tools.search import SearchProvider, SearchResult, CachedSearchProvider, DuckDuckGoSearchProvider, MockSearchProvider, get_search_cache
+from app.tools.ranking import URL_SELECTIONS, select_locally
 from app.tools.scraper import WebScraper, MockScraper
+import asyncio
 import json
+import os
 import re
+import threading
 
 # Local state for the researcher subgraph
 # IMPORTANT: VFS object itself is not serializable by msgpack/sqlite.
 # We must pass "vfs_data" (dict) instead, or reconstruct VFS inside nodes.
 class ResearchState(TypedDict):
     query: str
-    vfs_data: dict 
+    vfs_data: VFSData
     search_results: List[dict]
     selected_urls: List[str]
+    selection_mode: str  # "bm25", "llm" or "top" (first results, after an LLM failure)
     summaries: List[str]
+    batch: Optional[str]  # parallel research batch whose page claims this task shares
 
 # --- NODES ---
 
+_ddg_provider: Optional[SearchProvider] = None
+
+def get_search_provider() -> SearchProvider:
+    # SEARCH_PROVIDER=mock keeps offline runs and benchmarks off the network
+    if os.getenv("SEARCH_PROVIDER", "").lower() == "mock":
+        return MockSearchProvider()
+    global _ddg_provider
+    if _ddg_provider is None:
+        # Shared so its per-thread DDGS sessions are reused across searches
+        _ddg_provider = DuckDuckGoSearchProvider()
+    cache = get_search_cache()
+    return CachedSearchProvider(_ddg_provider, cache) if cache is not None else _ddg_provider
+
 def search_node(state: ResearchState):
     """Searches for the query."""
     query = state["query"]
     print(f"  [Researcher] Searching for: {query}")
     
     try:
-        provider = DuckDuckGoSearchProvider()
+        provider = get_search_provider()
         results = provider.search(query, max_results=5)
         if not results:
              raise Exception("No results found")
@@ -37,86 +64,310 @@ def search_node(state: ResearchState):
         
     return {"search_results": [r.model_dump() for r in results]}
 
-def select_node(state: ResearchState):
-    """Selects the best URLs to scrape."""
-    results = state["search_results"]
-    llm = get_researcher_model()
+async def asearch_node(state: ResearchState):
+    """Async variant of search_node."""
+    query = state["query"]
+    print(f"  [Researcher] Searching for: {query}")
     
-    prompt = f"""
-    Here are search results for "{state['query']}":
+    try:
+        provider = get_search_provider()
+        results = await provider.asearch(query, max_results=5)
+        if not results:
+             raise Exception("No results found")
+    except Exception:
+        print("  [Researcher] DDG failed, using Mock.")
+        provider = MockSearchProvider()
+        results = await provider.asearch(query)
+        
+    return {"search_results": [r.model_dump() for r in results]}
+
+def build_select_prompt(query: str, results: List[dict]) -> str:
+    return f"""
+    Here are search results for "{query}":
     {json.dumps(results[:5], indent=2)}
     
     Return ONLY a JSON list of the top 2 URLs that seem most information-rich and relevant.
     Example: ["http://site.com/a", "http://site.com/b"]
     """
+
+def parse_selected_urls(content: str, results: List[dict]) -> List[str]:
+    urls = re.findall(r'https?://[^\s",]+', content)
+    selected = [u.strip('",[]') for u in urls][:2]
+    if not selected:
+        selected = [r['url'] for r in results[:2]]
+    return selected
+
+def rank_selection(state: ResearchState) -> Optional[List[str]]:
+    ranking = select_locally(state['query'], [SearchResult(**r) for r in state["search_results"]])
+    return ranking.urls if ranking is not None else None
+
+def selection(selected: List[str], mode: str) -> dict:
+    URL_SELECTIONS.inc(mode=mode)
+    print(f"  [Researcher] Selected ({mode}): {selected}")
+    return {"selected_urls": selected, "selection_mode": mode}
+
+def select_node(state: ResearchState):
+    """Selects the best URLs to scrape: BM25 ranking, or the LLM when the ranking is unsure."""
+    selected = rank_selection(state)
+    if selected is not None:
+        return selection(selected, "bm25")
+    
+    results = state["search_results"]
+    llm = get_researcher_model()
     
     try:
-        response = llm.invoke(prompt)
-        urls = re.findall(r'https?://[^\s",]+', response.content)
-        selected = [u.strip('",[]') for u in urls][:2]
-        if not selected:
-            selected = [r['url'] for r in results[:2]]
-    except:
-        selected = [r['url'] for r in results[:2]]
-        
-    print(f"  [Researcher] Selected: {selected}")
-    return {"selected_urls": selected}
+        response = llm.invoke(build_select_prompt(state['query'], results))
+        return selection(parse_selected_urls(response.content, results), "llm")
+    except Exception:
+        return selection([r['url'] for r in results[:2]], "top")
 
-def scrape_and_summarize_node(state: ResearchState):
-    """Scrapes and summarizes each selected URL."""
-    urls = state["selected_urls"]
+async def aselect_node(state: ResearchState):
+    """Async variant of select_node."""
+    selected = rank_selection(state)
+    if selected is not None:
+        return selection(selected, "bm25")
+    
+    results = state["search_results"]
     llm = get_researcher_model()
     
-    # Rehydrate VFS
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
-    
-    for url in urls:
-        # Determine scraper based on URL
-        if "mock" in url or "example.com" in url:
-            scraper = MockScraper()
-        else:
-            scraper = WebScraper()
-            
-        print(f"  [Researcher] Scraping {url}...")
-        content = scraper.scrape(url)
-        
-        if not content:
-            print(f"  [Researcher] Failed to scrape {url}")
-            continue
-            
-        truncated_content = content[:10000] 
-        
-        prompt = f"""
-        Summarize the following text related to "{state['query']}". 
+    try:
+        response = await llm.ainvoke(build_select_prompt(state['query'], results))
+        return selection(parse_selected_urls(response.content, results), "llm")
+    except Exception:
+        return selection([r['url'] for r in results[:2]], "top")
+
+def get_scraper(url: str):
+    # Determine scraper based on URL
+    if "mock" in url or "example.com" in url:
+        return MockScraper()
+    return WebScraper()
+
+# Most of a page a summary prompt carries
+SUMMARY_CONTENT_CHARS = 10000
+
+def build_summary_prompt(query: str, content: str, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, partial(_summary_template, query), max_chars={"content": SUMMARY_CONTENT_CHARS}, content=content)
+
+def _summary_template(query: str, content: str) -> str:
+    return f"""
+        Summarize the following text related to "{query}". 
         Extract key facts, statistics, and definitions.
         
         Text:
-        {truncated_content}
+        {content}
         """
-        
-        try:
-            response = llm.invoke(prompt)
-            summary = response.content
-            
-            # Save to VFS
-            filename = f"research/summary_{abs(hash(url))}.md"
-            vfs.write_file(filename, summary, metadata={"url": url, "query": state['query']})
-            print(f"  [Researcher] Saved {filename}")
-        except Exception as e:
-            print(f"  [Researcher] Summarization failed: {e}")
+
+# (summary, fingerprint, content digest) of one summarized page
+PageSummary = Tuple[str, Signature, str]
+
+def save_summary(vfs: VFS, url: str, query: str, summary: str, fingerprint: Optional[Signature] = None, digest: Optional[str] = None):
+    # Named after the URL and page content, so reruns and resumed jobs produce the same files
+    digest = digest or content_digest(summary)
+    filename = f"research/summary_{artifact_id(url, digest)}.md"
+    metadata = {"url": url, "query": query, "content_digest": digest}
+    if fingerprint is not None:
+        # Lets later research tasks in the job recognise this page's duplicates
+        metadata["fingerprint"] = to_hex(fingerprint)
+    vfs.write_file(filename, summary, metadata=metadata)
+    print(f"  [Researcher] Saved {filename}")
+
+def stored_summary(query: str, url: str, digest: str, model_id: str) -> Optional[str]:
+    """Summary of this exact page version from an earlier job, if the research store has one."""
+    store = get_research_store()
+    summary = store.lookup(url, digest, query, model_id) if store is not None else None
+    if summary is not None:
+        print(f"  [Researcher] Reusing stored summary of {url}")
+    return summary
+
+def store_summary(query: str, url: str, digest: str, model_id: str, summary: str):
+    store = get_research_store()
+    if store is not None:
+        store.save(url, digest, query, model_id, summary)
+
+class PageClaims(FingerprintSet):
+    """
+    Pages claimed for summarizing, by URL and by fingerprint. The parallel
+    research tasks of a batch all start from the same VFS snapshot, so they
+    share one instance (see batch_claims): otherwise two tasks selecting the
+    same page would both summarize it and write the same summary file.
+    """
+
+    def __init__(self, min_similarity: float, signatures=(), urls=()):
+        super().__init__("page", min_similarity, signatures)
+        self._urls = {normalize_url(u) for u in urls}
+
+    def claim_url(self, url: str) -> bool:
+        """Records the URL and returns True, or returns False if it was claimed already."""
+        with self._lock:
+            key = normalize_url(url)
+            if key in self._urls:
+                self.dropped += 1
+                DEDUP_DROPPED.inc(stage=self.stage)
+                return False
+            self._urls.add(key)
+            return True
+
+def seen_pages(vfs: VFS) -> PageClaims:
+    """URLs and fingerprints of the pages already summarized in this job."""
+    fingerprints, urls = [], []
+    for filename in vfs.iter_prefix("research/"):
+        metadata = vfs.get_file(filename).metadata
+        if metadata.get("fingerprint"):
+            fingerprints.append(from_hex(metadata["fingerprint"]))
+        if metadata.get("url"):
+            urls.append(metadata["url"])
+    return PageClaims(threshold("DEDUP_PAGE_THRESHOLD", 0.8), fingerprints, urls)
+
+# Claim sets of the research batches now running, by batch id; collect_research
+# releases a batch's set once all of its tasks are done
+_batches: Dict[str, PageClaims] = {}
+_batches_lock = threading.Lock()
+
+def batch_claims(batch: Optional[str], vfs: VFS) -> PageClaims:
+    """
+    The claim set shared by the tasks of research batch `batch`, created from
+    the batch's VFS snapshot by whichever task gets here first. A task
+    outside any batch gets its own.
+    """
+    if batch is None:
+        return seen_pages(vfs)
+    with _batches_lock:
+        claims = _batches.get(batch)
+        if claims is None:
+            claims = _batches[batch] = seen_pages(vfs)
+        return claims
+
+def release_batch(batch: Optional[str]):
+    """Drops the claim set of a finished research batch."""
+    if batch is not None:
+        with _batches_lock:
+            _batches.pop(batch, None)
+
+def claim_page(seen: PageClaims, url: str, content: str) -> Optional[Signature]:
+    """
+    Fingerprint of a newly scraped page, or None if its URL or a near
+    duplicate of it was already summarized. Claimed only once the page was
+    fetched, so a failed fetch doesn't stop another task trying the URL.
+    """
+    if not seen.claim_url(url):
+        print(f"  [Researcher] Skipping {url}: already summarized in this job")
+        return None
+    fingerprint = minhash(content)
+    if not seen.add_if_new(fingerprint):
+        print(f"  [Researcher] Skipping {url}: near-duplicate of a page already summarized")
+        return None
+    return fingerprint
+
+def scrape_and_summarize(llm, query: str, seen: PageClaims, url: str) -> Optional[PageSummary]:
+    """Fetches, extracts and summarizes one URL; (summary, fingerprint, digest), or None if skipped or failed."""
+    print(f"  [Researcher] Scraping {url}...")
+    content = get_scraper(url).scrape(url)
+    
+    if not content:
+        print(f"  [Researcher] Failed to scrape {url}")
+        return None
+    
+    fingerprint = claim_page(seen, url, content)
+    if fingerprint is None:
+        return None
+    
+    digest = content_digest(content)
+    summary = stored_summary(query, url, digest, llm.model_name)
+    if summary is not None:
+        return summary, fingerprint, digest
+    
+    try:
+        # Only the passages relevant to the query go to the LLM
+        content = compress_page(content, query, llm.model_name)
+        response = llm.invoke(build_summary_prompt(query, content, llm.model_name))
+        store_summary(query, url, digest, llm.model_name, response.content)
+        return response.content, fingerprint, digest
+    except Exception as e:
+        print(f"  [Researcher] Summarization failed: {e}")
+        return None
+
+async def ascrape_and_summarize(llm, query: str, seen: PageClaims, url: str) -> Optional[PageSummary]:
+    """Async variant of scrape_and_summarize."""
+    print(f"  [Researcher] Scraping {url}...")
+    content = await get_scraper(url).ascrape(url)
+    
+    if not content:
+        print(f"  [Researcher] Failed to scrape {url}")
+        return None
+    
+    fingerprint = claim_page(seen, url, content)
+    if fingerprint is None:
+        return None
+    
+    digest = content_digest(content)
+    summary = await asyncio.to_thread(stored_summary, query, url, digest, llm.model_name)
+    if summary is not None:
+        return summary, fingerprint, digest
+    
+    try:
+        content = await asyncio.to_thread(compress_page, content, query, llm.model_name)
+        response = await llm.ainvoke(build_summary_prompt(query, content, llm.model_name))
+        await asyncio.to_thread(store_summary, query, url, digest, llm.model_name, response.content)
+        return response.content, fingerprint, digest
+    except Exception as e:
+        print(f"  [Researcher] Summarization failed: {e}")
+        return None
+
+def save_summaries(vfs: VFS, urls: List[str], query: str, summaries: List[Optional[PageSummary]]):
+    # Written once all URLs are done, in selection order, so the result
+    # doesn't depend on which page finished first
+    for url, result in zip(urls, summaries):
+        if result is not None:
+            save_summary(vfs, url, query, *result)
+
+def scrape_and_summarize_node(state: ResearchState):
+    """
+    Scrapes and summarizes the selected URLs concurrently, one worker thread
+    per URL, so research takes about as long as the slowest page.
+    """
+    urls = state["selected_urls"]
+    llm = get_researcher_model()
+    
+    # Rehydrate VFS
+    vfs = VFS(state.get("vfs_data", {}))
+    
+    seen = batch_claims(state.get("batch"), vfs)
+    summaries = []
+    if urls:
+        # Context-copying pool keeps callbacks and job attribution in the workers
+        with ContextThreadPoolExecutor(max_workers=len(urls)) as executor:
+            summaries = list(executor.map(partial(scrape_and_summarize, llm, state['query'], seen), urls))
+    save_summaries(vfs, urls, state['query'], summaries)
             
     # Return updated VFS data
-    return {"vfs_data": vfs._files}
+    return {"vfs_data": vfs.changes()}
+
+async def ascrape_and_summarize_node(state: ResearchState):
+    """
+    Async variant of scrape_and_summarize_node. Each URL is fetched and
+    summarized as its own task, so a page is summarized as soon as it arrives.
+    """
+    urls = state["selected_urls"]
+    llm = get_researcher_model()
+    
+    vfs = VFS(state.get("vfs_data", {}))
+    
+    seen = batch_claims(state.get("batch"), vfs)
+    summaries = await asyncio.gather(*(ascrape_and_summarize(llm, state['query'], seen, url) for url in urls))
+    save_summaries(vfs, urls, state['query'], summaries)
+            
+    return {"vfs_data": vfs.changes()}
 
 # --- GRAPH DEFINITION ---
 
 def create_researcher_graph():
     workflow = StateGraph(ResearchState)
     
-    workflow.add_node("search", search_node)
-    workflow.add_node("select", select_node)
-    workflow.add_node("scrape_summarize", scrape_and_summarize_node)
+    # Each node has a sync and an async implementation: invoke() uses the
+    # former, ainvoke() the latter, so the API server never blocks its loop.
+    workflow.add_node("search", RunnableLambda(search_node, afunc=asearch_node))
+    workflow.add_node("select", RunnableLambda(select_node, afunc=aselect_node))
+    workflow.add_node("scrape_summarize", RunnableLambda(scrape_and_summarize_node, afunc=ascrape_and_summarize_node))
     
     workflow.set_entry_point("search")
     
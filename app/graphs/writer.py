@@ -1,36 +1,25 @@
-from typing import TypedDict, List
+from typing import TypedDict, List, Optional
+from functools import partial
 from langgraph.graph import StateGraph, END
-from app.core.vfs import VFS
+from langchain_core.runnables import RunnableLambda
+from app.core.vfs import VFS, VFSData
 from app.core.llm import get_writer_model
-import os
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
+from app.core.tokens import trim_to_tokens
+from app.core.embedding_cache import get_embedding_cache
+from app.core.vector_index import ResearchIndexData, chunk_research, embedding_model_id, get_embedding_model, get_research_index
+import asyncio
 
-# Singleton for embedding model to avoid reloading
-_embedding_model = None
+# Research tokens passed to the writer when retrieval is unavailable
+FALLBACK_CONTEXT_TOKENS = 800
 
-def get_embedding_model():
-    global _embedding_model
-    if _embedding_model is None:
-        # Check for local model first, then fall back to download
-        # Set EMBEDDING_MODEL_PATH in .env to use a local model
-        model_path = os.getenv("EMBEDDING_MODEL_PATH")
-        
-        if model_path and os.path.exists(model_path):
-            print(f"  [Writer] Loading local embedding model from: {model_path}")
-            _embedding_model = SentenceTransformer(model_path)
-        else:
-            # Default: download from HuggingFace (requires internet)
-            model_name = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
-            print(f"  [Writer] Loading embedding model: {model_name}")
-            _embedding_model = SentenceTransformer(model_name)
-    return _embedding_model
+# Characters from the end of the draft shown to the writer for continuity
+DRAFT_TAIL_CHARS = 2000
 
 class WriterState(TypedDict):
     task_description: str
-    vfs_data: dict
+    vfs_data: VFSData
     draft_file: str # Filename of the draft
+    research_index: Optional[ResearchIndexData]  # The job's vector index, extended as research grows
 
 class WriterStateInternal(WriterState):
     context: str
@@ -38,85 +27,65 @@ class WriterStateInternal(WriterState):
 def retrieve_context_node(state: WriterState):
     """
     RAG Implementation:
-    1. Reads research files.
-    2. Chunks them.
-    3. Embeds them.
-    4. Retrieves top K relevant chunks for the current task.
+    1. Adds research files new since the last task to the job's index
+       (chunked, near duplicates dropped, embedded).
+    2. Retrieves top K relevant chunks for the current task.
     """
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
-    files = vfs.list_files()
-    
-    # 1. Collect all research text
-    chunks = []
-    
-    for f in files:
-        if f.startswith("research/"):
-            content = vfs.read_file(f)
-            meta = vfs.get_file(f).metadata
-            source_url = meta.get('url', 'unknown')
-            
-            # Simple chunking by paragraphs or max char length
-            # A more robust approach would use a text splitter, but this suffices for now.
-            raw_paragraphs = content.split("\n\n")
-            for p in raw_paragraphs:
-                p = p.strip()
-                if len(p) > 50: # Ignore tiny fragments
-                    chunks.append(f"Source: {source_url}\nContent: {p}")
-    
-    if not chunks:
+    vfs = VFS(state.get("vfs_data", {}))
+    
+    if not any(True for _ in vfs.iter_prefix("research/")):
         return {"context": "No research available."}
-        
-    # 2. Embed chunks & Task
+    
     try:
         model = get_embedding_model()
-        chunk_embeddings = model.encode(chunks)
-        task_embedding = model.encode([state['task_description']])
-        
-        # 3. Build FAISS index
-        dimension = chunk_embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(np.array(chunk_embeddings).astype('float32'))
+        model_id = embedding_model_id()
+        index = get_research_index(state.get("research_index"), model_id)
+        # Research barely changes between sections: only new chunks are encoded
+        added, dropped = index.sync(vfs, partial(get_embedding_cache().encode, model, model_id))
+        if dropped:
+            print(f"  [Writer] Dropped {dropped} near-duplicate chunk(s).")
+        if not index.chunks:
+            return {"context": "No research available."}
+        print(f"  [Writer] Indexed {added} new chunk(s), {len(index.chunks)} total.")
         
-        # 4. Search
         k = 4 # Retrieve top 4 chunks (approx 600-1000 tokens)
-        D, I = index.search(np.array(task_embedding).astype('float32'), k)
+        relevant_chunks = index.search(model.encode([state['task_description']])[0], k)
         
-        retrieved_indices = I[0]
-        relevant_chunks = [chunks[i] for i in retrieved_indices if i >= 0 and i < len(chunks)]
-        
-        context_text = "\n\n".join(relevant_chunks)
+        context_text = "\n\n".join(c.render() for c in relevant_chunks)
         print(f"  [Writer] Retrieved {len(relevant_chunks)} chunks for context.")
+        # Only hand the index back when it grew, so unchanged tasks don't re-checkpoint the vectors
+        saved = state.get("research_index")
+        if saved is None or saved["revision"] != index.revision:
+            return {"context": context_text, "research_index": index.to_data()}
+        return {"context": context_text}
         
     except Exception as e:
         print(f"  [Writer] RAG failed ({e}), falling back to simple truncation.")
-        # Fallback: Just take the first 3000 chars of all research
-        full_text = "\n".join(chunks)
-        context_text = full_text[:3000]
+        # Fallback: take the head of all research, about what RAG would retrieve
+        chunks, dropped = chunk_research(vfs)
+        if dropped:
+            print(f"  [Writer] Dropped {dropped} near-duplicate chunk(s).")
+        if not chunks:
+            return {"context": "No research available."}
+        full_text = "\n\n".join(c.render() for c in chunks)
+        return {"context": trim_to_tokens(full_text, FALLBACK_CONTEXT_TOKENS)}
 
-    return {"context": context_text} 
+async def aretrieve_context_node(state: WriterState):
+    """
+    Async variant of retrieve_context_node. Chunking, embedding and the FAISS
+    search are CPU-bound, so the whole step runs in a worker thread.
+    """
+    return await asyncio.to_thread(retrieve_context_node, state)
 
 
-def write_node(state: WriterStateInternal):
-    """Generates the text."""
-    llm = get_writer_model()
-    
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
-    
-    current_draft = ""
-    if vfs.exists(state["draft_file"]):
-        current_draft = vfs.read_file(state["draft_file"])
-    
-    draft_tail = current_draft[-2000:] if current_draft else "(Start of Article)"
-    
-    prompt = f"""
+def build_write_prompt(task_description: str, context: str, draft_tail: str) -> str:
+    return f"""
     You are a human writer with 10 years of experience. Write like a person, not a machine.
     
-    Task: {state['task_description']}
+    Task: {task_description}
     
     Research Context:
-    {state['context']}
+    {context}
     
     Current Draft (End):
     {draft_tail}
@@ -198,29 +167,64 @@ def write_node(state: WriterStateInternal):
     
     Now write your section. No preamble. Just the content.
     """
+
+def append_section(vfs: VFS, draft_file: str, new_content: str):
+    # Post-processing to remove chatty prefix if present (naive)
+    if new_content.strip().lower().startswith("here is"):
+        new_content = new_content.split("\n", 1)[-1]
+    
+    # Append to draft as a new segment; earlier sections are not rewritten
+    vfs.append_file(draft_file, "\n\n" + new_content)
+
+def _load_draft(state: WriterStateInternal):
+    vfs = VFS(state.get("vfs_data", {}))
+    
+    # Only the end of the draft goes into the prompt
+    draft_tail = ""
+    if vfs.exists(state["draft_file"]):
+        draft_tail = vfs.tail(state["draft_file"], DRAFT_TAIL_CHARS)
+    return vfs, draft_tail
+
+def write_node(state: WriterStateInternal):
+    """Generates the text."""
+    llm = get_writer_model()
+    vfs, draft_tail = _load_draft(state)
+    
+    draft_tail = draft_tail or "(Start of Article)"
+    prompt = build_write_prompt(state['task_description'], state['context'], draft_tail)
     
     print(f"  [Writer] Writing section: {state['task_description'][:50]}...")
     try:
-        response = llm.invoke(prompt)
-        new_content = response.content
-        
-        # Post-processing to remove chatty prefix if present (naive)
-        if new_content.strip().lower().startswith("here is"):
-            new_content = new_content.split("\n", 1)[-1]
-        
-        # Append to draft
-        full_content = current_draft + "\n\n" + new_content
-        vfs.write_file(state["draft_file"], full_content)
+        # Stream tokens so the API can relay the section while it is written
+        response = llm.invoke(prompt, stream=True)
+        append_section(vfs, state["draft_file"], response.content)
+    except Exception as e:
+        print(f"  [Writer] Failed: {e}")
+    
+    return {"vfs_data": vfs.changes()}
+
+async def awrite_node(state: WriterStateInternal):
+    """Async variant of write_node."""
+    llm = get_writer_model()
+    vfs, draft_tail = _load_draft(state)
+    
+    draft_tail = draft_tail or "(Start of Article)"
+    prompt = build_write_prompt(state['task_description'], state['context'], draft_tail)
+    
+    print(f"  [Writer] Writing section: {state['task_description'][:50]}...")
+    try:
+        response = await llm.ainvoke(prompt, stream=True)
+        append_section(vfs, state["draft_file"], response.content)
     except Exception as e:
         print(f"  [Writer] Failed: {e}")
     
-    return {"vfs_data": vfs._files}
+    return {"vfs_data": vfs.changes()}
 
 def create_writer_graph():
     workflow = StateGraph(WriterStateInternal)
     
-    workflow.add_node("retrieve_context", retrieve_context_node)
-    workflow.add_node("write", write_node)
+    workflow.add_node("retrieve_context", RunnableLambda(retrieve_context_node, afunc=aretrieve_context_node))
+    workflow.add_node("write", RunnableLambda(write_node, afunc=awrite_node))
     
     workflow.set_entry_point("retrieve_context")
     workflow.add_edge("retrieve_context", "write")
@@ -1,10 +1,12 @@
 from typing import TypedDict, List, Optional
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
+from langchain_core.runnables import RunnableLambda
 from langgraph.checkpoint.base import BaseCheckpointSaver
 from app.core.state import AgentState
-from app.core.vfs import VFS
-from app.agents.planner import create_initial_plan
-from app.graphs.researcher import create_researcher_graph
+from app.core.vfs import VFS, diff_vfs
+from app.agents.planner import create_initial_plan, acreate_initial_plan
+from app.graphs.researcher import create_researcher_graph, release_batch
 from app.graphs.writer import create_writer_graph
 from app.graphs.evaluator import create_evaluator_graph
 from app.graphs.humanizer import create_humanizer_graph
@@ -12,99 +14,144 @@ from app.graphs.faq import create_faq_graph
 from app.graphs.keyword_analyzer import create_keyword_analyzer_graph
 from app.graphs.linking import create_linking_graph
 from app.core.llm import get_writer_model
+from app.core.tokens import fit_prompt
+from functools import partial
+import asyncio
 import concurrent.futures
+import contextvars
+import os
+import uuid
 
 # --- SUBGRAPH WRAPPERS ---
 
-def call_researcher(state: AgentState):
-    """Bridge to Researcher Subgraph"""
+def _complete_current_task(state: AgentState, result: dict) -> dict:
+    task = state["plan"][state["current_task_index"]]
+    return {
+        # Only the files the subgraph changed go back into the parent state
+        "vfs_data": diff_vfs(state.get("vfs_data", {}), result.get("vfs_data")),
+        # Only this task; merge_plan applies it to the full plan
+        "plan": [{**task, "status": "completed"}],
+        "current_task_index": state["current_task_index"] + 1
+    }
+
+def _researcher_input(state: AgentState) -> dict:
     task = state["plan"][state["current_task_index"]]
     
     # Pass dict instead of VFS object
-    research_input = {
+    return {
         "query": task["description"],
         "vfs_data": state.get("vfs_data", {}),
         "search_results": [],
         "selected_urls": [],
-        "summaries": []
+        "summaries": [],
+        # Shared page claims with the other tasks of a parallel batch
+        "batch": state.get("research_batch")
     }
-    
+
+def _complete_research_task(state: AgentState, result: dict) -> dict:
+    # Tells collect_research which batch's page claims to release
+    return {**_complete_current_task(state, result), "research_batch": state.get("research_batch")}
+
+def call_researcher(state: AgentState):
+    """Bridge to Researcher Subgraph"""
     research_graph = create_researcher_graph()
-    result = research_graph.invoke(research_input)
-    
-    return {
-        "vfs_data": result.get("vfs_data", {}),
-        "plan": [
-            t if i != state["current_task_index"] else {**t, "status": "completed"}
-            for i, t in enumerate(state["plan"])
-        ],
-        "current_task_index": state["current_task_index"] + 1
-    }
+    result = research_graph.invoke(_researcher_input(state))
+    return _complete_research_task(state, result)
 
-def call_writer(state: AgentState):
-    """Bridge to Writer Subgraph"""
+async def acall_researcher(state: AgentState):
+    """Async bridge to Researcher Subgraph"""
+    research_graph = create_researcher_graph()
+    result = await research_graph.ainvoke(_researcher_input(state))
+    return _complete_research_task(state, result)
+
+def _writer_input(state: AgentState) -> dict:
     task = state["plan"][state["current_task_index"]]
     
-    writer_input = {
+    return {
         "task_description": task["description"],
         "vfs_data": state.get("vfs_data", {}),
         "draft_file": "draft.md",
+        "research_index": state.get("research_index"),
         "context": ""
     }
-    
+
+def _complete_write_task(state: AgentState, result: dict) -> dict:
+    update = _complete_current_task(state, result)
+    index, saved = result.get("research_index"), state.get("research_index")
+    # The writer extends the job's index; only a new revision needs checkpointing
+    if index is not None and (saved is None or (index["id"], index["revision"]) != (saved["id"], saved["revision"])):
+        update["research_index"] = index
+    return update
+
+def call_writer(state: AgentState):
+    """Bridge to Writer Subgraph"""
     writer_graph = create_writer_graph()
-    result = writer_graph.invoke(writer_input)
-    
+    result = writer_graph.invoke(_writer_input(state))
+    return _complete_write_task(state, result)
+
+async def acall_writer(state: AgentState):
+    """Async bridge to Writer Subgraph"""
+    writer_graph = create_writer_graph()
+    result = await writer_graph.ainvoke(_writer_input(state))
+    return _complete_write_task(state, result)
+
+def _evaluator_input(state: AgentState) -> dict:
     return {
-        "vfs_data": result.get("vfs_data", {}),
-        "plan": [
-            t if i != state["current_task_index"] else {**t, "status": "completed"}
-            for i, t in enumerate(state["plan"])
-        ],
-        "current_task_index": state["current_task_index"] + 1
+        "draft_file": "draft.md",
+        "vfs_data": state.get("vfs_data", {}),
+        "critiques": []
     }
 
 def call_evaluator(state: AgentState):
     """Bridge to Evaluator Subgraph"""
     print("--- Evaluating Article ---")
-    evaluator_input = {
-        "draft_file": "draft.md",
-        "vfs_data": state.get("vfs_data", {}),
-        "critiques": []
-    }
+    evaluator_graph = create_evaluator_graph()
+    result = evaluator_graph.invoke(_evaluator_input(state))
     
+    return {
+        "vfs_data": diff_vfs(state.get("vfs_data", {}), result.get("vfs_data"))
+    }
+
+async def acall_evaluator(state: AgentState):
+    """Async bridge to Evaluator Subgraph"""
+    print("--- Evaluating Article ---")
     evaluator_graph = create_evaluator_graph()
-    result = evaluator_graph.invoke(evaluator_input)
+    result = await evaluator_graph.ainvoke(_evaluator_input(state))
     
     return {
-        "vfs_data": result.get("vfs_data", {})
+        "vfs_data": diff_vfs(state.get("vfs_data", {}), result.get("vfs_data"))
     }
 
-def call_humanizer(state: AgentState):
-    """Bridge to Humanizer Subgraph"""
-    print("--- Humanizing Article ---")
-    humanizer_input = {
+def _humanizer_input(state: AgentState) -> dict:
+    return {
         "draft_file": "draft.md",
         "vfs_data": state.get("vfs_data", {}),
         "last_critique": None,
         "iteration_count": 0
     }
+
+def call_humanizer(state: AgentState):
+    """Bridge to Humanizer Subgraph"""
+    print("--- Humanizing Article ---")
+    humanizer_graph = create_humanizer_graph()
+    result = humanizer_graph.invoke(_humanizer_input(state))
     
+    return {
+        "vfs_data": diff_vfs(state.get("vfs_data", {}), result.get("vfs_data"))
+    }
+
+async def acall_humanizer(state: AgentState):
+    """Async bridge to Humanizer Subgraph"""
+    print("--- Humanizing Article ---")
     humanizer_graph = create_humanizer_graph()
-    result = humanizer_graph.invoke(humanizer_input)
+    result = await humanizer_graph.ainvoke(_humanizer_input(state))
     
     return {
-        "vfs_data": result.get("vfs_data", {})
+        "vfs_data": diff_vfs(state.get("vfs_data", {}), result.get("vfs_data"))
     }
 
 
-def call_seo_analysis(state: AgentState):
-    """
-    Runs FAQ, Keyword Analysis, and Linking agents in PARALLEL.
-    This is the SEO analysis phase before final article generation.
-    """
-    print("--- Running SEO Analysis (FAQ + Keywords + Linking) ---")
-    
+def _seo_inputs(state: AgentState):
     vfs_data = state.get("vfs_data", {})
     topic = state.get("topic", "")
     
@@ -112,6 +159,7 @@ def call_seo_analysis(state: AgentState):
     faq_input = {
         "vfs_data": vfs_data,
         "draft_file": "draft.md",
+        "research_index": state.get("research_index"),
         "faqs": []
     }
     
@@ -126,10 +174,39 @@ def call_seo_analysis(state: AgentState):
         "vfs_data": vfs_data,
         "draft_file": "draft.md",
         "topic": topic,
+        "research_index": state.get("research_index"),
         "linking_report": {}
     }
+    return faq_input, keyword_input, linking_input
+
+def _merge_seo_results(vfs_data: dict, faq_result: dict, keyword_result: dict, linking_result: dict) -> dict:
+    # Each agent only writes its own report file; combine their changes
+    changes = {}
+    for result in (faq_result, keyword_result, linking_result):
+        changes.update(diff_vfs(vfs_data, result.get("vfs_data")))
+    
+    print(f"  [SEO] Analysis complete: {len(faq_result.get('faqs', []))} FAQs, keywords extracted, links suggested")
+    
+    return {
+        "vfs_data": changes,
+        "faqs": faq_result.get("faqs", []),
+        "keyword_report": keyword_result.get("keyword_report", {}),
+        "linking_report": linking_result.get("linking_report", {})
+    }
+
+def call_seo_analysis(state: AgentState):
+    """
+    Runs FAQ, Keyword Analysis, and Linking agents in PARALLEL.
+    This is the SEO analysis phase before final article generation.
+    """
+    print("--- Running SEO Analysis (FAQ + Keywords + Linking) ---")
+    
+    vfs_data = state.get("vfs_data", {})
+    faq_input, keyword_input, linking_input = _seo_inputs(state)
     
-    # Run all three agents in parallel using ThreadPoolExecutor
+    # Run all three agents in parallel using ThreadPoolExecutor.
+    # Each task gets its own copy of the caller's context so per-job settings
+    # (e.g. cache bypass) carry over into the worker threads.
     faq_result = {}
     keyword_result = {}
     linking_result = {}
@@ -148,9 +225,9 @@ def call_seo_analysis(state: AgentState):
     
     try:
         with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            future_faq = executor.submit(run_faq)
-            future_keywords = executor.submit(run_keywords)
-            future_linking = executor.submit(run_linking)
+            future_faq = executor.submit(contextvars.copy_context().run, run_faq)
+            future_keywords = executor.submit(contextvars.copy_context().run, run_keywords)
+            future_linking = executor.submit(contextvars.copy_context().run, run_linking)
             
             # Collect results
             try:
@@ -187,50 +264,45 @@ def call_seo_analysis(state: AgentState):
         except:
             linking_result = {"linking_report": {}}
     
-    # Merge VFS data from all results (linking has the most complete)
-    merged_vfs = {**vfs_data}
-    if faq_result.get("vfs_data"):
-        merged_vfs.update(faq_result["vfs_data"])
-    if keyword_result.get("vfs_data"):
-        merged_vfs.update(keyword_result["vfs_data"])
-    if linking_result.get("vfs_data"):
-        merged_vfs.update(linking_result["vfs_data"])
-    
-    print(f"  [SEO] Analysis complete: {len(faq_result.get('faqs', []))} FAQs, keywords extracted, links suggested")
-    
-    return {
-        "vfs_data": merged_vfs,
-        "faqs": faq_result.get("faqs", []),
-        "keyword_report": keyword_result.get("keyword_report", {}),
-        "linking_report": linking_result.get("linking_report", {})
-    }
+    return _merge_seo_results(vfs_data, faq_result, keyword_result, linking_result)
 
-def finalize_article(state: AgentState):
+async def acall_seo_analysis(state: AgentState):
     """
-    Generates SEO metadata and finalizes the article.
-    Includes: FAQ section, keyword report, and linking suggestions.
+    Async variant of call_seo_analysis: the three agents run as concurrent
+    tasks on the event loop instead of in a thread pool.
     """
-    print("--- Finalizing Article ---")
-    vfs = VFS()
-    vfs._files = {k: v for k, v in state.get("vfs_data", {}).items()}
+    print("--- Running SEO Analysis (FAQ + Keywords + Linking) ---")
     
-    if not vfs.exists("draft.md"):
-        return {}
-        
-    draft = vfs.read_file("draft.md")
-    llm = get_writer_model()
+    vfs_data = state.get("vfs_data", {})
+    faq_input, keyword_input, linking_input = _seo_inputs(state)
     
-    # Get SEO analysis results
-    faqs = state.get("faqs", [])
-    keyword_report = state.get("keyword_report", {})
-    linking_report = state.get("linking_report", {})
+    async def run(label, graph, graph_input, fallback):
+        try:
+            return await asyncio.wait_for(graph.ainvoke(graph_input), timeout=120)
+        except Exception as e:
+            print(f"  [SEO] {label} failed: {e}")
+            return fallback
+    
+    faq_result, keyword_result, linking_result = await asyncio.gather(
+        run("FAQ generation", create_faq_graph(), faq_input, {"faqs": []}),
+        run("Keyword analysis", create_keyword_analyzer_graph(), keyword_input, {"keyword_report": {}}),
+        run("Linking suggestions", create_linking_graph(), linking_input, {"linking_report": {}})
+    )
     
-    # Generate SEO metadata
-    prompt = f"""
+    return _merge_seo_results(vfs_data, faq_result, keyword_result, linking_result)
+
+# Most of the draft metadata generation sees
+METADATA_DRAFT_CHARS = 5000
+
+def build_metadata_prompt(draft: str, keyword_report: dict, model_id: Optional[str] = None) -> str:
+    return fit_prompt(model_id, partial(_metadata_template, keyword_report), max_chars={"draft": METADATA_DRAFT_CHARS}, draft=draft)
+
+def _metadata_template(keyword_report: dict, draft: str) -> str:
+    return f"""
     Analyze the following article draft and generate SEO metadata.
     
     Draft:
-    {draft[:5000]}... (truncated)
+    {draft}
     
     Primary Keyword: {keyword_report.get('primary_keyword', 'N/A')}
     
@@ -246,17 +318,26 @@ def finalize_article(state: AgentState):
     primary_keyword: "keyword"
     ---
     """
-    
-    try:
-        response = llm.invoke(prompt)
-        metadata = response.content
-    except Exception as e:
-        print(f"Metadata generation failed: {e}")
-        metadata = f"""---
+
+def fallback_metadata(state: AgentState, keyword_report: dict) -> str:
+    return f"""---
 title: "{state.get('topic', 'Article')}"
 meta_description: "Learn about {state.get('topic', 'this topic')} in this comprehensive guide."
 primary_keyword: "{keyword_report.get('primary_keyword', state.get('topic', ''))}"
 ---"""
+
+def _finalize_inputs(state: AgentState):
+    vfs = VFS(state.get("vfs_data", {}))
+    
+    if not vfs.exists("draft.md"):
+        return vfs, None
+    return vfs, vfs.read_file("draft.md")
+
+def assemble_final_article(state: AgentState, vfs: VFS, draft: str, metadata: str) -> dict:
+    # Get SEO analysis results
+    faqs = state.get("faqs", [])
+    keyword_report = state.get("keyword_report", {})
+    linking_report = state.get("linking_report", {})
     
     # Build final article with all sections
     final_parts = [metadata, "\n\n", draft]
@@ -331,12 +412,89 @@ primary_keyword: "{keyword_report.get('primary_keyword', state.get('topic', ''))
     
     print(f"  [Finalize] Article complete with FAQ ({len(faqs)} items), keywords, and linking strategy")
     
-    return {"vfs_data": vfs._files}
+    return {"vfs_data": vfs.changes()}
+
+def finalize_article(state: AgentState):
+    """
+    Generates SEO metadata and finalizes the article.
+    Includes: FAQ section, keyword report, and linking suggestions.
+    """
+    print("--- Finalizing Article ---")
+    vfs, draft = _finalize_inputs(state)
+    if draft is None:
+        return {}
+    
+    keyword_report = state.get("keyword_report", {})
+    llm = get_writer_model()
+    
+    # Generate SEO metadata
+    try:
+        response = llm.invoke(build_metadata_prompt(draft, keyword_report, llm.model_name))
+        metadata = response.content
+    except Exception as e:
+        print(f"Metadata generation failed: {e}")
+        metadata = fallback_metadata(state, keyword_report)
+    
+    return assemble_final_article(state, vfs, draft, metadata)
+
+async def afinalize_article(state: AgentState):
+    """Async variant of finalize_article."""
+    print("--- Finalizing Article ---")
+    vfs, draft = _finalize_inputs(state)
+    if draft is None:
+        return {}
+    
+    keyword_report = state.get("keyword_report", {})
+    llm = get_writer_model()
+    
+    try:
+        response = await llm.ainvoke(build_metadata_prompt(draft, keyword_report, llm.model_name))
+        metadata = response.content
+    except Exception as e:
+        print(f"Metadata generation failed: {e}")
+        metadata = fallback_metadata(state, keyword_report)
+    
+    return assemble_final_article(state, vfs, draft, metadata)
 
 
 def planner_node(state: AgentState):
     return create_initial_plan(state)
 
+async def aplanner_node(state: AgentState):
+    return await acreate_initial_plan(state)
+
+# Research tasks run in parallel per step (RESEARCH_CONCURRENCY, default 4)
+RESEARCH_CONCURRENCY = max(1, int(os.getenv("RESEARCH_CONCURRENCY", "4")))
+
+def _research_batch(state: AgentState) -> List[Send]:
+    """
+    Fans out the run of consecutive research tasks starting at the current
+    task, up to RESEARCH_CONCURRENCY at a time. Research tasks don't depend
+    on each other, and a write task after the run only starts once the whole
+    run is done, so it sees all of that research. The tasks of a batch share
+    one set of page claims (keyed by the batch id), so a page two of them
+    select is summarized once.
+    """
+    plan = state["plan"]
+    start = state["current_task_index"]
+    end = start
+    while end < len(plan) and end - start < RESEARCH_CONCURRENCY and plan[end]["type"] == "research":
+        end += 1
+    batch = uuid.uuid4().hex
+    return [
+        # Each branch sees the plan as if its task were the current one
+        Send("researcher", {"plan": plan, "current_task_index": i, "vfs_data": state.get("vfs_data", {}), "research_batch": batch})
+        for i in range(start, end)
+    ]
+
+def collect_research(state: AgentState):
+    """
+    Fan-in point for a research batch; the merged plan and files are already
+    in state. Releases the page claims the batch's tasks shared.
+    """
+    release_batch(state.get("research_batch"))
+    return {"research_batch": None}
+
 def router(state: AgentState):
     """Decides next step"""
     if not state.get("plan"):
@@ -347,7 +505,7 @@ def router(state: AgentState):
         
     current_task = state["plan"][state["current_task_index"]]
     if current_task["type"] == "research":
-        return "researcher"
+        return _research_batch(state)
     elif current_task["type"] == "write":
         return "writer"
     
@@ -358,13 +516,16 @@ def router(state: AgentState):
 def create_main_graph(checkpointer: Optional[BaseCheckpointSaver] = None):
     workflow = StateGraph(AgentState)
     
-    workflow.add_node("planner", planner_node)
-    workflow.add_node("researcher", call_researcher)
-    workflow.add_node("writer", call_writer)
-    workflow.add_node("evaluator", call_evaluator)
-    workflow.add_node("humanizer", call_humanizer)
-    workflow.add_node("seo_analysis", call_seo_analysis)  # NEW: Parallel FAQ + Keywords + Linking
-    workflow.add_node("finalize", finalize_article)
+    # Sync bridges serve graph.invoke() (CLI); async bridges serve
+    # graph.ainvoke() (API server) so no node blocks the event loop.
+    workflow.add_node("planner", RunnableLambda(planner_node, afunc=aplanner_node))
+    workflow.add_node("researcher", RunnableLambda(call_researcher, afunc=acall_researcher))
+    workflow.add_node("collect_research", collect_research)
+    workflow.add_node("writer", RunnableLambda(call_writer, afunc=acall_writer))
+    workflow.add_node("evaluator", RunnableLambda(call_evaluator, afunc=acall_evaluator))
+    workflow.add_node("humanizer", RunnableLambda(call_humanizer, afunc=acall_humanizer))
+    workflow.add_node("seo_analysis", RunnableLambda(call_seo_analysis, afunc=acall_seo_analysis))  # NEW: Parallel FAQ + Keywords + Linking
+    workflow.add_node("finalize", RunnableLambda(finalize_article, afunc=afinalize_article))
     
     workflow.set_entry_point("planner")
     
@@ -378,8 +539,10 @@ def create_main_graph(checkpointer: Optional[BaseCheckpointSaver] = None):
         }
     )
     
+    # Parallel research branches join here, so routing happens once per batch
+    workflow.add_edge("researcher", "collect_research")
     workflow.add_conditional_edges(
-        "researcher",
+        "collect_research",
         router,
         {
             "researcher": "researcher",
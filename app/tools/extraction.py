@@ -0,0 +1,246 @@
+"""
+HTML -> text extraction stage for scraped pages.
+
+trafilatura.extract builds an lxml tree and runs its heuristics in pure
+Python, so running it in the scraper's process competes with the event loop
+and the LLM clients for the GIL. ProcessPoolExtractor (the default) runs it
+in up to EXTRACTION_WORKERS warm worker processes instead.
+
+A document is only handed to an idle, already warmed-up worker, so its
+deadline (EXTRACTION_TIMEOUT) runs from when the worker starts on it, not
+from when it was queued or the worker was spawned. A page that overruns is
+given up on and only the worker stuck on it is killed and replaced; the
+others keep their documents. If workers can't be started at all, pages are
+extracted in-process.
+
+EXTRACTION_WORKERS=0 selects InlineExtractor, which extracts in-process
+(in a worker thread for async callers).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Union
+
+import trafilatura
+
+Html = Union[str, bytes]
+
+def _extract(html: Html) -> Optional[str]:
+    return trafilatura.extract(html)
+
+
+def _warm_worker():
+    # Pay trafilatura's import and first-parse cost before real work arrives
+    trafilatura.extract("<html><body><p>warm up</p></body></html>")
+
+
+class Extractor(ABC):
+    @abstractmethod
+    def extract(self, html: Html) -> Optional[str]:
+        """Main text of a page, or None if nothing could be extracted."""
+
+    async def aextract(self, html: Html) -> Optional[str]:
+        """Async variant of extract(). Extractors without native async run in a thread."""
+        return await asyncio.to_thread(self.extract, html)
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InlineExtractor(Extractor):
+    def extract(self, html: Html) -> Optional[str]:
+        return _extract(html)
+
+
+class _Worker:
+    """
+    One warm extraction process. Each worker has an executor of its own, so
+    killing it can't break the documents other workers are extracting.
+    """
+
+    def __init__(self):
+        # spawn: forking a process that runs threads and event loops isn't safe
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        try:
+            # Spawned and warmed up before it gets a document, so neither counts against a deadline
+            self.executor.submit(os.getpid).result()
+        except BaseException:
+            self.kill()
+            raise
+
+    def kill(self):
+        # shutdown() can't stop a running task, so terminate the process directly
+        for process in list((getattr(self.executor, "_processes", None) or {}).values()):
+            process.terminate()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessPoolExtractor(Extractor):
+    def __init__(self, workers: int, timeout: float):
+        self.workers = workers
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # One slot per worker; a document holds its slot from dispatch to result
+        self._slots = threading.Semaphore(workers)
+        self._idle: List[_Worker] = []
+        self._closed = False
+        self.extracted = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.inline = 0
+
+    def _checkout(self) -> Optional[_Worker]:
+        """An idle worker, or None if the caller should start one. Caller holds a slot."""
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def _checkin(self, worker: Optional[_Worker], healthy: bool):
+        """Returns a worker after a document; one that overran or broke is killed instead."""
+        if worker is not None:
+            with self._lock:
+                keep = healthy and not self._closed
+                if keep:
+                    self._idle.append(worker)
+                elif not healthy:
+                    self.recycled += 1
+            if not keep:
+                worker.kill()
+        self._slots.release()
+
+    def _timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+        print(f"  [Extractor] Extraction exceeded {self.timeout}s, skipping page")
+
+    def _done(self, text: Optional[str]) -> Optional[str]:
+        with self._lock:
+            self.extracted += 1
+        return text
+
+    async def _aacquire(self):
+        """Waits for a slot without blocking the event loop."""
+        if self._slots.acquire(blocking=False):
+            return
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The thread still takes the slot; hand it back
+            acquiring.add_done_callback(lambda f: f.cancelled() or self._slots.release())
+            raise
+
+    def _inline(self) -> InlineExtractor:
+        with self._lock:
+            self.inline += 1
+        print("  [Extractor] Worker processes unavailable, extracting in-process")
+        return InlineExtractor()
+
+    def extract(self, html: Html) -> Optional[str]:
+        # One retry: a worker can die (e.g. OOM-killed) under an unrelated document
+        for _ in range(2):
+            self._slots.acquire()
+            worker, healthy = None, False
+            try:
+                try:
+                    worker = self._checkout() or _Worker()
+                    future = worker.executor.submit(_extract, html)
+                except Exception as e:
+                    # Spawn failure (OSError, pickling), dead worker: retry, then extract inline
+                    print(f"  [Extractor] Worker unavailable: {e!r}")
+                    continue
+                text = future.result(timeout=self.timeout)
+                healthy = True
+                return self._done(text)
+            except FutureTimeoutError:
+                self._timed_out()
+                return None
+            except BrokenProcessPool:
+                pass
+            except Exception:
+                # trafilatura itself failed; the worker is fine
+                healthy = True
+                raise
+            finally:
+                self._checkin(worker, healthy)
+        return self._inline().extract(html)
+
+    async def aextract(self, html: Html) -> Optional[str]:
+        for _ in range(2):
+            await self._aacquire()
+            worker, healthy = None, False
+            try:
+                try:
+                    worker = self._checkout() or await asyncio.to_thread(_Worker)
+                    future = asyncio.wrap_future(worker.executor.submit(_extract, html))
+                except Exception as e:
+                    print(f"  [Extractor] Worker unavailable: {e!r}")
+                    continue
+                text = await asyncio.wait_for(future, self.timeout)
+                healthy = True
+                return self._done(text)
+            except asyncio.TimeoutError:
+                self._timed_out()
+                return None
+            except BrokenProcessPool:
+                pass
+            except Exception:
+                healthy = True
+                raise
+            finally:
+                # A cancelled caller leaves its worker busy: it is replaced, not reused
+                self._checkin(worker, healthy)
+        return await self._inline().aextract(html)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "idle": len(self._idle),
+                "extracted": self.extracted,
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+                "inline": self.inline,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.executor.shutdown(wait=True, cancel_futures=True)
+
+
+_extractor: Optional[Extractor] = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor() -> Extractor:
+    """Process-wide extractor: a pool of EXTRACTION_WORKERS processes, or inline if 0."""
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            workers = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+            if workers > 0:
+                _extractor = ProcessPoolExtractor(workers, float(os.getenv("EXTRACTION_TIMEOUT", "10")))
+            else:
+                _extractor = InlineExtractor()
+        return _extractor
+
+
+def close_extractor():
+    """Stops the extraction worker processes, if any were started."""
+    global _extractor
+    with _extractor_lock:
+        extractor, _extractor = _extractor, None
+    if isinstance(extractor, ProcessPoolExtractor):
+        extractor.close()
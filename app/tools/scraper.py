@@ -1,8 +1,15 @@
-import trafilatura
+import asyncio
+import httpx
 import os
 import ssl
+import threading
 import urllib3
-from typing import Optional
+import weakref
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from app.core.page_cache import CachedPage, get_page_cache, normalize_url
+from app.core.singleflight import SingleFlight
+from app.tools.extraction import get_extractor
 
 # Disable SSL verification if configured (for corporate networks)
 if os.getenv("DISABLE_SSL_VERIFY", "").lower() == "true":
@@ -11,30 +18,158 @@ if os.getenv("DISABLE_SSL_VERIFY", "").lower() == "true":
     os.environ['CURL_CA_BUNDLE'] = ''
     os.environ['REQUESTS_CA_BUNDLE'] = ''
 
+# Deadline for one page, from request to full body (seconds)
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "20"))
+# Pages fetched at once from the same host
+SCRAPE_PER_DOMAIN = int(os.getenv("SCRAPE_PER_DOMAIN", "2"))
+
+def _domain(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+# Per-host caps: asyncio semaphores are bound to a loop, so they are kept per loop
+_async_domain_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+_domain_limits: Dict[str, threading.BoundedSemaphore] = {}
+_domain_limits_lock = threading.Lock()
+
+def _async_domain_limit(url: str) -> asyncio.Semaphore:
+    limits = _async_domain_limits.setdefault(asyncio.get_running_loop(), {})
+    domain = _domain(url)
+    if domain not in limits:
+        limits[domain] = asyncio.Semaphore(SCRAPE_PER_DOMAIN)
+    return limits[domain]
+
+def _domain_limit(url: str) -> threading.BoundedSemaphore:
+    domain = _domain(url)
+    with _domain_limits_lock:
+        if domain not in _domain_limits:
+            _domain_limits[domain] = threading.BoundedSemaphore(SCRAPE_PER_DOMAIN)
+        return _domain_limits[domain]
+
+def _client_options() -> dict:
+    return dict(
+        proxy=os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY"),
+        verify=os.getenv("DISABLE_SSL_VERIFY", "").lower() != "true",
+        timeout=SCRAPE_TIMEOUT,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        follow_redirects=True,
+        headers={"User-Agent": "Mozilla/5.0 (compatible; ArticleAgent/1.0)"},
+    )
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+def get_client() -> httpx.Client:
+    """Returns the shared sync HTTP client."""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(**_client_options())
+        return _client
+
+# One pooled async client per event loop; httpx connections can't cross loops.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def get_async_client() -> httpx.AsyncClient:
+    """Returns the shared async HTTP client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**_client_options())
+        _async_clients[loop] = client
+    return client
+
+# Concurrent scrapes of the same (normalized) URL share one download
+_page_flights = SingleFlight("pages")
+
+def get_page_flight_stats() -> dict:
+    return _page_flights.stats()
+
 class WebScraper:
+    """
+    Fetches pages and extracts their main text. Pages go through the page
+    cache (see app/core/page_cache.py): fresh hits skip the network, stale
+    ones are revalidated, and a stale copy is used if revalidation fails.
+    """
+
     def scrape(self, url: str) -> Optional[str]:
         """
         Scrapes the main text content from a URL.
         Returns None if extraction fails.
         """
         try:
-            # Configure proxy if available
-            proxy = os.getenv("HTTPS_PROXY") or os.getenv("HTTP_PROXY")
-            if proxy:
-                os.environ['https_proxy'] = proxy
-                os.environ['http_proxy'] = proxy
-            
-            # Disable SSL verification if configured
-            no_ssl = os.getenv("DISABLE_SSL_VERIFY", "").lower() == "true"
-            
-            downloaded = trafilatura.fetch_url(url, no_ssl=no_ssl)
-            if downloaded:
-                result = trafilatura.extract(downloaded)
-                return result
+            return _page_flights.do(normalize_url(url), lambda: self._scrape(url))
         except Exception as e:
             print(f"Error scraping {url}: {e}")
         return None
 
+    def _scrape(self, url: str) -> Optional[str]:
+        cache = get_page_cache()
+        cached = cache.lookup(url) if cache else None
+        if cached is not None and cached.is_fresh():
+            return cached.text
+        
+        try:
+            with _domain_limit(url):
+                response = get_client().get(url, headers=cached.validators() if cached else None)
+            if response.status_code == 304 and cached is not None:
+                return cache.refresh(cached, response.headers).text
+            response.raise_for_status()
+        except httpx.HTTPError:
+            if cached is None:
+                raise
+            return _stale(url, cached)
+        
+        text = get_extractor().extract(response.content) if response.content else None
+        if cache is not None:
+            cache.save(url, response.text, text, response.headers)
+        return text
+
+    async def ascrape(self, url: str) -> Optional[str]:
+        """
+        Async variant of scrape(). Fetches over a pooled async client, at most
+        SCRAPE_PER_DOMAIN pages per host at a time and within SCRAPE_TIMEOUT,
+        and hands the CPU-bound extraction to the extraction stage so the
+        event loop stays free.
+        """
+        try:
+            return await _page_flights.ado(normalize_url(url), lambda: self._ascrape(url))
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+        return None
+
+    async def _ascrape(self, url: str) -> Optional[str]:
+        cache = get_page_cache()
+        cached = await asyncio.to_thread(cache.lookup, url) if cache else None
+        if cached is not None and cached.is_fresh():
+            return cached.text
+        
+        try:
+            async with _async_domain_limit(url):
+                response = await asyncio.wait_for(
+                    get_async_client().get(url, headers=cached.validators() if cached else None),
+                    SCRAPE_TIMEOUT,
+                )
+            if response.status_code == 304 and cached is not None:
+                return (await asyncio.to_thread(cache.refresh, cached, response.headers)).text
+            response.raise_for_status()
+        except (httpx.HTTPError, asyncio.TimeoutError):
+            if cached is None:
+                raise
+            return _stale(url, cached)
+        
+        text = await get_extractor().aextract(response.content) if response.content else None
+        if cache is not None:
+            await asyncio.to_thread(cache.save, url, response.text, text, response.headers)
+        return text
+
+def _stale(url: str, cached: CachedPage) -> Optional[str]:
+    """Falls back to a stale cached copy when the page can't be fetched."""
+    print(f"  [Scraper] Fetch failed, using cached copy of {url}")
+    return cached.text
+
 class MockScraper:
     def scrape(self, url: str) -> str:
         return f"Scraped content from {url}. This is a mock article about the topic. It contains headers and paragraphs relevant to the search."
+
+    async def ascrape(self, url: str) -> str:
+        return self.scrape(url)
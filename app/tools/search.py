@@ -1,7 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from pydantic import BaseModel
 from ddgs import DDGS
+from app.core.disk_cache import DiskCache, get_cache_dir
+import asyncio
+import hashlib
+import json
+import re
+import threading
 import time
 import os
 import ssl
@@ -26,20 +32,35 @@ class SearchProvider(ABC):
     def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
         pass
 
+    async def asearch(self, query: str, max_results: int = 10) -> List[SearchResult]:
+        """Async variant of search(). Providers without native async I/O run in a thread."""
+        return await asyncio.to_thread(self.search, query, max_results)
+
 class DuckDuckGoSearchProvider(SearchProvider):
+    def __init__(self):
+        # One DDGS session per worker thread: it keeps its engines and their
+        # HTTP connections between searches, but isn't safe to share
+        self._local = threading.local()
+
+    def _session(self) -> DDGS:
+        ddgs = getattr(self._local, "ddgs", None)
+        if ddgs is None:
+            ddgs = DDGS(verify=os.getenv("DISABLE_SSL_VERIFY", "").lower() != "true")
+            self._local.ddgs = ddgs
+        return ddgs
+
     def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
         results = []
         try:
-            with DDGS(verify=os.getenv("DISABLE_SSL_VERIFY", "").lower() != "true") as ddgs:
-                # DDGS.text() yields dictionaries
-                search_gen = ddgs.text(query, max_results=max_results)
-                for i, r in enumerate(search_gen):
-                    results.append(SearchResult(
-                        rank=i+1,
-                        url=r.get("href", ""),
-                        title=r.get("title", ""),
-                        snippet=r.get("body", "")
-                    ))
+            # DDGS.text() yields dictionaries
+            search_gen = self._session().text(query, max_results=max_results)
+            for i, r in enumerate(search_gen):
+                results.append(SearchResult(
+                    rank=i+1,
+                    url=r.get("href", ""),
+                    title=r.get("title", ""),
+                    snippet=r.get("body", "")
+                ))
         except Exception as e:
             print(f"Error during DuckDuckGo search: {e}")
             # In production, we might want to raise or log
@@ -62,3 +83,70 @@ class MockSearchProvider(SearchProvider):
                 snippet="Another valuable mock resource."
             )
         ]
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a query: case, punctuation and spacing don't change results."""
+    words = re.sub(r"[^\w\s]", " ", query.lower()).split()
+    return " ".join(words)
+
+class CachedSearchProvider(SearchProvider):
+    """
+    Wraps any provider with a TTL cache of its results, keyed by provider
+    and normalized query. Empty result lists (usually a failed search) are
+    not cached.
+    """
+
+    def __init__(self, provider: SearchProvider, store: DiskCache):
+        self.provider = provider
+        self.store = store
+
+    def _key(self, query: str, max_results: int) -> str:
+        raw = f"{type(self.provider).__name__}\x00{max_results}\x00{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[List[SearchResult]]:
+        data = self.store.get(key)
+        if data is None:
+            return None
+        return [SearchResult(**r) for r in json.loads(data)]
+
+    def _update(self, key: str, results: List[SearchResult]):
+        if results:
+            self.store.set(key, json.dumps([r.model_dump() for r in results]).encode("utf-8"))
+
+    def search(self, query: str, max_results: int = 10) -> List[SearchResult]:
+        key = self._key(query, max_results)
+        results = self._lookup(key)
+        if results is None:
+            results = self.provider.search(query, max_results)
+            self._update(key, results)
+        return results
+
+    async def asearch(self, query: str, max_results: int = 10) -> List[SearchResult]:
+        key = self._key(query, max_results)
+        results = await asyncio.to_thread(self._lookup, key)
+        if results is None:
+            results = await self.provider.asearch(query, max_results)
+            await asyncio.to_thread(self._update, key, results)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
+
+_search_cache: Optional[DiskCache] = None
+_search_cache_lock = threading.Lock()
+
+def get_search_cache() -> Optional[DiskCache]:
+    """Process-wide store for search results, or None if SEARCH_CACHE_ENABLED=false."""
+    global _search_cache
+    if os.getenv("SEARCH_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    with _search_cache_lock:
+        if _search_cache is None:
+            ttl = float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+            _search_cache = DiskCache(
+                os.getenv("SEARCH_CACHE_PATH") or os.path.join(get_cache_dir(), "search_cache.sqlite"),
+                ttl=ttl if ttl > 0 else None,
+                max_entries=10000,
+            )
+        return _search_cache
@@ -0,0 +1,169 @@
+"""
+End-to-end throughput benchmark for create_main_graph() with no network access.
+
+Starts the fake Groq server (app/api/fake_groq.py) in-process, points the
+pooled model clients at it, forces mock search/scraping and runs a batch of
+jobs through the full graph, sync (thread pool) and/or async (asyncio.gather).
+
+    python scripts/benchmark.py --jobs 4 --concurrency 4 --latency-ms 300 --tokens-per-second 400
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+
+from app.api.fake_groq import FakeGroqConfig, ModelProfile, create_fake_groq_app, parse_model_overrides
+from app.core.hedging import get_hedge_stats
+from app.core.llm import get_pool_stats, get_singleflight_stats
+from app.core.rate_limit import get_rate_limit_stats
+from app.core.tokens import get_token_stats
+
+
+def start_fake_server(config: FakeGroqConfig, host: str, port: int):
+    app = create_fake_groq_app(config)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Fake Groq server failed to start on {host}:{port}")
+        time.sleep(0.05)
+    return app, server, thread
+
+
+def initial_state(topic: str) -> dict:
+    return {
+        "topic": topic,
+        "word_count": 800,
+        "language": "English",
+        "plan": [],
+        "current_task_index": 0,
+        "vfs_data": {},
+        "logs": []
+    }
+
+
+def run_sync(graph, topics, concurrency):
+    def one(topic):
+        start = time.perf_counter()
+        graph.invoke(initial_state(topic))
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, topics))
+
+
+async def run_async(graph, topics, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(topic):
+        async with semaphore:
+            start = time.perf_counter()
+            await graph.ainvoke(initial_state(topic))
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(one(t) for t in topics))
+
+
+def report(mode: str, wall: float, durations):
+    print(f"\n=== {mode} ===")
+    print(f"  jobs:        {len(durations)}")
+    print(f"  wall time:   {wall:.2f}s")
+    print(f"  throughput:  {len(durations) / wall * 60:.1f} jobs/min")
+    print(f"  job p50:     {statistics.median(durations):.2f}s")
+    print(f"  job max:     {max(durations):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the article graph against a fake Groq server")
+    parser.add_argument("--jobs", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--model", action="append", default=[], help="Per-model override: model=latency_ms:tokens_per_second[:error_rate]")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-rate-limit", action="store_true", help="Disable the client-side limiter to measure raw pipeline throughput")
+    args = parser.parse_args()
+
+    config = FakeGroqConfig(
+        default=ModelProfile(
+            latency_ms=args.latency_ms,
+            tokens_per_second=args.tokens_per_second,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+        ),
+        models=parse_model_overrides(args.model),
+        seed=args.seed,
+    )
+    app, server, thread = start_fake_server(config, "127.0.0.1", args.port)
+
+    # Must be set before the first get_model() call builds the pooled clients
+    os.environ["GROQ_API_BASE"] = f"http://127.0.0.1:{args.port}"
+    os.environ["GROQ_API_KEY"] = "fake"
+    os.environ["SEARCH_PROVIDER"] = "mock"
+    if args.no_rate_limit:
+        os.environ["LLM_RATE_LIMIT_ENABLED"] = "false"
+    # Fail fast on the embedding download; the writer falls back to truncation
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    # Every run starts cold and leaves the developer's .cache and blob store alone
+    scratch = tempfile.TemporaryDirectory(prefix="article-agent-benchmark-")
+    os.environ["ARTICLE_AGENT_CACHE_DIR"] = os.path.join(scratch.name, "cache")
+    os.environ["VFS_BLOB_DIR"] = os.path.join(scratch.name, "blobs")
+    for name in ("LLM_CACHE_PATH", "PAGE_CACHE_PATH", "SEARCH_CACHE_PATH", "RESEARCH_STORE_PATH", "EMBEDDING_CACHE_PATH"):
+        os.environ.pop(name, None)
+
+    from app.main_graph import create_main_graph
+
+    graph = create_main_graph()
+    topics = [f"Benchmark topic {i + 1}" for i in range(args.jobs)]
+
+    try:
+        if args.mode in ("sync", "both"):
+            start = time.perf_counter()
+            durations = run_sync(graph, topics, args.concurrency)
+            report("sync", time.perf_counter() - start, durations)
+
+        if args.mode in ("async", "both"):
+            start = time.perf_counter()
+            durations = asyncio.run(run_async(graph, topics, args.concurrency))
+            report("async", time.perf_counter() - start, durations)
+
+        print("\n=== Fake server ===")
+        for key, value in app.state.fake.stats().items():
+            print(f"  {key}: {value}")
+        print("\n=== Rate limiter ===")
+        for model_id, stats in get_rate_limit_stats().items():
+            print(f"  {model_id}: {stats}")
+        print("\n=== Single-flight ===")
+        print(f"  {get_singleflight_stats()}")
+        print("\n=== Hedging ===")
+        for model_id, stats in get_hedge_stats()["models"].items():
+            print(f"  {model_id}: {stats}")
+        print("\n=== Token usage ===")
+        for model_id, stats in get_token_stats()["models"].items():
+            print(f"  {model_id}: {stats}")
+        print("\n=== Connection pool ===")
+        print(f"  {get_pool_stats()}")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+        scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
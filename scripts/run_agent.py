@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.main_graph import create_main_graph
 from app.core.vfs import VFS
+from app.core.llm_cache import bypass_llm_cache
 
 
 def sanitize_filename(topic: str) -> str:
@@ -24,6 +25,7 @@ def main():
     parser = argparse.ArgumentParser(description="Run the Article Agent")
     parser.add_argument("topic", help="Topic to write about")
     parser.add_argument("--word-count", type=int, default=1500)
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache for this run")
     args = parser.parse_args()
     
     # Initialize State
@@ -44,7 +46,8 @@ def main():
     # Run the graph
     # Using .invoke (synchronous wrapper for convenience, or async via ainvoke)
     # LangGraph .invoke returns the final state
-    final_state = graph.invoke(initial_state)
+    with bypass_llm_cache(args.no_cache):
+        final_state = graph.invoke(initial_state)
     
     print("\n--- Execution Complete ---")
     
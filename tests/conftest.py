@@ -0,0 +1,22 @@
+import pytest
+import app.core.blobstore as blobstore
+import app.core.embedding_cache as embedding_cache
+import app.core.llm_cache as llm_cache
+import app.core.page_cache as page_cache
+import app.core.research_store as research_store
+import app.tools.search as search
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Keeps on-disk caches and blobs out of the developer's .cache and apart between tests."""
+    monkeypatch.setenv("ARTICLE_AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("VFS_BLOB_DIR", str(tmp_path / "blobs"))
+    for name in ("LLM_CACHE_PATH", "PAGE_CACHE_PATH", "SEARCH_CACHE_PATH", "RESEARCH_STORE_PATH", "EMBEDDING_CACHE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    # Process-wide singletons are rebuilt under the paths above on first use
+    monkeypatch.setattr(blobstore, "_store", None)
+    monkeypatch.setattr(llm_cache, "_response_cache", None)
+    monkeypatch.setattr(page_cache, "_page_cache", None)
+    monkeypatch.setattr(search, "_search_cache", None)
+    monkeypatch.setattr(research_store, "_research_store", None)
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", None)
@@ -0,0 +1,55 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.api.server import app, jobs, job_events, JobEvents
+
+def test_subscriber_gets_history_then_live_events():
+    async def run():
+        events = JobEvents()
+        events.publish("status", {"status": "running"})
+        received = []
+
+        async def consume():
+            async for item in events.subscribe():
+                received.append(item)
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        events.publish("token", {"node": "write", "text": "Hello"})
+        events.close()
+        await asyncio.wait_for(consumer, timeout=1)
+        return received
+
+    received = asyncio.run(run())
+    assert [item["event"] for item in received] == ["status", "token"]
+    assert received[1]["data"]["text"] == "Hello"
+
+def test_history_coalesces_tokens_and_drops_them_on_close():
+    events = JobEvents()
+    events.publish("node", {"graph": "writer", "node": "write"})
+    for text in ("## ", "Intro", "\n"):
+        events.publish("token", {"node": "write", "text": text})
+    events.publish("token", {"node": "optimize", "text": "Better"})
+    assert [item["data"].get("text") for item in events.history] == [None, "## Intro\n", "Better"]
+    events.close()
+    assert [item["event"] for item in events.history] == ["node"]
+
+def test_stream_endpoint_replays_finished_job():
+    events = JobEvents()
+    events.publish("node", {"graph": "writer", "node": "write"})
+    events.publish("token", {"node": "write", "text": "## Intro"})
+    events.publish("status", {"status": "completed"})
+    events.close()
+    jobs["finished"] = {"status": "completed"}
+    job_events["finished"] = events
+
+    client = TestClient(app)
+    response = client.get("/jobs/finished/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert 'event: node\ndata: {"graph": "writer", "node": "write"}\n\n' in response.text
+    # Streamed text isn't kept once the job has ended
+    assert "event: token" not in response.text
+    assert response.text.rstrip().endswith('data: {"status": "completed"}')
+
+def test_stream_unknown_job():
+    assert TestClient(app).get("/jobs/missing/stream").status_code == 404
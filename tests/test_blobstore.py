@@ -0,0 +1,77 @@
+import os
+import zlib
+import pytest
+from fastapi.testclient import TestClient
+import app.api.server as server
+import app.core.blobstore as blobstore
+from app.core.blobstore import BlobStore, blob_owner, content_hash
+from app.core.vfs import File, VFS
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(blobstore, "_store", store)
+    yield store
+    store.close()
+
+def test_put_is_content_addressed(store):
+    digest = store.put("hello " * 100)
+    assert digest == content_hash("hello " * 100)
+    assert store.put("hello " * 100) == digest
+    assert store.stats()["writes"] == 1 and store.stats()["deduplicated"] == 1
+
+    path = os.path.join(store.root, digest[:2], digest + ".z")
+    with open(path, "rb") as f:
+        raw = f.read()
+    assert len(raw) < 600 and zlib.decompress(raw).decode() == "hello " * 100
+    assert store.get(digest) == "hello " * 100
+
+def test_file_state_holds_only_the_hash(store, monkeypatch):
+    vfs = VFS()
+    vfs.write_file("draft.md", "Article text", {"source": "writer"})
+    dumped = vfs.get_file("draft.md")._asdict()
+    assert "content" not in dumped
+    assert dumped["segments"] == (content_hash("Article text"),)
+
+    # A file rebuilt from a checkpoint in a fresh process reads its content lazily
+    fresh = BlobStore(store.root)
+    monkeypatch.setattr(blobstore, "_store", fresh)
+    restored = File(**dumped)
+    assert fresh.reads == 0
+    assert restored.content == "Article text"
+    assert restored.content == "Article text"
+    assert fresh.reads == 1
+    fresh.close()
+
+def test_release_collects_only_unshared_blobs(store):
+    with blob_owner("job-a"):
+        shared = store.put("shared")
+        only_a = store.put("only a")
+    with blob_owner("job-b"):
+        store.put("shared")
+    untracked = store.put("written outside a job")
+
+    assert store.release("job-a") == 1
+    assert not store.exists(only_a)
+    assert store.exists(shared) and store.exists(untracked)
+
+    assert store.release("job-b") == 1
+    assert not store.exists(shared)
+    assert store.exists(untracked)
+
+def test_delete_job_endpoint(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "CHECKPOINT_DB", str(tmp_path / "state.db"))
+    with blob_owner("done-job"):
+        digest = store.put("final article")
+    server.jobs["done-job"] = {"status": "completed"}
+    server.jobs["busy-job"] = {"status": "running"}
+
+    client = TestClient(server.app)
+    assert client.delete("/jobs/busy-job").status_code == 409
+    response = client.delete("/jobs/done-job")
+    assert response.status_code == 200
+    assert response.json()["blobs_removed"] == 1
+    assert not store.exists(digest)
+    assert "done-job" not in server.jobs
+    assert client.delete("/jobs/done-job").status_code == 404
+    server.jobs.pop("busy-job")
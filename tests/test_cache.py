@@ -0,0 +1,50 @@
+import time
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from app.core.disk_cache import DiskCache
+from app.core.llm_cache import LLMResponseCache, bypass_llm_cache
+
+def test_disk_cache_roundtrip_and_stats():
+    cache = DiskCache(":memory:")
+    assert cache.get("k") is None
+    cache.set("k", b"value")
+    assert cache.get("k") == b"value"
+    
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+def test_disk_cache_ttl_expiry():
+    cache = DiskCache(":memory:", ttl=0.01)
+    cache.set("k", b"value")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+
+def test_disk_cache_lru_eviction():
+    cache = DiskCache(":memory:", max_entries=2)
+    cache.set("a", b"1")
+    time.sleep(0.001)
+    cache.set("b", b"2")
+    time.sleep(0.001)
+    cache.get("a")  # 'b' is now least recently used
+    cache.set("c", b"3")
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+def test_llm_response_cache_hit_and_bypass():
+    cache = LLMResponseCache(DiskCache(":memory:"))
+    llm = FakeListChatModel(responses=["first", "second", "third"], cache=cache)
+    
+    assert llm.invoke("same prompt").content == "first"
+    assert llm.invoke("same prompt").content == "first"  # served from cache
+    
+    with bypass_llm_cache():
+        assert llm.invoke("same prompt").content == "second"
+    
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["bypassed"] == 1
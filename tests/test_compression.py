@@ -0,0 +1,49 @@
+from app.core.compression import COMPRESSION_TOKENS, compress, compress_page, split_sentences
+from app.core.tokens import count_tokens
+
+FACTS = [
+    "Remote workers saved an average of 72 minutes a day on commuting in 2023.",
+    "A Stanford study found remote work productivity rose 13% in a call center trial.",
+]
+BOILERPLATE = [
+    "Subscribe to our newsletter for the latest updates.",
+    "Cookies help us deliver our services, read our privacy policy.",
+    "Share this article on social media with your friends.",
+    "Our editors pick the best products every week.",
+]
+
+def _page():
+    lines = []
+    for i in range(12):
+        lines.append(" ".join(BOILERPLATE))
+        if i == 5:
+            lines.append(f"Meanwhile, the data is clear. {FACTS[0]} {FACTS[1]}")
+    return "\n".join(lines)
+
+def test_split_sentences():
+    assert split_sentences("Title\nOne sentence. Two sentences! Version 2.0 is out.") == [
+        "Title", "One sentence.", "Two sentences!", "Version 2.0 is out."
+    ]
+
+def test_compress_keeps_relevant_passages_within_budget():
+    page = _page()
+    compressed = compress(page, "remote work productivity statistics", 60)
+    assert count_tokens(compressed) <= 60 < count_tokens(page) / 4
+    assert FACTS[0] in compressed and FACTS[1] in compressed
+    # Adjacent sentences are kept together as one passage
+    assert f"{FACTS[0]} {FACTS[1]}" in compressed
+
+def test_short_pages_and_zero_budget_pass_through():
+    assert compress(FACTS[0], "remote work", 1000) == FACTS[0]
+    assert compress(_page(), "remote work", 0) == _page()
+
+def test_unrelated_query_keeps_page_order():
+    page = "\n".join(" ".join(BOILERPLATE) for _ in range(12))
+    assert compress(page, "the of and", 30).startswith(BOILERPLATE[0])
+
+def test_compress_page_records_tokens(monkeypatch):
+    monkeypatch.setenv("RESEARCH_COMPRESS_TOKENS", "60")
+    before = COMPRESSION_TOKENS.value(kind="input"), COMPRESSION_TOKENS.value(kind="kept")
+    compressed = compress_page(_page(), "remote work productivity")
+    assert COMPRESSION_TOKENS.value(kind="input") - before[0] == count_tokens(_page())
+    assert COMPRESSION_TOKENS.value(kind="kept") - before[1] == count_tokens(compressed)
@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+import app.graphs.researcher as researcher
+import app.main_graph as main_graph
+import app.graphs.writer as writer
+import app.core.research_store as research_store
+from langchain_core.messages import AIMessage
+from app.core.disk_cache import DiskCache
+from app.core.research_store import ResearchStore
+from app.core.dedup import DEDUP_DROPPED, FingerprintSet, from_hex, minhash, similarity, to_hex
+from app.core.vfs import VFS
+from app.tools.search import SearchResult
+
+ARTICLE = ("Remote teams that write things down make decisions faster. Shared documents replace meetings, "
+           "and asynchronous updates let people in different time zones contribute without waiting. "
+           "Managers who measure output instead of hours report higher trust and lower turnover.")
+
+def test_minhash_separates_near_and_unrelated_text():
+    syndicated = ARTICLE.replace("faster", "more quickly") + " Originally published elsewhere."
+    unrelated = "A slow-cooked ragu needs good tomatoes, a splash of wine and three hours on a low flame."
+    assert similarity(minhash(ARTICLE), minhash(ARTICLE)) == 1.0
+    assert similarity(minhash(ARTICLE), minhash(syndicated)) >= 0.7
+    assert similarity(minhash(ARTICLE), minhash(unrelated)) < 0.2
+    assert (from_hex(to_hex(minhash(ARTICLE))) == minhash(ARTICLE)).all()
+
+def test_fingerprint_set_counts_drops():
+    seen = FingerprintSet("test", 0.8)
+    before = DEDUP_DROPPED.value(stage="test")
+    assert seen.add_if_new(minhash(ARTICLE))
+    assert not seen.add_if_new(minhash(ARTICLE + " Republished with permission."))
+    assert seen.add_if_new(minhash("Office leases are being renegotiated as companies shrink."))
+    assert seen.dropped == 1 and DEDUP_DROPPED.value(stage="test") == before + 1
+    assert FingerprintSet("off", 0, [minhash(ARTICLE)]).add_if_new(minhash(ARTICLE))
+
+class _Scraper:
+    pages = {
+        "https://origin.test/a": ARTICLE,
+        "https://mirror.test/a": ARTICLE + " Republished with permission.",
+        "https://other.test/b": "Office leases are being renegotiated as companies shrink their headquarters and invest in hubs.",
+    }
+
+    def scrape(self, url):
+        return self.pages[url]
+
+    async def ascrape(self, url):
+        return self.pages[url]
+
+class _LLM:
+    model_name = "echo"
+    calls = 0
+
+    def invoke(self, prompt):
+        _LLM.calls += 1
+        return AIMessage(content="summary of " + prompt.strip().splitlines()[-1][:20])
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_researcher_skips_near_duplicate_pages(monkeypatch, mode):
+    monkeypatch.setattr(researcher, "get_scraper", lambda url: _Scraper())
+    monkeypatch.setattr(researcher, "get_researcher_model", lambda: _LLM())
+    monkeypatch.setattr(research_store, "_research_store", ResearchStore(DiskCache(":memory:")))
+    _LLM.calls = 0
+    state = {"query": "q", "vfs_data": {}, "selected_urls": ["https://origin.test/a", "https://other.test/b"]}
+    node = researcher.scrape_and_summarize_node if mode == "sync" else (lambda s: asyncio.run(researcher.ascrape_and_summarize_node(s)))
+    files = node(state)["vfs_data"]
+    assert len(files) == 2 and all(f.metadata["fingerprint"] for f in files.values())
+
+    # A later task in the same job finds a mirror of a page it already summarized
+    state = {"query": "q2", "vfs_data": files, "selected_urls": ["https://mirror.test/a"]}
+    assert node(state)["vfs_data"] == {}
+    assert _LLM.calls == 2
+
+def test_writer_drops_near_duplicate_chunks(monkeypatch):
+    def no_embeddings():
+        raise RuntimeError("offline")
+    monkeypatch.setattr(writer, "get_embedding_model", no_embeddings)
+
+    vfs = VFS()
+    vfs.write_file("research/a.md", ARTICLE + "\n\nHybrid schedules work best with two fixed office days per week for every team.", {"url": "a"})
+    vfs.write_file("research/b.md", ARTICLE.replace("faster", "more quickly"), {"url": "b"})
+    context = writer.retrieve_context_node({"task_description": "intro", "vfs_data": vfs.changes(), "draft_file": "draft.md"})["context"]
+    assert context.count("Remote teams") == 1
+    assert "Hybrid schedules" in context
+
+class _SearchProvider:
+    def search(self, query, max_results=5):
+        return [SearchResult(title="Remote work", url="https://origin.test/a", snippet="remote teams decisions", rank=1)]
+
+    async def asearch(self, query, max_results=5):
+        return self.search(query, max_results)
+
+class _FlakyScraper(_Scraper):
+    """Fails the first fetch of each URL, as a timeout or 4xx would."""
+
+    def __init__(self, failed):
+        self.failed = failed
+
+    def scrape(self, url):
+        if url not in self.failed:
+            self.failed.add(url)
+            return None
+        return self.pages[url]
+
+    async def ascrape(self, url):
+        return self.scrape(url)
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+@pytest.mark.parametrize("flaky", [False, True])
+def test_parallel_research_tasks_share_page_claims(monkeypatch, mode, flaky):
+    failed = set()
+    scraper = _FlakyScraper(failed) if flaky else _Scraper()
+    monkeypatch.setattr(researcher, "get_scraper", lambda url: scraper)
+    monkeypatch.setattr(researcher, "get_researcher_model", lambda: _LLM())
+    monkeypatch.setattr(researcher, "get_search_provider", lambda: _SearchProvider())
+    monkeypatch.setattr(research_store, "_research_store", ResearchStore(DiskCache(":memory:")))
+    _LLM.calls = 0
+    plan = [{"id": i, "type": "research", "description": f"remote teams {i}", "status": "pending", "params": {}} for i in (1, 2)]
+    monkeypatch.setattr(main_graph, "create_initial_plan", lambda state: {"plan": plan})
+
+    async def aplan(state):
+        return {"plan": plan}
+    monkeypatch.setattr(main_graph, "acreate_initial_plan", aplan)
+    graph = main_graph.create_main_graph()
+    state = {"topic": "t", "word_count": 500, "language": "English", "plan": [], "current_task_index": 0,
+             "vfs_data": {}, "faqs": [], "keyword_report": {}, "linking_report": {}, "logs": []}
+
+    def researched(values):
+        # Both tasks are done and collect_research has run; stop before the evaluator
+        return values["plan"] and values["current_task_index"] >= len(values["plan"]) and not values.get("research_batch")
+
+    # Both tasks fan out from the same empty snapshot and select the only result
+    async def run():
+        async for values in graph.astream(state, stream_mode="values"):
+            if researched(values):
+                return values
+    if mode == "sync":
+        for values in graph.stream(state, stream_mode="values"):
+            if researched(values):
+                break
+    else:
+        values = asyncio.run(run())
+
+    # A task whose fetch failed doesn't keep the other from summarizing the page
+    files = list(VFS(values["vfs_data"]).iter_prefix("research/"))
+    assert _LLM.calls == 1 and len(files) == 1
+    assert VFS(values["vfs_data"]).get_file(files[0]).metadata["url"] == "https://origin.test/a"
+    # collect_research released the batch's claims
+    assert researcher._batches == {}
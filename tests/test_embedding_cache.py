@@ -0,0 +1,58 @@
+import numpy as np
+import app.core.embedding_cache as embedding_cache
+import app.graphs.writer as writer
+from app.core.disk_cache import DiskCache
+from app.core.embedding_cache import EMBEDDING_LOOKUPS, EmbeddingCache
+from app.core.vfs import VFS
+
+class _Model:
+    """Deterministic stand-in for SentenceTransformer that records what it encodes."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=32):
+        self.batches.append(list(texts))
+        return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+
+def test_only_new_texts_are_encoded():
+    cache = EmbeddingCache()
+    model = _Model()
+    first = cache.encode(model, "m", ["alpha", "beta"])
+    second = cache.encode(model, "m", ["beta", "gamma", "alpha", "gamma"])
+    assert model.batches == [["alpha", "beta"], ["gamma"]]
+    assert (second[0] == first[1]).all() and (second[2] == first[0]).all()
+    assert second.shape == (4, 3) and second.dtype == np.float32
+
+    # Another model never sees this model's vectors
+    cache.encode(model, "other", ["alpha"])
+    assert model.batches[-1] == ["alpha"]
+    stats = cache.stats()
+    assert stats["misses"] == 4 and stats["memory_hits"] == 2 and stats["hit_rate"] == 2 / 6
+
+def test_memory_is_bounded_and_backed_by_disk():
+    store = DiskCache(":memory:", compress=False)
+    cache = EmbeddingCache(max_entries=1, store=store)
+    model = _Model()
+    cache.encode(model, "m", ["alpha", "beta"])
+    before = EMBEDDING_LOOKUPS.value(result="disk")
+
+    # A fresh process (empty memory) still finds the float16 vectors on disk
+    vectors = EmbeddingCache(store=store).encode(model, "m", ["alpha", "beta"])
+    assert len(model.batches) == 1
+    assert np.allclose(vectors, [[5, 2, 1], [4, 1, 1]])
+    assert EMBEDDING_LOOKUPS.value(result="disk") == before + 2
+    assert cache.stats()["entries"] == 1
+
+def test_write_tasks_share_embeddings(monkeypatch):
+    model = _Model()
+    monkeypatch.setattr(writer, "get_embedding_model", lambda: model)
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", EmbeddingCache())
+
+    vfs = VFS()
+    vfs.write_file("research/a.md", "Hybrid schedules work best with two fixed office days per week for every team.", {"url": "a"})
+    vfs.write_file("research/b.md", "Asynchronous standups save managers about an hour a day across time zones.", {"url": "b"})
+    for task in ("intro", "body"):
+        writer.retrieve_context_node({"task_description": task, "vfs_data": vfs.changes(), "draft_file": "draft.md"})
+    # Two chunk batches would mean re-embedding; task embeddings are the single-text batches
+    assert [len(b) for b in model.batches] == [2, 1, 1]
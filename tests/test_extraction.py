@@ -0,0 +1,122 @@
+import asyncio
+import pickle
+import pytest
+import app.tools.extraction as extraction
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.tools.extraction import InlineExtractor, ProcessPoolExtractor
+
+HTML = ("<html><body><article><h1>Remote work</h1><p>"
+        + "Distributed teams rely on written communication and clear ownership. " * 8
+        + "</p></article></body></html>")
+
+@pytest.fixture(scope="module")
+def extractor():
+    extractor = ProcessPoolExtractor(workers=1, timeout=30)
+    yield extractor
+    extractor.close()
+
+def test_process_pool_matches_inline(extractor):
+    expected = InlineExtractor().extract(HTML)
+    assert expected and "Distributed teams" in expected
+    assert extractor.extract(HTML.encode("utf-8")) == expected
+    assert asyncio.run(extractor.aextract(HTML)) == expected
+    assert extractor.stats()["extracted"] == 2
+
+SLOW = "<html><body>" + "".join(f"<div><p>Paragraph {i} about remote work and teams.</p></div>" for i in range(20000)) + "</body></html>"
+
+def test_timeout_kills_only_the_overrunning_worker():
+    extractor = ProcessPoolExtractor(workers=2, timeout=0.5)
+    try:
+        assert "Distributed teams" in extractor.extract(HTML)
+
+        # Far more work than the deadline allows, next to quick pages; spawning
+        # the second worker for those takes longer than the deadline but isn't counted
+        with ThreadPoolExecutor(2) as executor:
+            slow = executor.submit(extractor.extract, SLOW)
+            quick = [executor.submit(extractor.extract, HTML) for _ in range(5)]
+            assert slow.result() is None
+            assert all("Distributed teams" in f.result() for f in quick)
+        stats = extractor.stats()
+        assert stats["timeouts"] == 1 and stats["recycled"] == 1 and stats["inline"] == 0
+
+        # The replacement worker takes over for the next document
+        assert "Distributed teams" in asyncio.run(extractor.aextract(HTML))
+    finally:
+        extractor.close()
+
+class _ThreadWorker:
+    """Stands in for a worker process, running extractions on a thread."""
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(1)
+
+    def kill(self):
+        self.executor.shutdown(wait=False)
+
+class _BrokenWorker:
+    error = BrokenProcessPool("worker died")
+
+    def __init__(self):
+        self.executor = self
+
+    def submit(self, fn, *args):
+        raise self.error
+
+    def kill(self):
+        pass
+
+class _UnpicklableWorker(_BrokenWorker):
+    error = pickle.PicklingError("can't pickle the task")
+
+class _UnspawnableWorker:
+    def __init__(self):
+        raise OSError("Too many open files")
+
+@pytest.mark.parametrize("worker", [_BrokenWorker, _UnpicklableWorker, _UnspawnableWorker])
+def test_broken_workers_fall_back_to_inline(monkeypatch, worker):
+    monkeypatch.setattr(extraction, "_Worker", worker)
+    extractor = ProcessPoolExtractor(workers=1, timeout=30)
+    expected = InlineExtractor().extract(HTML)
+    assert extractor.extract(HTML) == expected
+    assert asyncio.run(extractor.aextract(HTML)) == expected
+    assert extractor.stats()["inline"] == 2
+    # Every slot taken by a failed attempt was handed back
+    assert extractor._slots.acquire(blocking=False)
+
+def test_extraction_errors_keep_the_worker(monkeypatch):
+    monkeypatch.setattr(extraction, "_Worker", _ThreadWorker)
+    monkeypatch.setattr(extraction, "_extract", lambda html: 1 / 0)
+    extractor = ProcessPoolExtractor(workers=1, timeout=30)
+    try:
+        with pytest.raises(ZeroDivisionError):
+            extractor.extract(HTML)
+        with pytest.raises(ZeroDivisionError):
+            asyncio.run(extractor.aextract(HTML))
+        assert extractor.stats()["recycled"] == 0 and extractor.stats()["inline"] == 0
+    finally:
+        extractor.close()
+
+def test_async_callers_wait_for_a_slot(monkeypatch):
+    monkeypatch.setattr(extraction, "_Worker", _ThreadWorker)
+    extractor = ProcessPoolExtractor(workers=1, timeout=30)
+    expected = InlineExtractor().extract(HTML)
+
+    async def main():
+        results = await asyncio.gather(*(extractor.aextract(HTML) for _ in range(5)))
+        assert results == [expected] * 5
+
+        # A caller cancelled while waiting doesn't keep the slot
+        extractor._slots.acquire()
+        waiting = asyncio.ensure_future(extractor.aextract(HTML))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        extractor._slots.release()
+        assert await asyncio.wait_for(extractor.aextract(HTML), 5) == expected
+
+    try:
+        asyncio.run(main())
+        assert extractor.stats()["extracted"] == 6 and extractor.stats()["inline"] == 0
+    finally:
+        extractor.close()
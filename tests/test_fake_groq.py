@@ -0,0 +1,54 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.api.fake_groq import FakeGroqConfig, ModelProfile, create_fake_groq_app
+from app.agents.planner import PLAN_PROMPT, parse_plan
+from app.graphs.humanizer import build_critic_prompt, parse_critique
+from app.graphs.keyword_analyzer import build_keywords_prompt, parse_keywords
+
+FAST = ModelProfile(latency_ms=0, tokens_per_second=1e9)
+
+@pytest.fixture
+def client():
+    return TestClient(create_fake_groq_app(FakeGroqConfig(default=FAST)))
+
+def chat(client, prompt, **extra):
+    return client.post("/openai/v1/chat/completions", json={
+        "model": "openai/gpt-oss-120b",
+        "messages": [{"role": "user", "content": prompt}],
+        **extra
+    })
+
+def test_planner_response_parses(client):
+    prompt = "\n".join(m.content for m in PLAN_PROMPT.format_messages(topic="Sleep", word_count=800, language="English"))
+    response = chat(client, prompt)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["usage"]["total_tokens"] > 0
+
+    plan = parse_plan(body["choices"][0]["message"]["content"])["plan"]
+    assert [t["type"] for t in plan] == ["research", "research", "write", "write", "write"]
+
+def test_schema_valid_seo_and_humanizer_responses(client):
+    content = chat(client, build_keywords_prompt("Sleep", "## Draft")).json()["choices"][0]["message"]["content"]
+    assert parse_keywords(content, "Sleep")["keyword_report"]["primary_keyword"] == "sleep"
+
+    content = chat(client, build_critic_prompt("## Draft")).json()["choices"][0]["message"]["content"]
+    assert parse_critique(content, 0)["last_critique"]["ai_artifact_score"] == 2
+
+def test_error_injection():
+    app = create_fake_groq_app(FakeGroqConfig(default=ModelProfile(latency_ms=0, error_rate=1.0, error_status=503)))
+    response = chat(TestClient(app), "hello")
+    assert response.status_code == 503
+    assert app.state.fake.stats()["errors"]["openai/gpt-oss-120b"] == 1
+
+def test_streaming(client):
+    with client.stream("POST", "/openai/v1/chat/completions", json={
+        "model": "openai/gpt-oss-120b",
+        "messages": [{"role": "user", "content": "hello"}],
+        "stream": True
+    }) as response:
+        lines = [l for l in response.iter_lines() if l.startswith("data: ")]
+    assert lines[-1] == "data: [DONE]"
+    text = "".join(json.loads(l[6:])["choices"][0]["delta"].get("content", "") for l in lines[:-1])
+    assert text == "OK"
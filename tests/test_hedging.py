@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import app.core.hedging as hedging
+from app.core.hedging import (
+    HedgePolicy,
+    arun_hedged,
+    arun_hedged_stream,
+    run_hedged,
+    run_hedged_stream,
+)
+
+def test_fast_primary_is_not_hedged():
+    backups = []
+    result, winner = run_hedged(lambda: "primary", 1.0, lambda: backups.append(1))
+    assert (result, winner) == ("primary", 0)
+    assert backups == []
+
+def test_slow_primary_loses_to_backup():
+    def slow():
+        time.sleep(0.5)
+        return "slow"
+
+    started = time.monotonic()
+    result, winner = run_hedged(slow, 0.05, lambda: (lambda: "backup"))
+    assert (result, winner) == ("backup", 1)
+    assert time.monotonic() - started < 0.4
+
+def test_declined_backup_waits_for_primary():
+    def slow():
+        time.sleep(0.1)
+        return "slow"
+
+    assert run_hedged(slow, 0.01, lambda: None) == ("slow", 0)
+
+def test_failed_attempt_falls_through_to_the_other():
+    def broken():
+        time.sleep(0.1)
+        raise RuntimeError("upstream 500")
+
+    def backup():
+        time.sleep(0.2)
+        return "backup"
+
+    assert run_hedged(broken, 0.01, lambda: backup) == ("backup", 1)
+
+def test_async_loser_is_cancelled():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+            return "slow"
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def fast():
+        await asyncio.sleep(0.01)
+        return "backup"
+
+    async def run():
+        result = await arun_hedged(slow, 0.05, lambda: fast)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == ("backup", 1)
+    assert cancelled == [1]
+
+def test_streams_race_on_first_chunk():
+    closed = threading.Event()
+
+    def slow():
+        try:
+            time.sleep(0.3)
+            yield "s1"
+            yield "s2"
+        finally:
+            closed.set()
+
+    def fast():
+        yield "f1"
+        yield "f2"
+
+    chunks, winner = run_hedged_stream(slow, 0.05, lambda: fast)
+    assert (list(chunks), winner) == (["f1", "f2"], 1)
+    # The abandoned stream is closed once its first chunk arrives
+    assert closed.wait(1)
+
+def test_async_streams_race_on_first_chunk():
+    async def slow():
+        await asyncio.sleep(1)
+        yield "s1"
+
+    async def fast():
+        yield "f1"
+        yield "f2"
+
+    async def run():
+        chunks, winner = await arun_hedged_stream(slow, 0.05, lambda: fast)
+        return [c async for c in chunks], winner
+
+    assert asyncio.run(run()) == (["f1", "f2"], 1)
+
+def test_policy_deadline_and_tiers(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE_MIN_SAMPLES", "5")
+    monkeypatch.setenv("LLM_HEDGE_INITIAL_DEADLINE", "30")
+    monkeypatch.setenv("LLM_HEDGE_MIN_DEADLINE", "0.5")
+    monkeypatch.setenv("LLM_FALLBACKS", '{"big": ["small"]}')
+    policy = HedgePolicy()
+
+    assert policy.deadline("big", "write", "stream") == 30
+    for seconds in [1, 1, 1, 1, 1, 1, 1, 1, 1, 4]:
+        policy.observe("big", "write", "stream", seconds)
+    assert policy.deadline("big", "write", "stream") == 4
+    # Other nodes keep their own history
+    assert policy.deadline("big", "plan", "generate") == 30
+
+    assert policy.backup_model("big") == "small"
+    assert policy.backup_model("other") == "other"
+
+    policy.record("big", None, 0)
+    policy.record("big", "small", 1)
+    policy.record("other", "other", 1)
+    stats = policy.stats()["models"]
+    assert stats["big"]["answered_by"] == {"primary": 1, "fallback:small": 1}
+    assert stats["other"]["answered_by"] == {"hedge": 1}
+
+def test_policy_caps_hedge_ratio(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE_MAX_RATIO", "0.1")
+    policy = HedgePolicy()
+    assert policy.allow_hedge("m")
+    policy.record("m", "m", 1)
+    assert not policy.allow_hedge("m")
+    for _ in range(19):
+        policy.record("m", None, 0)
+    assert policy.allow_hedge("m")
+    assert policy.stats()["models"]["m"]["skipped"] == 1
+
+def test_concurrent_calls_do_not_queue_into_hedges():
+    backups = []
+
+    def slow():
+        time.sleep(0.3)
+        return "slow"
+
+    # More calls than a worker pool would hold: none may wait past its deadline
+    with ThreadPoolExecutor(48) as executor:
+        results = list(executor.map(lambda _: run_hedged(slow, 0.5, lambda: backups.append(1)), range(48)))
+    assert results == [("slow", 0)] * 48
+    assert backups == []
+
+def test_hedging_is_opt_in(monkeypatch):
+    monkeypatch.delenv("LLM_HEDGING_ENABLED", raising=False)
+    assert not hedging.hedging_enabled()
+    monkeypatch.setenv("LLM_HEDGING_ENABLED", "true")
+    assert hedging.hedging_enabled()
+
+def test_no_backup_while_pool_is_full(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_THREADS", 1)
+    backups = []
+
+    def slow():
+        time.sleep(0.1)
+        return "slow"
+
+    # The primary holds the only thread: a backup would just queue behind it
+    assert run_hedged(slow, 0.01, lambda: backups.append(1) or (lambda: "backup")) == ("slow", 0)
+    assert backups == []
+
+def test_async_stream_that_also_started_is_closed():
+    closed = []
+
+    async def run():
+        both_started = asyncio.Event()
+
+        def stream(name):
+            async def gen():
+                try:
+                    await both_started.wait()
+                    yield name
+                    yield name
+                finally:
+                    closed.append(name)
+            return gen
+
+        def backup():
+            # Releases both streams at once, so both first chunks land in one round
+            asyncio.get_running_loop().call_later(0.01, both_started.set)
+            return stream("backup")
+
+        chunks, winner = await arun_hedged_stream(stream("primary"), 0.01, backup)
+        loser = "backup" if winner == 0 else "primary"
+        assert closed == [loser]
+        return [c async for c in chunks], winner
+
+    chunks, winner = asyncio.run(run())
+    assert len(chunks) == 2 and len(closed) == 2
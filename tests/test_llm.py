@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+import app.core.hedging as hedging
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_groq import ChatGroq
+from app.core.llm import ManagedChatGroq, ModelRegistry
+from app.core.tokens import count_message_tokens, estimate_request_tokens
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    reg = ModelRegistry()
+    yield reg
+    reg.close()
+
+def test_registry_reuses_clients(registry):
+    a = registry.get("openai/gpt-oss-20b", 0.0)
+    b = registry.get("openai/gpt-oss-20b", 0.0)
+    c = registry.get("openai/gpt-oss-20b", 0.4)
+    
+    assert a is b
+    assert a is not c
+    
+    stats = registry.stats()
+    assert stats["created"] == 2
+    assert stats["reused"] == 1
+
+def test_registry_shares_http_pool(registry):
+    a = registry.get("openai/gpt-oss-120b", 0.2)
+    b = registry.get("qwen/qwen3-32b", 0.1)
+    assert a.http_client is b.http_client
+    assert a.http_async_client is b.http_async_client
+
+def test_registry_close_resets(registry):
+    a = registry.get("openai/gpt-oss-20b")
+    registry.close()
+    assert registry.stats()["models"] == []
+    assert registry.get("openai/gpt-oss-20b") is not a
+
+def test_registry_requires_api_key(monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    with pytest.raises(ValueError):
+        ModelRegistry().get("openai/gpt-oss-20b")
+
+class _Limiter:
+    """Grants everything and records what each attempt settles."""
+
+    def __init__(self):
+        self.settled = []
+
+    def acquire(self, tokens):
+        return 0.0
+
+    async def aacquire(self, tokens):
+        return 0.0
+
+    def try_acquire(self, tokens):
+        return True
+
+    def settle(self, estimated, actual):
+        self.settled.append((estimated, actual))
+
+def test_hedge_loser_settles_its_reservation(registry, monkeypatch):
+    monkeypatch.setenv("LLM_HEDGING_ENABLED", "true")
+    monkeypatch.setenv("LLM_HEDGE_INITIAL_DEADLINE", "0.05")
+    monkeypatch.setattr(hedging, "_policy", None)
+    limiter = _Limiter()
+    monkeypatch.setattr(ManagedChatGroq, "_limiter", lambda self: limiter)
+    attempts = []
+
+    async def upstream(self, messages, stop=None, run_manager=None, **kwargs):
+        attempts.append(1)
+        # The primary stalls; the hedge answers at once
+        await asyncio.sleep(1 if len(attempts) == 1 else 0)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+    monkeypatch.setattr(ChatGroq, "_agenerate", upstream)
+    model = registry.get("openai/gpt-oss-20b")
+    messages = [HumanMessage(content="Summarize remote work research.")]
+
+    async def run():
+        result = await model._agenerate_upstream(messages, None, None)
+        await asyncio.sleep(0.01)
+        return result
+
+    assert asyncio.run(run()).generations[0].message.content == "ok"
+    estimate = estimate_request_tokens(messages, model.model_name)
+    # The hedge settles its (unreported) usage, the cancelled primary gives back its output allowance
+    assert limiter.settled == [(estimate, None), (estimate, count_message_tokens(messages, model.model_name))]
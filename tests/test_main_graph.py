@@ -0,0 +1,69 @@
+import threading
+import time
+import app.main_graph as main_graph
+from app.core.state import advance_index, merge_plan
+from app.core.vfs import VFS
+
+def _task(i, kind, status="pending"):
+    return {"id": i, "type": kind, "description": f"{kind} {i}", "status": status, "params": {}}
+
+PLAN = [_task(1, "research"), _task(2, "research"), _task(3, "research"), _task(4, "write"), _task(5, "research")]
+
+def test_merge_plan_applies_per_task_updates():
+    plan = merge_plan([], PLAN)
+    plan = merge_plan(plan, [_task(2, "research", "completed")])
+    plan = merge_plan(plan, [_task(1, "research", "completed")])
+    assert [t["status"] for t in plan] == ["completed", "completed", "pending", "pending", "pending"]
+    assert advance_index(3, 1) == 3 and advance_index(1, 3) == 3
+
+def test_router_fans_out_consecutive_research(monkeypatch):
+    monkeypatch.setattr(main_graph, "RESEARCH_CONCURRENCY", 2)
+    sends = main_graph.router({"plan": PLAN, "current_task_index": 0, "vfs_data": {}})
+    assert [s.arg["current_task_index"] for s in sends] == [0, 1]
+    assert [s.arg["current_task_index"] for s in main_graph.router({"plan": PLAN, "current_task_index": 2})] == [2]
+    assert main_graph.router({"plan": PLAN, "current_task_index": 3}) == "writer"
+
+class _FakeResearcher:
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def invoke(self, graph_input):
+        with self.tracker["lock"]:
+            self.tracker["now"] += 1
+            self.tracker["max"] = max(self.tracker["max"], self.tracker["now"])
+        time.sleep(0.1)
+        with self.tracker["lock"]:
+            self.tracker["now"] -= 1
+        vfs = VFS(graph_input["vfs_data"])
+        vfs.write_file(f"research/{graph_input['query']}.md", "notes", {"url": graph_input["query"]})
+        return {"vfs_data": {**graph_input["vfs_data"], **vfs.changes()}}
+
+class _FakeWriter:
+    def __init__(self, seen):
+        self.seen = seen
+
+    def invoke(self, graph_input):
+        self.seen.append(sorted(VFS(graph_input["vfs_data"]).iter_prefix("research/")))
+        return {"vfs_data": graph_input["vfs_data"]}
+
+def test_research_runs_in_parallel_before_writing(monkeypatch):
+    tracker = {"lock": threading.Lock(), "now": 0, "max": 0}
+    seen = []
+    monkeypatch.setattr(main_graph, "RESEARCH_CONCURRENCY", 2)
+    monkeypatch.setattr(main_graph, "create_initial_plan", lambda state: {"plan": PLAN})
+    monkeypatch.setattr(main_graph, "create_researcher_graph", lambda: _FakeResearcher(tracker))
+    monkeypatch.setattr(main_graph, "create_writer_graph", lambda: _FakeWriter(seen))
+
+    graph = main_graph.create_main_graph()
+    state = {"topic": "t", "word_count": 500, "language": "English", "plan": [], "current_task_index": 0,
+             "vfs_data": {}, "faqs": [], "keyword_report": {}, "linking_report": {}, "logs": []}
+    # Stop before the evaluator, once every task has run
+    for values in graph.stream(state, stream_mode="values"):
+        if values["plan"] and values["current_task_index"] >= len(values["plan"]):
+            break
+
+    assert tracker["max"] == 2
+    assert [t["status"] for t in values["plan"]] == ["completed"] * 5
+    # The write task only ran once research tasks 1-3 were all done
+    assert seen == [["research/research 1.md", "research/research 2.md", "research/research 3.md"]]
+    assert len(list(VFS(values["vfs_data"]).iter_prefix("research/"))) == 4
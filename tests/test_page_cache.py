@@ -0,0 +1,99 @@
+import asyncio
+import httpx
+import pytest
+import app.core.page_cache as page_cache
+import app.tools.scraper as scraper_module
+from app.core.disk_cache import DiskCache
+from app.core.page_cache import PageCache, fresh_until, normalize_url
+from app.tools.extraction import InlineExtractor
+from app.tools.scraper import WebScraper
+
+HTML = "<html><body><article><p>" + "Remote work changes how teams plan their day. " * 10 + "</p></article></body></html>"
+
+class Origin:
+    """Fake site that records requests and answers from a header template."""
+
+    def __init__(self, headers, etag=None):
+        self.headers = headers
+        self.etag = etag
+        self.requests = []
+
+    def respond(self, request):
+        self.requests.append(request)
+        if self.etag and request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304, headers={**self.headers, "etag": self.etag})
+        headers = {**self.headers, **({"etag": self.etag} if self.etag else {})}
+        return httpx.Response(200, text=HTML, headers=headers)
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = PageCache(DiskCache(":memory:"))
+    monkeypatch.setattr(page_cache, "_page_cache", cache)
+    monkeypatch.setattr(scraper_module, "get_extractor", lambda: InlineExtractor())
+    return cache
+
+def use_origin(monkeypatch, origin):
+    monkeypatch.setattr(scraper_module, "get_client", lambda: httpx.Client(transport=httpx.MockTransport(origin.respond)))
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.com:443/a?b=2&a=1&utm_source=x#top") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("http://example.com") == "http://example.com/"
+    assert normalize_url("http://example.com:8080/x") == "http://example.com:8080/x"
+
+def test_fresh_until_honors_cache_control():
+    assert fresh_until({"cache-control": "no-store"}, 100.0, 50) is None
+    assert fresh_until({"cache-control": "no-cache, max-age=60"}, 100.0, 50) == 100.0
+    assert fresh_until({"cache-control": "public, max-age=60", "age": "10"}, 100.0, 50) == 150.0
+    assert fresh_until({"expires": "Thu, 01 Jan 1970 00:01:40 GMT"}, 0.0, 50) == 100.0
+    assert fresh_until({}, 100.0, 50) == 150.0
+
+def test_fresh_page_is_served_from_cache(cache, monkeypatch):
+    origin = Origin({"cache-control": "max-age=600"})
+    use_origin(monkeypatch, origin)
+
+    first = WebScraper().scrape("https://site.test/post?utm_campaign=a")
+    assert first and "Remote work" in first
+    assert WebScraper().scrape("https://site.test/post") == first
+    assert len(origin.requests) == 1
+    assert cache.lookup("https://site.test/post").html == HTML
+
+def test_stale_page_is_revalidated_with_etag(cache, monkeypatch):
+    origin = Origin({"cache-control": "max-age=0"}, etag='"v1"')
+    use_origin(monkeypatch, origin)
+    first = WebScraper().scrape("https://site.test/post")
+
+    extracted = []
+    recording = InlineExtractor()
+    recording.extract = extracted.append
+    monkeypatch.setattr(scraper_module, "get_extractor", lambda: recording)
+    assert WebScraper().scrape("https://site.test/post") == first
+    assert origin.requests[1].headers["if-none-match"] == '"v1"'
+    assert extracted == []
+    assert cache.revalidated == 1
+
+def test_no_store_pages_are_not_cached(cache, monkeypatch):
+    origin = Origin({"cache-control": "no-store"})
+    use_origin(monkeypatch, origin)
+    WebScraper().scrape("https://site.test/private")
+    WebScraper().scrape("https://site.test/private")
+    assert len(origin.requests) == 2
+    assert cache.lookup("https://site.test/private") is None
+
+def test_concurrent_scrapes_share_one_download(cache, monkeypatch):
+    requests = []
+
+    async def respond(request):
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, text=HTML, headers={"cache-control": "no-cache"})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        monkeypatch.setattr(scraper_module, "get_async_client", lambda: client)
+        results = await asyncio.gather(*(WebScraper().ascrape("https://site.test/hot") for _ in range(4)))
+        await client.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert len(requests) == 1
+    assert len(set(results)) == 1 and results[0]
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import pytest
+import app.graphs.researcher as researcher
+from langchain_core.messages import AIMessage
+from app.tools.ranking import URL_SELECTIONS, authority, bm25_scores, load_authority, rank_results
+from app.tools.search import SearchResult
+
+RESULTS = [
+    SearchResult(rank=1, url="https://www.pinterest.com/pin/remote", title="Remote work ideas", snippet="Pins about home offices."),
+    SearchResult(rank=2, url="https://blog.test/remote-productivity", title="Remote work productivity study",
+                 snippet="A 2023 study of remote work productivity across 600 firms."),
+    SearchResult(rank=3, url="https://blog.test/remote-tips", title="Remote work productivity tips",
+                 snippet="Ten productivity tips for remote work."),
+    SearchResult(rank=4, url="https://www.bls.gov/remote", title="Remote work and productivity",
+                 snippet="Official statistics on remote work and productivity growth."),
+    SearchResult(rank=5, url="https://recipes.test/ragu", title="Slow-cooked ragu", snippet="Three hours on a low flame."),
+    SearchResult(rank=6, url="https://news.test/office", title="Offices after remote work", snippet="Firms rethink productivity and leases."),
+]
+
+def test_bm25_prefers_matching_documents():
+    scores = bm25_scores(["remote", "productivity"], [["remote", "productivity"], ["remote"], ["ragu"]])
+    assert scores[0] > scores[1] > scores[2] == 0
+
+def test_authority_matches_domain_suffixes():
+    table = {"gov": 1.3, "blog.test": 0.9}
+    assert authority("bls.gov", table) == 1.3
+    assert authority("news.blog.test", table) == 0.9
+    assert authority("recipes.test", table) == 1.0
+
+def test_rank_results_spreads_across_domains():
+    ranking = rank_results("remote work productivity", RESULTS, k=3)
+    assert ranking.urls == ["https://www.bls.gov/remote", "https://blog.test/remote-tips", "https://news.test/office"]
+    assert ranking.confidence == 1.0
+
+    # Without the duplicate penalty the second post from the same blog wins the last slot
+    assert rank_results("remote work productivity", RESULTS, k=3, duplicate_penalty=1.0).urls[2] == "https://blog.test/remote-productivity"
+
+    assert rank_results("sourdough starter", RESULTS).confidence == 0.0
+
+def test_authority_file_extends_defaults(tmp_path):
+    path = tmp_path / "authority.json"
+    path.write_text(json.dumps({"Blog.test": 2.0}))
+    table = load_authority(str(path))
+    assert table["blog.test"] == 2.0 and table["gov"] == 1.3
+    assert rank_results("remote work productivity", RESULTS, authority_table=table).urls[0].startswith("https://blog.test/")
+
+class _LLM:
+    model_name = "echo"
+    calls = 0
+
+    def invoke(self, prompt):
+        _LLM.calls += 1
+        return AIMessage(content='["https://recipes.test/ragu"]')
+
+@pytest.mark.parametrize("query, mode, calls", [("remote work productivity", "bm25", 0), ("sourdough starter", "llm", 1)])
+def test_select_node_falls_back_to_llm(monkeypatch, query, mode, calls):
+    monkeypatch.setattr(researcher, "get_researcher_model", lambda: _LLM())
+    _LLM.calls = 0
+    before = URL_SELECTIONS.value(mode=mode)
+    update = researcher.select_node({"query": query, "search_results": [r.model_dump() for r in RESULTS]})
+    assert update["selection_mode"] == mode and len(update["selected_urls"]) >= 1
+    assert _LLM.calls == calls and URL_SELECTIONS.value(mode=mode) == before + 1
+
+def test_llm_mode_skips_local_ranking(monkeypatch):
+    monkeypatch.setenv("URL_SELECT_MODE", "llm")
+    monkeypatch.setattr(researcher, "get_researcher_model", lambda: _LLM())
+    update = researcher.select_node({"query": "remote work productivity", "search_results": [r.model_dump() for r in RESULTS]})
+    assert update == {"selected_urls": ["https://recipes.test/ragu"], "selection_mode": "llm"}
+
+class _CancelledLLM:
+    model_name = "echo"
+
+    async def ainvoke(self, prompt):
+        raise asyncio.CancelledError()
+
+def test_cancelled_selection_is_not_swallowed(monkeypatch):
+    monkeypatch.setenv("URL_SELECT_MODE", "llm")
+    monkeypatch.setattr(researcher, "get_researcher_model", lambda: _CancelledLLM())
+    # A cancelled job stops here instead of falling back to the top results
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(researcher.aselect_node({"query": "remote work", "search_results": [r.model_dump() for r in RESULTS]}))
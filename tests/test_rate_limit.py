@@ -0,0 +1,39 @@
+import httpx
+from app.core.rate_limit import ModelRateLimiter, _parse_duration
+
+def test_parse_groq_durations():
+    assert _parse_duration("7.66s") == 7.66
+    assert abs(_parse_duration("2m59.56s") - 179.56) < 1e-6
+    assert _parse_duration("120ms") == 0.12
+    assert _parse_duration("3") == 3.0
+    assert _parse_duration("") is None
+
+def test_requests_queue_once_rpm_is_spent():
+    limiter = ModelRateLimiter("m", rpm=2, tpm=100000)
+    assert limiter._reserve(10) == 0
+    assert limiter._reserve(10) == 0
+    # Third request waits for one refill interval (60s / 2 rpm)
+    wait = limiter._reserve(10)
+    assert 29 < wait <= 30
+    assert limiter.stats()["waited_calls"] == 1
+
+def test_token_budget_queues_large_requests():
+    limiter = ModelRateLimiter("m", rpm=1000, tpm=600)
+    assert limiter._reserve(600) == 0
+    wait = limiter._reserve(300)
+    assert 29 < wait <= 30
+
+def test_settle_returns_unused_tokens():
+    limiter = ModelRateLimiter("m", rpm=1000, tpm=600)
+    limiter._reserve(600)
+    limiter.settle(estimated=600, actual=100)
+    assert limiter._reserve(400) == 0
+
+def test_observe_adapts_from_headers():
+    limiter = ModelRateLimiter("m", rpm=30, tpm=6000)
+    limiter.observe(httpx.Headers({"x-ratelimit-limit-tokens": "250000"}), 200)
+    assert limiter.stats()["tpm"] == 250000
+    
+    limiter.observe(httpx.Headers({"retry-after": "5"}), 429)
+    assert limiter._reserve(1) > 4
+    assert limiter.stats()["throttled"] == 1
@@ -0,0 +1,68 @@
+import pytest
+import app.core.research_store as research_store
+import app.graphs.researcher as researcher
+from langchain_core.messages import AIMessage
+from app.core.disk_cache import DiskCache
+from app.core.llm_cache import bypass_llm_cache
+from app.core.research_store import ResearchStore, artifact_id, content_digest
+
+PAGE = "Four-day weeks cut burnout by 71% in the 2022 UK pilot, and 92% of firms kept the schedule."
+
+class _Scraper:
+    content = PAGE
+
+    def scrape(self, url):
+        return self.content
+
+class _LLM:
+    model_name = "echo"
+    calls = 0
+
+    def invoke(self, prompt):
+        _LLM.calls += 1
+        return AIMessage(content=f"summary #{_LLM.calls}")
+
+@pytest.fixture
+def store(monkeypatch):
+    store = ResearchStore(DiskCache(":memory:"))
+    monkeypatch.setattr(research_store, "_research_store", store)
+    monkeypatch.setattr(researcher, "get_scraper", lambda url: _Scraper())
+    monkeypatch.setattr(researcher, "get_researcher_model", lambda: _LLM())
+    _LLM.calls = 0
+    yield store
+    _Scraper.content = PAGE
+
+def _research(query="four-day week"):
+    state = {"query": query, "vfs_data": {}, "selected_urls": ["https://site.test/pilot?utm_source=x"]}
+    return researcher.scrape_and_summarize_node(state)["vfs_data"]
+
+def test_artifact_id_is_stable_and_content_addressed():
+    digest = content_digest(PAGE)
+    assert artifact_id("HTTPS://Site.test/pilot?utm_source=x", digest) == artifact_id("https://site.test/pilot", digest)
+    assert artifact_id("https://site.test/pilot", digest) == "3baed5e751fceab5"
+    assert artifact_id("https://site.test/pilot", content_digest(PAGE + " Updated.")) != artifact_id("https://site.test/pilot", digest)
+
+def test_later_jobs_reuse_summaries(store):
+    first = _research()
+    assert _research() == first
+    assert _LLM.calls == 1 and store.reused == 1
+    (filename, file), = first.items()
+    assert filename == f"research/summary_{artifact_id('https://site.test/pilot', content_digest(PAGE))}.md"
+    assert file.metadata["content_digest"] == content_digest(PAGE)
+
+    # A different research question needs its own summary
+    _research("burnout statistics")
+    assert _LLM.calls == 2
+
+def test_changed_page_is_summarized_again(store):
+    first = _research()
+    _Scraper.content = PAGE + " The 2024 follow-up found the gains held."
+    second = _research()
+    assert _LLM.calls == 2
+    assert first.keys() != second.keys()
+
+def test_bypass_skips_the_store(store):
+    _research()
+    with bypass_llm_cache():
+        _research()
+    assert _LLM.calls == 2 and store.bypassed == 1
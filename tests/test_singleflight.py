@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.core.singleflight import SingleFlight
+
+def test_threads_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: flights.do("k", work, clone=dict), range(5)))
+
+    assert len(calls) == 1
+    assert all(r == {"value": 42} for r in results)
+    # Each caller got its own copy
+    assert len({id(r) for r in results}) == 5
+    assert flights.stats()["coalesced"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+def test_tasks_and_threads_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "done"
+
+    async def run():
+        thread_result = []
+        leader = asyncio.create_task(flights.ado("k", work))
+        await asyncio.sleep(0.05)
+        # A thread joins while the asyncio leader is in flight
+        t = threading.Thread(target=lambda: thread_result.append(flights.do("k", lambda: "other")))
+        t.start()
+        followers = await asyncio.gather(*(flights.ado("k", work) for _ in range(3)))
+        await asyncio.to_thread(t.join)
+        return [await leader, *followers, *thread_result]
+
+    assert asyncio.run(run()) == ["done"] * 5
+    assert len(calls) == 1
+    assert flights.stats()["coalesced"] == 4
+
+def test_errors_fan_out():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream down")
+
+    async def run():
+        return await asyncio.gather(*(flights.ado("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.stats()["leaders"] == 1
+
+def test_follower_retries_when_leader_cancelled():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    async def run():
+        leader = asyncio.create_task(flights.ado("k", work))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flights.ado("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "ok"
+    assert len(calls) == 2
+    assert flights.stats()["retried"] == 1
+
+def test_sequential_calls_are_not_cached():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == 1
+    assert flights.do("k", lambda: 2) == 2
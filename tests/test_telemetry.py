@@ -0,0 +1,56 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.api.server import app, jobs
+from app.core.telemetry import (
+    LLM_CALLS,
+    LLM_IN_FLIGHT,
+    LLM_LATENCY,
+    LLM_TOKENS,
+    LLM_TTFT,
+    LLMCall,
+    MetricsRegistry,
+)
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("op_seconds", "Op latency.", ["op"], buckets=(0.5, 1.0))
+    for value in (0.2, 0.5, 0.7, 3.0):
+        latency.observe(value, op='say "hi"')
+    hits = registry.counter("hits_total", "Hits.")
+    hits.inc()
+
+    text = registry.render()
+    assert "# TYPE op_seconds histogram" in text
+    assert 'op_seconds_bucket{op="say \\"hi\\"",le="0.5"} 2' in text
+    assert 'op_seconds_bucket{op="say \\"hi\\"",le="1"} 3' in text
+    assert 'op_seconds_bucket{op="say \\"hi\\"",le="+Inf"} 4' in text
+    assert 'op_seconds_sum{op="say \\"hi\\""} 4.4' in text
+    assert 'op_seconds_count{op="say \\"hi\\""} 4' in text
+    assert "hits_total 1" in text
+
+def test_llm_call_records_outcomes():
+    call = LLMCall("telemetry-model", "write")
+    assert LLM_IN_FLIGHT.value(model="telemetry-model") == 1
+    call.first_token()
+    call.finish({"input_tokens": 120, "output_tokens": 30})
+
+    assert LLM_IN_FLIGHT.value(model="telemetry-model") == 0
+    assert LLM_CALLS.value(node="write", model="telemetry-model", outcome="ok") == 1
+    assert LLM_LATENCY.count(node="write", model="telemetry-model") == 1
+    assert LLM_TTFT.count(node="write", model="telemetry-model") == 1
+    assert LLM_TOKENS.value(node="write", model="telemetry-model", direction="output") == 30
+
+    LLMCall("telemetry-model", None).fail(asyncio.CancelledError())
+    LLMCall("telemetry-model", None).fail(RuntimeError("boom"))
+    assert LLM_CALLS.value(node="unknown", model="telemetry-model", outcome="cancelled") == 1
+    assert LLM_CALLS.value(node="unknown", model="telemetry-model", outcome="error") == 1
+
+def test_metrics_endpoint():
+    jobs["metrics-job"] = {"status": "completed"}
+    LLMCall("telemetry-endpoint", "plan").finish({})
+
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'article_jobs{status="running"}' in response.text
+    assert 'llm_call_duration_seconds_count{node="plan",model="telemetry-endpoint"} 1' in response.text
@@ -0,0 +1,85 @@
+from langchain_core.messages import HumanMessage
+import app.core.rate_limit as rate_limit
+from app.core.rate_limit import ModelRateLimiter
+from app.core.tokens import (
+    TokenCounter,
+    TokenUsageLog,
+    TRUNCATION_MARKER,
+    allocate,
+    count_tokens,
+    fit_prompt,
+    input_budget,
+    trim_to_tokens,
+)
+
+SECTIONS = "\n\n".join(
+    f"## Section {i}\n\n" + "\n\n".join(f"Paragraph {i}.{j} " + "word " * 40 for j in range(3))
+    for i in range(6)
+)
+
+def test_allocate_water_fills():
+    # The short part keeps everything; the rest is split between the long ones
+    allocation = allocate(1000, {"short": 100, "a": 5000, "b": 5000})
+    assert allocation == {"short": 100, "a": 450, "b": 450}
+
+    weighted = allocate(700, {"research": 5000, "draft": 5000}, {"research": 4, "draft": 3})
+    assert weighted == {"research": 400, "draft": 300}
+
+    assert allocate(1000, {"a": 10, "b": 20}) == {"a": 10, "b": 20}
+
+def test_trim_keeps_whole_sections():
+    limit = count_tokens(SECTIONS) // 2
+    trimmed = trim_to_tokens(SECTIONS, limit)
+
+    assert count_tokens(trimmed) <= limit
+    assert trimmed.endswith(TRUNCATION_MARKER)
+    body = trimmed[: -len(TRUNCATION_MARKER)]
+    # Cut falls right before a heading, never mid-paragraph
+    assert SECTIONS[len(body):].lstrip().startswith("## Section")
+
+def test_trim_falls_back_to_paragraphs():
+    section = SECTIONS.split("\n\n## ")[0]
+    trimmed = trim_to_tokens(section, count_tokens(section) - 10)
+    body = trimmed[: -len(TRUNCATION_MARKER)]
+    assert body.rstrip().endswith("word")
+    assert body.count("Paragraph") == 2
+
+def test_short_text_untouched():
+    assert trim_to_tokens("short", 100) == "short"
+
+def test_fit_prompt_keeps_instructions():
+    render = lambda draft, research: f"INSTRUCTIONS\n{research}\n---\n{draft}\nEND"
+    prompt = fit_prompt(None, render, budget=300, draft=SECTIONS, research=SECTIONS)
+
+    assert count_tokens(prompt) <= 300
+    assert prompt.startswith("INSTRUCTIONS") and prompt.endswith("END")
+    assert prompt.count(TRUNCATION_MARKER) == 2
+
+    assert fit_prompt(None, render, budget=300, draft="a", research="b") == render(draft="a", research="b")
+
+def test_usage_log_calibrates_ratio():
+    counter = TokenCounter("test-model")
+    start = counter.chars_per_token
+    counter.calibrate(chars=1000, tokens=500)
+    assert counter.chars_per_token < start
+
+    log = TokenUsageLog()
+    log.record("test-model", [HumanMessage(content="hello " * 100)], input_tokens=120, output_tokens=30, node="write")
+    stats = log.stats()
+    assert stats["models"]["test-model"]["input_tokens"] == 120
+    assert stats["recent_calls"][0]["node"] == "write"
+
+def test_fit_prompt_caps_parts_in_characters():
+    render = lambda draft: f"INSTRUCTIONS\n{draft}\nEND"
+    # Within budget, but never more than the old fixed slice
+    prompt = fit_prompt(None, render, budget=100000, max_chars={"draft": 1000}, draft=SECTIONS)
+    assert TRUNCATION_MARKER in prompt and len(prompt) <= 1000 + len(render(""))
+
+def test_input_budget_is_a_share_of_tpm(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {"m": ModelRateLimiter("m", 30, 8000)})
+    monkeypatch.setenv("LLM_EXPECTED_OUTPUT_TOKENS", "1000")
+    monkeypatch.delenv("PROMPT_INPUT_BUDGET", raising=False)
+    # One call may not drain a whole minute of the model's token rate
+    assert input_budget("m") == 3000
+    monkeypatch.setenv("PROMPT_TPM_SHARE", "0.25")
+    assert input_budget("m") == 1000
@@ -1,6 +1,15 @@
+import asyncio
+import threading
+import time
+import httpx
 import pytest
-from app.tools.search import MockSearchProvider
-from app.tools.scraper import MockScraper
+from langchain_core.messages import AIMessage
+import app.graphs.researcher as researcher
+import app.tools.scraper as scraper_module
+from app.core.disk_cache import DiskCache
+from app.tools.extraction import InlineExtractor
+from app.tools.search import CachedSearchProvider, DuckDuckGoSearchProvider, MockSearchProvider
+from app.tools.scraper import MockScraper, WebScraper
 
 def test_mock_search():
     provider = MockSearchProvider()
@@ -14,3 +23,114 @@ def test_mock_scraper():
     content = scraper.scrape("https://example.com")
     assert "Scraped content" in content
     assert "https://example.com" in content
+
+def test_mock_search_async():
+    provider = MockSearchProvider()
+    results = asyncio.run(provider.asearch("productivity"))
+    assert results == provider.search("productivity")
+
+def test_mock_scraper_async():
+    scraper = MockScraper()
+    content = asyncio.run(scraper.ascrape("https://example.com"))
+    assert content == scraper.scrape("https://example.com")
+
+class _SlowScraper:
+    def __init__(self, delays):
+        self.delays = delays
+
+    def scrape(self, url):
+        time.sleep(self.delays[url])
+        return None if url.endswith("/broken") else f"page {url}"
+
+    async def ascrape(self, url):
+        await asyncio.sleep(self.delays[url])
+        return None if url.endswith("/broken") else f"page {url}"
+
+class _EchoLLM:
+    model_name = "echo"
+
+    def invoke(self, prompt):
+        return AIMessage(content=prompt.strip().splitlines()[-1].strip())
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_scrape_and_summarize_runs_urls_concurrently(monkeypatch, mode):
+    delays = {"https://a.test/1": 0.3, "https://b.test/2": 0.3, "https://c.test/broken": 0.1}
+    monkeypatch.setattr(researcher, "get_scraper", lambda url: _SlowScraper(delays))
+    monkeypatch.setattr(researcher, "get_researcher_model", lambda: _EchoLLM())
+    state = {"query": "q", "vfs_data": {}, "selected_urls": list(delays)}
+
+    started = time.perf_counter()
+    if mode == "sync":
+        result = researcher.scrape_and_summarize_node(state)
+    else:
+        result = asyncio.run(researcher.ascrape_and_summarize_node(state))
+    assert time.perf_counter() - started < 0.55
+
+    files = result["vfs_data"]
+    assert [f.metadata["url"] for f in files.values()] == ["https://a.test/1", "https://b.test/2"]
+    assert [f.content for f in files.values()] == ["page https://a.test/1", "page https://b.test/2"]
+
+def test_async_scraper_caps_requests_per_domain(monkeypatch):
+    monkeypatch.setenv("PAGE_CACHE_ENABLED", "false")
+    monkeypatch.setattr(scraper_module, "get_extractor", lambda: InlineExtractor())
+    active = {"max": 0, "now": 0}
+
+    async def handler(request):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.05)
+        active["now"] -= 1
+        return httpx.Response(200, text="<html><body><p>Hello</p></body></html>")
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(scraper_module, "get_async_client", lambda: client)
+        urls = [f"https://same.test/{i}" for i in range(6)]
+        await asyncio.gather(*(WebScraper().ascrape(url) for url in urls))
+        await client.aclose()
+
+    asyncio.run(run())
+    assert active["max"] == scraper_module.SCRAPE_PER_DOMAIN
+
+class _CountingProvider(MockSearchProvider):
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, query, max_results=10):
+        self.calls += 1
+        return [] if query == "nothing" else super().search(query, max_results)
+
+def test_cached_search_provider_normalizes_queries():
+    inner = _CountingProvider()
+    provider = CachedSearchProvider(inner, DiskCache(":memory:", ttl=60))
+    first = provider.search("Remote work tools")
+    assert provider.search("  remote WORK tools? ") == first
+    assert asyncio.run(provider.asearch("remote work, tools")) == first
+    assert inner.calls == 1
+    assert provider.stats()["hit_rate"] == round(2 / 3, 4)
+
+    # Failed (empty) searches are retried rather than cached
+    provider.search("nothing")
+    provider.search("nothing")
+    assert inner.calls == 3
+
+def test_cached_search_provider_ttl():
+    inner = _CountingProvider()
+    provider = CachedSearchProvider(inner, DiskCache(":memory:", ttl=0.01))
+    provider.search("productivity")
+    time.sleep(0.02)
+    provider.search("productivity")
+    assert inner.calls == 2
+
+def test_ddg_session_is_reused_per_thread():
+    provider = DuckDuckGoSearchProvider()
+    session = provider._session()
+    assert provider._session() is session
+    other = []
+    worker = threading.Thread(target=lambda: other.append(provider._session()))
+    worker.start()
+    worker.join()
+    assert other[0] is not session
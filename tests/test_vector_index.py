@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import app.core.embedding_cache as embedding_cache
+import app.core.vector_index as vector_index
+import app.graphs.faq as faq
+import app.graphs.writer as writer
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from app.core.embedding_cache import EmbeddingCache
+from app.core.vector_index import ResearchIndex, get_research_index, rank_research
+from app.core.vfs import VFS
+
+VOCAB = ["office", "salary", "commute", "meeting", "burnout"]
+
+class _Model:
+    """Bag-of-words embeddings over VOCAB; records every text it encodes."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32):
+        self.encoded.extend(texts)
+        return np.array([[t.lower().count(w) for w in VOCAB] for t in texts], dtype=np.float32)
+
+PARAGRAPHS = {
+    "research/a.md": "Hybrid teams spend two days in the office and report the office helps onboarding.",
+    "research/b.md": "Salary bands for remote roles are converging, and salary transparency laws accelerate it.",
+    "research/c.md": "The average commute fell by 40 minutes, and commute savings go to sleep and exercise.",
+}
+
+def _vfs(*names):
+    vfs = VFS()
+    for name in names:
+        vfs.write_file(name, PARAGRAPHS[name], {"url": f"https://{name[9]}.test"})
+    return vfs
+
+@pytest.fixture
+def model(monkeypatch):
+    model = _Model()
+    monkeypatch.setattr(vector_index, "get_embedding_model", lambda: model)
+    monkeypatch.setattr(writer, "get_embedding_model", lambda: model)
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", EmbeddingCache())
+    monkeypatch.setattr(vector_index, "_live", vector_index.OrderedDict())
+    return model
+
+def test_sync_only_embeds_new_files(model):
+    index = ResearchIndex("bow")
+    assert index.sync(_vfs("research/a.md"), model.encode) == (1, 0)
+    assert index.sync(_vfs("research/a.md", "research/b.md"), model.encode) == (1, 0)
+    assert index.sync(_vfs("research/a.md", "research/b.md"), model.encode) == (0, 0)
+    assert len(model.encoded) == 2 and index.revision == 2
+    assert index.search(model.encode(["salary"])[0], 1)[0].source == "https://b.test"
+
+def test_changed_file_rebuilds(model):
+    index = ResearchIndex("bow")
+    vfs = _vfs("research/a.md", "research/b.md")
+    index.sync(vfs, model.encode)
+    vfs.write_file("research/a.md", PARAGRAPHS["research/c.md"], {"url": "https://a.test"})
+    assert index.sync(vfs, model.encode) == (2, 0)
+    assert [c.text for c in index.chunks] == [PARAGRAPHS["research/c.md"], PARAGRAPHS["research/b.md"]]
+
+def test_index_survives_checkpoint_round_trip(model):
+    index = ResearchIndex("bow")
+    index.sync(_vfs("research/a.md", "research/b.md", "research/c.md"), model.encode)
+    serde = JsonPlusSerializer()
+    data = serde.loads_typed(serde.dumps_typed(index.to_data()))
+
+    # Another process: nothing live, nothing re-embedded
+    vector_index._live.clear()
+    restored = get_research_index(data, "bow")
+    assert restored is not index and len(model.encoded) == 3
+    assert restored.search(model.encode(["commute"])[0], 1)[0].source == "https://c.test"
+    assert get_research_index(data, "bow") is restored
+    # Vectors from another model are never mixed in
+    assert get_research_index(data, "other").chunks == []
+
+def test_write_tasks_extend_one_index(model, monkeypatch):
+    monkeypatch.setattr(writer, "embedding_model_id", lambda: "bow")
+    monkeypatch.setattr(vector_index, "embedding_model_id", lambda: "bow")
+    state = {"task_description": "office culture", "vfs_data": _vfs("research/a.md").changes(), "draft_file": "draft.md"}
+    first = writer.retrieve_context_node(state)
+    assert "https://a.test" in first["context"]
+
+    # Same research: the index is reused as is and not handed back
+    second = writer.retrieve_context_node({**state, "research_index": first["research_index"]})
+    assert "research_index" not in second
+
+    # New research is added on top; only its chunk is embedded
+    encoded = len(model.encoded)
+    state = {**state, "vfs_data": _vfs("research/a.md", "research/b.md").changes(), "research_index": first["research_index"]}
+    third = writer.retrieve_context_node(state)
+    assert third["research_index"]["id"] == first["research_index"]["id"]
+    # Only the new batch's hash is added to state; the vectors live in the blob store
+    assert third["research_index"]["batches"][0] == first["research_index"]["batches"][0]
+    assert len(third["research_index"]["batches"]) == 2 and "vectors" not in third["research_index"]
+    assert model.encoded[encoded:] == [vector_index.Chunk("https://b.test", PARAGRAPHS["research/b.md"]).render(), "office culture"]
+
+    # The FAQ agent ranks research against the draft with the same index
+    ranked = rank_research(third["research_index"], "what about salary?", 2)
+    assert [c.source for c in ranked] == ["https://b.test", "https://a.test"]
+    vfs = _vfs("research/a.md", "research/b.md")
+    vfs.write_file("draft.md", "Salary questions dominate.")
+    research, _ = faq._gather_inputs({"vfs_data": vfs.changes(), "draft_file": "draft.md", "research_index": third["research_index"]})
+    assert research[0].startswith("Source: https://b.test")
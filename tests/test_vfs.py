@@ -1,5 +1,7 @@
 import pytest
-from app.core.vfs import VFS
+from typing import TypedDict
+from langgraph.graph import StateGraph, END
+from app.core.vfs import VFS, VFSData, File, diff_vfs, merge_vfs
 
 def test_vfs_basic_operations():
     vfs = VFS()
@@ -27,3 +29,144 @@ def test_vfs_overwrite():
     vfs.write_file("test.txt", "v1")
     vfs.write_file("test.txt", "v2")
     assert vfs.read_file("test.txt") == "v2"
+
+def test_vfs_collects_only_changes():
+    seed = VFS()
+    seed.write_file("a.md", "A")
+    seed.write_file("b.md", "B")
+    files = merge_vfs({}, seed.changes())
+
+    vfs = VFS(files)
+    vfs.write_file("a.md", "A2")
+    vfs.delete_file("b.md")
+    vfs.write_file("c.md", "C")
+
+    assert sorted(vfs.list_files()) == ["a.md", "c.md"]
+    assert not vfs.exists("b.md")
+    changes = vfs.changes()
+    assert set(changes) == {"a.md", "b.md", "c.md"}
+    assert changes["b.md"] is None
+    # The state's files are never touched
+    assert files["a.md"].content == "A" and "b.md" in files
+
+def test_merge_vfs_versions_and_deletes():
+    v1 = merge_vfs({}, {"a.md": File(name="a.md", content="1")})
+    assert v1["a.md"].version == 1
+
+    v2 = merge_vfs(v1, {"a.md": File(name="a.md", content="2")})
+    assert v2["a.md"].version == 2
+    assert v1["a.md"].version == 1
+
+    # Passing unchanged files back is a no-op
+    assert merge_vfs(v2, dict(v2))["a.md"].version == 2
+
+    assert merge_vfs(v2, {"a.md": None}) == {}
+
+def test_diff_vfs():
+    before = merge_vfs({}, {"a.md": File(name="a.md", content="1"), "b.md": File(name="b.md", content="1")})
+    after = merge_vfs(before, {"a.md": File(name="a.md", content="2"), "b.md": None})
+    delta = diff_vfs(before, after)
+    assert delta["a.md"].content == "2" and delta["b.md"] is None
+    assert diff_vfs(before, None) == {}
+
+def test_reducer_in_graph():
+    class State(TypedDict):
+        vfs_data: VFSData
+
+    def writer(name):
+        def node(state):
+            vfs = VFS(state["vfs_data"])
+            vfs.write_file(name, name.upper())
+            return {"vfs_data": vfs.changes()}
+        return node
+
+    graph = StateGraph(State)
+    graph.add_node("first", writer("one.md"))
+    graph.add_node("second", writer("two.md"))
+    graph.add_node("again", writer("one.md"))
+    graph.set_entry_point("first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", "again")
+    graph.add_edge("again", END)
+
+    result = graph.compile().invoke({"vfs_data": {}})
+    assert sorted(result["vfs_data"]) == ["one.md", "two.md"]
+    assert result["vfs_data"]["one.md"].version == 2
+    assert result["vfs_data"]["two.md"].version == 1
+
+def test_append_file_adds_segments():
+    vfs = VFS()
+    vfs.append_file("draft.md", "# Title")
+    vfs.append_file("draft.md", "\n\nIntro")
+    vfs.append_file("draft.md", "\n\nBody " + "x" * 50)
+    draft = vfs.get_file("draft.md")
+    assert len(draft.segments) == 3
+    assert draft.version == 1
+    assert vfs.tail("draft.md", 5) == "xxxxx"
+    assert draft.content.startswith("# Title\n\nIntro\n\nBody")
+
+    merged = merge_vfs({}, vfs.changes())
+    next_node = VFS(merged)
+    next_node.append_file("draft.md", "\n\nConclusion")
+    assert next_node.get_file("draft.md").version == 2
+    assert next_node.get_file("draft.md").segments[:3] == draft.segments
+    assert merged["draft.md"].content == draft.content
+
+def test_tail_reads_only_last_segments():
+    vfs = VFS()
+    vfs.append_file("draft.md", "a" * 100)
+    vfs.append_file("draft.md", "b" * 10)
+    vfs.append_file("draft.md", "c" * 10)
+    restored = File(**vfs.get_file("draft.md")._asdict())
+    assert restored.tail(15) == "b" * 5 + "c" * 10
+    assert restored._text is None
+    assert restored.tail(1000) == "a" * 100 + "b" * 10 + "c" * 10
+
+def test_file_checkpoint_round_trip():
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    serde = JsonPlusSerializer()
+    vfs = VFS()
+    vfs.write_file("research/a.md", "Notes", {"url": "https://example.com"})
+    vfs.append_file("research/a.md", " and more")
+    original = vfs.get_file("research/a.md")
+    restored = serde.loads_typed(serde.dumps_typed(original))
+    assert isinstance(restored, File)
+    assert restored == original
+    assert restored.content == "Notes and more"
+    assert restored.metadata == {"url": "https://example.com"}
+
+def test_prefix_glob_and_metadata_queries():
+    vfs = VFS()
+    vfs.write_file("research/b.md", "B", {"url": "https://b.example"})
+    vfs.write_file("research/a.md", "A", {"url": "https://a.example", "query": "q"})
+    vfs.write_file("research/notes.txt", "N")
+    vfs.write_file("researcher.log", "L")
+    vfs.write_file("draft.md", "D")
+    files = merge_vfs({}, vfs.changes())
+
+    node = VFS(files)
+    assert list(node.iter_prefix("research/")) == ["research/a.md", "research/b.md", "research/notes.txt"]
+    assert node.glob("research/*.md") == ["research/a.md", "research/b.md"]
+    assert node.find(url="https://a.example") == ["research/a.md"]
+    assert node.find(url="https://a.example", query="other") == []
+
+    # Pending changes in the view are reflected before they are merged
+    node.delete_file("research/a.md")
+    node.write_file("research/c.md", "C", {"url": "https://b.example"})
+    assert list(node.iter_prefix("research/")) == ["research/b.md", "research/c.md", "research/notes.txt"]
+    assert node.find(url="https://b.example") == ["research/b.md", "research/c.md"]
+
+def test_merge_vfs_carries_index_forward():
+    vfs = VFS()
+    for i in range(5):
+        vfs.write_file(f"research/{i}.md", str(i), {"url": f"u{i}"})
+    first = merge_vfs({}, vfs.changes())
+    assert list(first.iter_prefix("research/"))[:2] == ["research/0.md", "research/1.md"]
+
+    second = merge_vfs(first, {"research/0.md": None, "research/9.md": File("research/9.md", "9", {"url": "u1"})})
+    assert second._names is not None
+    assert list(second.iter_prefix("research/")) == ["research/1.md", "research/2.md", "research/3.md", "research/4.md", "research/9.md"]
+    assert second.find(url="u1") == {"research/1.md", "research/9.md"}
+    assert second.find(url="u0") == set()
+    # The previous state is untouched
+    assert first.find(url="u0") == {"research/0.md"} and first.find(url="u1") == {"research/1.md"}